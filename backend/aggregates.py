@@ -0,0 +1,230 @@
+# Incrementally maintained aggregate tables
+# The dashboard only ever needs counts: jobs per (country, query), per state, per remote flag, per day, and skills per
+# (query, skill), and skills per (week posted, query, country, skill) for trends. store_jobs and store_job_skills add the rows they insert to these tables in the same transaction, so
+# dashboard reads cost O(result size) instead of a scan of job_listings/job_skills.
+# Keys are stored lowercased (country) or with NULLs replaced by '' so they can be primary keys
+#
+# Usage:
+#   python -m backend.aggregates rebuild    recompute every aggregate from job_listings/job_skills
+#   python -m backend.aggregates check      compare the aggregates with a fresh GROUP BY, exit 1 on any mismatch
+
+import sys
+from psycopg2.extras import execute_values
+from backend.db import connection
+
+
+def create_aggregate_tables(conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_job_counts (
+                job_country TEXT NOT NULL,
+                search_query TEXT NOT NULL,
+                job_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_country, search_query)
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_state_counts (
+                job_state TEXT PRIMARY KEY,
+                job_count BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_remote_counts (
+                work_type TEXT PRIMARY KEY,
+                job_count BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_daily_counts (
+                day DATE NOT NULL,
+                search_query TEXT NOT NULL,
+                job_country TEXT NOT NULL,
+                job_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, search_query, job_country)
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_skill_counts (
+                search_query TEXT NOT NULL,
+                skill TEXT NOT NULL,
+                job_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (search_query, skill)
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agg_skill_weekly_counts (
+                week DATE NOT NULL,
+                search_query TEXT NOT NULL,
+                job_country TEXT NOT NULL,
+                skill TEXT NOT NULL,
+                job_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (week, search_query, job_country, skill)
+            )
+        """)
+
+        conn.commit()
+
+
+WORK_TYPE_SQL = "CASE WHEN job_is_remote = 'true' THEN 'Remote' ELSE 'Onsite/Hybrid' END"
+
+
+# job_listings aggregates: (table, key columns, key expressions over job_listings, extra WHERE)
+LISTING_AGGREGATES = [
+    ("agg_job_counts", ("job_country", "search_query"),
+     ("LOWER(COALESCE(job_country, ''))", "COALESCE(search_query, '')"), None),
+    ("agg_state_counts", ("job_state",), ("COALESCE(job_state, '')",), None),
+    ("agg_remote_counts", ("work_type",), (WORK_TYPE_SQL,), None),
+    ("agg_daily_counts", ("day", "search_query", "job_country"),
+     ("date_posted", "COALESCE(search_query, '')", "LOWER(COALESCE(job_country, ''))"), "date_posted IS NOT NULL"),
+]
+
+
+# Fresh GROUP BY for one job_listings aggregate, optionally limited to some job ids.
+# Rows come out in key order so concurrent upserts lock aggregate rows in the same order and can't deadlock
+def listing_counts_sql(keys, expressions, where, ids=False):
+    conditions = [where] if where else []
+    if ids:
+        conditions.append("id = ANY(%s)")
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    positions = ", ".join(str(i + 1) for i in range(len(keys)))
+    return f"""
+        SELECT {", ".join(f"{expr} AS {key}" for expr, key in zip(expressions, keys))}, COUNT(*) AS job_count
+        FROM job_listings
+        {where_sql}
+        GROUP BY {positions}
+        ORDER BY {positions}
+    """
+
+
+def upsert_sql(table, keys):
+    return f"""
+        INSERT INTO {table} ({", ".join(keys)}, job_count)
+        {{rows}}
+        ON CONFLICT ({", ".join(keys)}) DO UPDATE
+            SET job_count = {table}.job_count + EXCLUDED.job_count
+    """
+
+
+# Adds newly inserted job_listings rows to the listing aggregates. Takes a cursor so it commits with the insert
+def add_listings(c, job_ids):
+    if not job_ids:
+        return
+    job_ids = list(job_ids)
+    for table, keys, expressions, where in LISTING_AGGREGATES:
+        c.execute(upsert_sql(table, keys).format(rows=listing_counts_sql(keys, expressions, where, ids=True)), (job_ids,))
+
+
+SKILL_WEEKLY_KEYS = ("week", "search_query", "job_country", "skill")
+
+
+# Fresh GROUP BY of job_skills per week the job was posted (Monday), optionally limited to some (job_id, skill) pairs.
+# Jobs without a date_posted have no week and are left out
+def skill_weekly_counts_sql(pairs=False):
+    where_sql = "AND (s.job_id, s.skill) IN (SELECT * FROM unnest(%s::text[], %s::text[]))" if pairs else ""
+    return f"""
+        SELECT date_trunc('week', l.date_posted)::date AS week, COALESCE(s.search_query, '') AS search_query,
+               LOWER(COALESCE(l.job_country, '')) AS job_country, s.skill, COUNT(*) AS job_count
+        FROM job_skills s
+        JOIN job_listings l ON l.id = s.job_id
+        WHERE l.date_posted IS NOT NULL {where_sql}
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+    """
+
+
+# Adds newly inserted job_skills rows, given as [(job_id, search_query, skill)], to agg_skill_counts and
+# agg_skill_weekly_counts (whose week and country come from job_listings)
+def add_skills(c, rows):
+    counts = {}
+    for _, search_query, skill in rows:
+        key = (search_query or "", skill)
+        counts[key] = counts.get(key, 0) + 1
+    if counts:
+        execute_values(c, upsert_sql("agg_skill_counts", ("search_query", "skill")).format(rows="VALUES %s"),
+                       [(search_query, skill, count) for (search_query, skill), count in sorted(counts.items())])
+        c.execute(upsert_sql("agg_skill_weekly_counts", SKILL_WEEKLY_KEYS).format(rows=skill_weekly_counts_sql(pairs=True)),
+                  ([job_id for job_id, _, _ in rows], [skill for _, _, skill in rows]))
+
+
+SKILL_COUNTS_SQL = """
+    SELECT COALESCE(search_query, '') AS search_query, skill, COUNT(*) AS job_count
+    FROM job_skills
+    GROUP BY 1, 2
+"""
+
+
+# (table, key columns, fresh GROUP BY) for every aggregate
+def aggregate_sources():
+    sources = [(table, keys, listing_counts_sql(keys, expressions, where))
+               for table, keys, expressions, where in LISTING_AGGREGATES]
+    sources.append(("agg_skill_counts", ("search_query", "skill"), SKILL_COUNTS_SQL))
+    sources.append(("agg_skill_weekly_counts", SKILL_WEEKLY_KEYS, skill_weekly_counts_sql()))
+    return sources
+
+
+# Recount of every aggregate (or only the given tables) from the base tables, as one SQL script.
+# The aggregates are locked against writes first, so an ingest running meanwhile either lands before the recount
+# (and is included in it) or waits and adds its rows on top of it
+def rebuild_sql(tables=None):
+    sources = [source for source in aggregate_sources() if tables is None or source[0] in tables]
+    statements = [f"LOCK TABLE {', '.join(table for table, _, _ in sources)} IN EXCLUSIVE MODE"]
+    for table, keys, source in sources:
+        statements.append(f"DELETE FROM {table}")
+        statements.append(f"INSERT INTO {table} ({', '.join(keys)}, job_count) {source}")
+    return ";\n".join(statements)
+
+
+# Recomputes every aggregate in one transaction (readers see the old counts until it commits)
+def rebuild_aggregates(conn=None):
+
+    with connection(conn) as conn:
+        create_aggregate_tables(conn)
+        with conn.cursor() as c:
+            c.execute(rebuild_sql())
+        conn.commit()
+
+
+# Compares each aggregate with a fresh GROUP BY. Returns {table: [(key, stored, actual)]} for keys that differ
+def check_aggregates(conn=None, limit=20):
+
+    mismatches = {}
+    with connection(conn) as conn, conn.cursor() as c:
+        for table, keys, source in aggregate_sources():
+            key_list = ", ".join(keys)
+            c.execute(f"""
+                SELECT {key_list}, COALESCE(a.job_count, 0), COALESCE(f.job_count, 0)
+                FROM {table} a
+                FULL OUTER JOIN ({source}) f USING ({key_list})
+                WHERE COALESCE(a.job_count, 0) != COALESCE(f.job_count, 0)
+                LIMIT %s
+            """, (limit,))
+            rows = c.fetchall()
+            mismatches[table] = [(row[:len(keys)], row[-2], row[-1]) for row in rows]
+        conn.rollback()
+
+    return mismatches
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command == "rebuild":
+        rebuild_aggregates()
+        print("Rebuilt aggregate tables")
+    elif command == "check":
+        mismatches = check_aggregates()
+        for table, rows in mismatches.items():
+            print(f"{'OK  ' if not rows else 'DIFF'} {table}")
+            for key, stored, actual in rows:
+                print(f"     {key}: stored {stored}, actual {actual}")
+        if any(mismatches.values()):
+            sys.exit(1)
+    else:
+        print("Usage: python -m backend.aggregates [rebuild|check]")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
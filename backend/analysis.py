@@ -1,179 +1,437 @@
 import pandas as pd
 from dotenv import load_dotenv
 import os
-import psycopg2
-from backend.process_skills import top_skills_per_query
+from collections import defaultdict
+from backend.db import connection, fetch_records, fetch_rows
 from backend.data.skills_dic import US_STATES, CA_PROV_TERR
 import json
+from datetime import date, timedelta
 
 load_dotenv()
 
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
-
-
-
-# This function returns a dataframe with the number of job postings as per a given frequency (daily vs weekly vs monthly, etc...)
-# Takes in a frequency argument, start and end date, and a group_by argument (default: search_query, to get job postings per role)
-# Returns DF
-
-#TODO: USE c.cursor() and row.fetchall() because pandas aint liking Postgres
-def job_volume_over_time(
-        host=HOST,
-        port=PORT, 
-        dbname=DBNAME, 
-        user=USER, 
-        password=PASSWORD,
-        freq = "W",
-        start_date = None,
-        end_date = None,
-        group_by = "search_query",
-        dedupe = True,
-        visualize = False,
-):
-    
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
-    params = []
-    where = ["date_posted IS NOT NULL"]   # Make sure date not null and not an empty string
-    
+
+# Job volume time series
+# Jobs are bucketed per day/week/month with date_trunc in SQL and returned as a columnar payload: one array of bucket
+# dates and one array of counts per group, aligned with it (buckets with no jobs are 0).
+# Grouping by search_query or job_country reads agg_daily_counts; any other column in ALLOWED_GROUPS counts job_listings.
+# Both paths produce the same keys (text, '' for NULL, countries lowercased as agg_daily_counts stores them) and filter
+# location the same way. Other keys keep their stored case, so search_query keys match the other endpoints
+
+FREQS = {"D": "day", "W": "week", "M": "month", "day": "day", "week": "week", "month": "month"}
+DAILY_AGGREGATE_GROUPS = ("search_query", "job_country")
+
+
+# Columns job volume can be grouped by: the aggregate-backed ones always, plus any listed in ALLOWED_GROUPS
+def allowed_groups():
+    extra = json.loads(os.getenv("ALLOWED_GROUPS", "[]"))
+    return list(DAILY_AGGREGATE_GROUPS) + [group for group in extra if group not in DAILY_AGGREGATE_GROUPS]
+
+
+# Group key / filter expression for a column, the same on agg_daily_counts and job_listings
+def volume_key(column):
+    key = f"COALESCE({column}::text, '')"
+    return f"LOWER({key})" if column == "job_country" else key
+
+
+# Builds the bucketed counts query. Rows are (bucket, group_key, job_count) for every bucket between the first and the
+# last one (group_key/job_count NULL for empty buckets), ordered by bucket.
+# group_by must be in allowed_groups() (it is interpolated as a column name); None counts all jobs as one group
+def job_volume_query(freq="week", start_date=None, end_date=None, group_by="search_query", location=None):
+
+    unit = FREQS.get(freq)
+    if unit is None:
+        raise ValueError(f"Invalid freq. Allowed: {list(FREQS)}")
+    if group_by and group_by not in allowed_groups():
+        raise ValueError(f"Invalid group_by. Allowed: {allowed_groups()}")
+
+    if group_by is None or group_by in DAILY_AGGREGATE_GROUPS:
+        source, day, count = "agg_daily_counts", "day", "SUM(job_count)"
+        where = ["TRUE"]
+    else:
+        source, day, count = "job_listings", "date_posted", "COUNT(*)"
+        where = ["date_posted IS NOT NULL"]
+
     if start_date:
-        where.append("date_posted >= date(%s)")
-        params.append(start_date)
+        where.append(f"{day} >= date(%(start_date)s)")
     if end_date:
-        where.append("date_posted <= date(%s)")
-        params.append(end_date)
-
-    count_expr = "COUNT(DISTINCT id)" if dedupe else "COUNT(*)"
-
-    if group_by:
-        allowed_groups = json.loads(os.getenv("ALLOWED_GROUPS", "[]"))
-        if group_by not in allowed_groups:
-            raise ValueError(f"Invalid group_by. Allowed: {allowed_groups}")
-        sql = f"""
-        SELECT date(date_posted) AS d, {group_by} AS group_key, {count_expr} AS job_count
-        FROM job_listings
-        WHERE {" AND ".join(where)}
-        GROUP BY d, group_key
-        ORDER BY d
-        """
+        where.append(f"{day} <= date(%(end_date)s)")
+    if location:
+        where.append(f"{volume_key('job_country')} = LOWER(%(location)s)")
+
+    group_key = volume_key(group_by) if group_by else "'total'"
+    query = f"""
+        WITH counts AS (
+            SELECT date_trunc('{unit}', {day})::date AS bucket, {group_key} AS group_key, {count}::bigint AS job_count
+            FROM {source}
+            WHERE {" AND ".join(where)}
+            GROUP BY 1, 2
+        ),
+        axis AS (
+            SELECT generate_series(MIN(bucket), MAX(bucket), interval '1 {unit}')::date AS bucket
+            FROM counts
+        )
+        SELECT a.bucket, c.group_key, c.job_count
+        FROM axis a
+        LEFT JOIN counts c USING (bucket)
+        ORDER BY a.bucket
+    """
+    params = {"start_date": start_date, "end_date": end_date, "location": location}
+    return query, params
 
-        
-        df = pd.read_sql(sql, conn, params=params)
-        conn.close()
 
-        if df.empty:
-            return pd.DataFrame(columns=["date", "job_count"])
+# Turns (bucket, group_key, job_count) rows into {"freq", "group_by", "dates", "series": {group: [counts]}}
+def job_volume_payload(rows, freq="week", group_by="search_query"):
+    dates = []
+    series = {}
+    for bucket, group_key, job_count in rows:
+        if not dates or dates[-1] != bucket:
+            dates.append(bucket)
+        if group_key is not None:
+            series.setdefault(group_key, {})[len(dates) - 1] = job_count
 
-        # Organize into 
-        df["d"] = pd.to_datetime(df["d"])
-        pivot = df.pivot(index="d", columns="group_key", values="job_count").fillna(0)
+    return {
+        "freq": FREQS[freq],
+        "group_by": group_by,
+        "dates": [bucket.isoformat() for bucket in dates],
+        "series": {group: [counts.get(i, 0) for i in range(len(dates))] for group, counts in sorted(series.items())},
+    }
 
-        if freq != "D":
-            pivot = pivot.resample(freq).sum()
 
-        result_df = pivot.reset_index().rename(columns={"d": "date"})
-        
-        
-        return result_df
-    
-    
-    else:
-        print(f"Function called with no group_by param, exiting...")
-        return None
-        
+# Number of job postings per day/week/month (freq "D"/"W"/"M" or "day"/"week"/"month") between start_date and
+# end_date, per group_by column (default: search_query, to get job postings per role)
+# Returns {"freq", "group_by", "dates": [...], "series": {group: [counts aligned with dates]}}
+def job_volume_over_time(conn=None, freq="W", start_date=None, end_date=None, group_by="search_query", location=None):
 
+    query, params = job_volume_query(freq, start_date, end_date, group_by, location)
+
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute(query, params)
+        rows = c.fetchall()
+
+    return job_volume_payload(rows, freq, group_by)
 
-# Function that returns top skills for each role 
-# Returns a DF
-def top_skills(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, role=None, top_k=10, visualize=False):
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
+async def job_volume_over_time_async(aconn, freq="week", start_date=None, end_date=None, group_by="search_query",
+                                     location=None):
+    rows = await fetch_rows(aconn, *job_volume_query(freq, start_date, end_date, group_by, location))
+    return job_volume_payload(rows, freq, group_by)
 
-    # Get skills and frequency from job_skills table 
+
+
+# Builds the top skills query (optionally for a single role)
+def top_skills_query(role=None, top_k=10):
+
+    # Get skills and frequency from the per (query, skill) counts kept in agg_skill_counts
     query = """
-    SELECT js.skill, COUNT(*) as freq
-    FROM job_skills js
+    SELECT s.skill, SUM(s.job_count)::bigint as freq
+    FROM agg_skill_counts s
     """
 
     # if role parameter set, match with role and add to param 
     if role:
-        query += " WHERE js.search_query ILIKE %s"
+        query += " WHERE s.search_query ILIKE %s"
         params = (f"%{role}%",)
     else:
         params = ()
 
     # Group by skill, order by frequency and only get top k skills
-    query += " GROUP BY js.skill ORDER BY freq DESC LIMIT %s"
+    query += " GROUP BY s.skill ORDER BY freq DESC LIMIT %s"
     params += (top_k,)
 
+    return query, params
 
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
+
+# Function that returns top skills for each role 
+# Returns a DF
+def top_skills(conn=None, role=None, top_k=10, visualize=False):
+
+    query, params = top_skills_query(role, top_k)
+
+    with connection(conn) as conn:
+        df = pd.read_sql(query, conn, params=params)
     
     
     return df
 
 
-# Function that returns count of on site vs remote jobs
-# Returns a DF
-def remote_vs_onsite(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, visualize=False):
+async def top_skills_async(aconn, role=None, top_k=10):
+    return await fetch_records(aconn, *top_skills_query(role, top_k))
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
-    query = """
-        SELECT
-            CASE
-                WHEN job_is_remote = 'true' THEN 'Remote'
-                ELSE 'Onsite/Hybrid'
-            END as work_type,
-            COUNT(*) as count
-        FROM job_listings
-        GROUP BY work_type
+# Builds the top N skills per search_query query. The ranking happens in SQL (ROW_NUMBER over each search_query), so
+# only top_n rows per query come back. Without filters it reads agg_skill_counts; with a location (country) or a
+# date_posted range it counts job_skills joined to job_listings. Ties are broken by skill name so results are stable
+def top_skills_per_query_query(top_n=10, location=None, start_date=None, end_date=None):
+
+    if not (location or start_date or end_date):
+        counts = """
+            SELECT search_query, skill, job_count AS freq
+            FROM agg_skill_counts
+        """
+        params = []
+    else:
+        where = []
+        params = []
+        if location:
+            where.append("LOWER(j.job_country) = LOWER(%s)")
+            params.append(location)
+        if start_date:
+            where.append("j.date_posted >= date(%s)")
+            params.append(start_date)
+        if end_date:
+            where.append("j.date_posted <= date(%s)")
+            params.append(end_date)
+        counts = f"""
+            SELECT js.search_query, js.skill, COUNT(*) AS freq
+            FROM job_skills js
+            JOIN job_listings j ON j.id = js.job_id
+            WHERE {" AND ".join(where)}
+            GROUP BY js.search_query, js.skill
+        """
+
+    query = f"""
+        SELECT search_query, skill, freq
+        FROM (
+            SELECT search_query, skill, freq,
+                   ROW_NUMBER() OVER (PARTITION BY search_query ORDER BY freq DESC, skill) AS rank
+            FROM ({counts}) counts
+        ) ranked
+        WHERE rank <= %s
+        ORDER BY search_query, rank
+    """
+    return query, tuple(params) + (top_n,)
+
+
+# Groups ranked (search_query, skill, freq) rows into {search_query: [(skill, freq), ...]}
+def group_top_skills(rows):
+    # Organize into defaultdict (to prevent KeyError)
+    results = defaultdict(list)
+    for search_query, skill, freq in rows:
+        results[search_query].append((skill, freq))
+
+    return dict(results)   # converting back to normal dict
+
+
+# Get the top N most frequent skills for each search_query (role), optionally only for jobs in a country and/or
+# posted within a date range
+# Returns dict: {search_query: [(skill, count), ...]}
+def top_skills_per_query(conn=None, top_n=10, location=None, start_date=None, end_date=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+        # Run query
+        c.execute(*top_skills_per_query_query(top_n, location, start_date, end_date))
+        rows = c.fetchall()
+
+    return group_top_skills(rows)
+
+
+async def top_skills_per_query_async(aconn, top_n=10, location=None, start_date=None, end_date=None):
+    rows = await fetch_rows(aconn, *top_skills_per_query_query(top_n, location, start_date, end_date))
+    return group_top_skills(rows)
+
+
+# Converts {search_query: [(skill, count), ...]} into the list of skill objects returned by the API
+def skills_per_query_records(skills_dic):
+    return [
+        {
+            "search_query": query, 
+            "skills": [{"skill": skill, "freq": freq} for skill, freq in skill_list]
+        }
+        for query, skill_list in skills_dic.items()
+    ]
+
+
+# Trending skills
+# Compares each skill's share of all skill mentions in the last `weeks` full weeks (by week posted) with its share in
+# the `baseline_weeks` before them, read from agg_skill_weekly_counts. Shares, not raw counts, so a week with more
+# scraped (or more extracted) jobs doesn't make every skill look like it is rising.
+# growth is recent_share / baseline_share - 1 (None for skills absent from the baseline), z the two-proportion z-score
+# of the difference, used for the ranking so that small counts need a bigger move to rank
+
+# Start of the recent window and of the baseline, and the (exclusive) end: the Monday of as_of's week, so the current
+# partial week is left out
+def trending_windows(weeks=4, baseline_weeks=12, as_of=None):
+    if weeks < 1 or baseline_weeks < 1:
+        raise ValueError("weeks and baseline_weeks must be at least 1")
+    as_of = as_of or date.today()
+    end = as_of - timedelta(days=as_of.weekday())
+    recent_start = end - timedelta(weeks=weeks)
+    return recent_start - timedelta(weeks=baseline_weeks), recent_start, end
+
+
+# Builds the trending query: the top_k rising (z > 0) then the top_k falling (z < 0) skills, as
+# (direction, skill, recent_count, baseline_count, recent_share, baseline_share, growth, z).
+# role matches search_query like top_skills does, location is a country
+def trending_skills_query(role=None, location=None, weeks=4, baseline_weeks=12, top_k=10, min_count=5, as_of=None):
+
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    baseline_start, recent_start, end = trending_windows(weeks, baseline_weeks, as_of)
+
+    where = ["week >= %(baseline_start)s", "week < %(end)s"]
+    if role:
+        where.append("search_query ILIKE %(role)s")
+    if location:
+        where.append("job_country = LOWER(%(location)s)")
+
+    query = f"""
+        WITH weekly AS (
+            SELECT skill, week >= %(recent_start)s AS recent, SUM(job_count) AS mentions
+            FROM agg_skill_weekly_counts
+            WHERE {" AND ".join(where)}
+            GROUP BY 1, 2
+        ),
+        totals AS (
+            SELECT COALESCE(SUM(mentions) FILTER (WHERE recent), 0) AS recent_total,
+                   COALESCE(SUM(mentions) FILTER (WHERE NOT recent), 0) AS baseline_total
+            FROM weekly
+        ),
+        skills AS (
+            SELECT skill,
+                   COALESCE(SUM(mentions) FILTER (WHERE recent), 0) AS recent_count,
+                   COALESCE(SUM(mentions) FILTER (WHERE NOT recent), 0) AS baseline_count
+            FROM weekly
+            GROUP BY skill
+            HAVING SUM(mentions) >= %(min_count)s
+        ),
+        scored AS (
+            SELECT s.skill, s.recent_count, s.baseline_count,
+                   s.recent_count::float / t.recent_total AS recent_share,
+                   s.baseline_count::float / t.baseline_total AS baseline_share,
+                   (s.recent_count + s.baseline_count)::float / (t.recent_total + t.baseline_total) AS pooled,
+                   t.recent_total, t.baseline_total
+            FROM skills s, totals t
+            WHERE t.recent_total > 0 AND t.baseline_total > 0
+        ),
+        trends AS (
+            SELECT skill, recent_count, baseline_count, recent_share, baseline_share,
+                   recent_share / NULLIF(baseline_share, 0) - 1 AS growth,
+                   (recent_share - baseline_share)
+                       / NULLIF(sqrt(pooled * (1 - pooled) * (1.0 / recent_total + 1.0 / baseline_total)), 0) AS z
+            FROM scored
+        )
+        (SELECT 'rising', * FROM trends WHERE z > 0 ORDER BY z DESC, skill LIMIT %(top_k)s)
+        UNION ALL
+        (SELECT 'falling', * FROM trends WHERE z < 0 ORDER BY z, skill LIMIT %(top_k)s)
     """
+    params = {"baseline_start": baseline_start, "recent_start": recent_start, "end": end, "role": f"%{role}%",
+              "location": location, "min_count": min_count, "top_k": top_k}
+    return query, params
+
+
+# Turns trending rows into {"window": {...}, "rising": [...], "falling": [...]}
+def trending_payload(rows, weeks=4, baseline_weeks=12, as_of=None):
+    baseline_start, recent_start, end = trending_windows(weeks, baseline_weeks, as_of)
+    payload = {
+        "window": {"baseline_start": baseline_start.isoformat(), "recent_start": recent_start.isoformat(),
+                   "end": end.isoformat()},
+        "rising": [],
+        "falling": [],
+    }
+    for direction, skill, recent_count, baseline_count, recent_share, baseline_share, growth, z in rows:
+        payload[direction].append({
+            "skill": skill,
+            "recent_count": recent_count,
+            "baseline_count": baseline_count,
+            "recent_share": round(recent_share, 6),
+            "baseline_share": round(baseline_share, 6),
+            "growth": round(growth, 4) if growth is not None else None,
+            "z": round(z, 2),
+        })
+    return payload
+
+
+# Fastest rising and falling skills for a role and/or country (all jobs if neither)
+# Returns {"window": {"baseline_start", "recent_start", "end"}, "rising": [...], "falling": [...]}
+def trending_skills(conn=None, role=None, location=None, weeks=4, baseline_weeks=12, top_k=10, min_count=5, as_of=None):
+
+    as_of = as_of or date.today()
+    query, params = trending_skills_query(role, location, weeks, baseline_weeks, top_k, min_count, as_of)
+
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute(query, params)
+        rows = c.fetchall()
+
+    return trending_payload(rows, weeks, baseline_weeks, as_of)
+
+
+async def trending_skills_async(aconn, role=None, location=None, weeks=4, baseline_weeks=12, top_k=10, min_count=5,
+                                as_of=None):
+    as_of = as_of or date.today()
+    rows = await fetch_rows(aconn, *trending_skills_query(role, location, weeks, baseline_weeks, top_k, min_count, as_of))
+    return trending_payload(rows, weeks, baseline_weeks, as_of)
 
-    df = pd.read_sql(query, conn)
-    conn.close()
+
+REMOTE_VS_ONSITE_SQL = """
+    SELECT work_type, job_count as count
+    FROM agg_remote_counts
+"""
+
+
+# Function that returns count of on site vs remote jobs
+# Returns a DF
+def remote_vs_onsite(conn=None, visualize=False):
+
+    with connection(conn) as conn:
+        df = pd.read_sql(REMOTE_VS_ONSITE_SQL, conn)
 
 
     return df
 
 
-# Analyze and visualize the geographic distribution of jobs
-def geographic_distribution(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, location=None):
+async def remote_vs_onsite_async(aconn):
+    return await fetch_records(aconn, REMOTE_VS_ONSITE_SQL)
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
-    
+
+# States/provinces to keep for a given location (None keeps everything)
+def location_states(location):
+    if location == "US":
+        return US_STATES
+    elif location == "CA":
+        return CA_PROV_TERR
+    return None
+
+
+# Builds the jobs per state query, read from agg_state_counts. The location filter is applied in SQL with an array parameter
+def geographic_distribution_query(location=None):
+    states = location_states(location)
     query = """
-        SELECT job_state, COUNT(*) as job_count
-        FROM job_listings
-        WHERE job_state != 'Remote'
-        GROUP BY job_state
+        SELECT job_state, job_count
+        FROM agg_state_counts
+        WHERE job_state NOT IN ('Remote', '')
+    """
+    params = ()
+    if states is not None:
+        query += " AND job_state = ANY(%s)"
+        params = (list(states),)
+    query += """
         ORDER BY job_count DESC
     """
-    
-    df = pd.read_sql(query, conn)
+    return query, params
 
-    if location == "US":
-        states = US_STATES
-        df = df[df["job_state"].isin(states)]
-    elif location == "CA":
-        prov_terr = CA_PROV_TERR
-        df = df[df["job_state"].isin(prov_terr)]
 
+# Analyze and visualize the geographic distribution of jobs
+def geographic_distribution(conn=None, location=None):
+
+    query, params = geographic_distribution_query(location)
+
+    with connection(conn) as conn:
+        df = pd.read_sql(query, conn, params=params)
 
-    conn.close()
     
     return df
 
+
+async def geographic_distribution_async(aconn, location=None):
+    return await fetch_records(aconn, *geographic_distribution_query(location))
+
 # MAIN
 def main():
     # Job volume
-    pass
+    volume = job_volume_over_time(freq="W")
+    for group, counts in volume["series"].items():
+        print(f"{group}: {sum(counts)} jobs over {len(counts)} weeks")
 
 if  __name__ == "__main__":
     main()
\ No newline at end of file
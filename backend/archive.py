@@ -0,0 +1,179 @@
+# Raw JSearch response archive
+# Every successful API response is appended, as returned, to gzip-compressed JSONL files partitioned by day and query:
+#   <JSEARCH_ARCHIVE_DIR>/<endpoint>/<YYYY-MM-DD>/<query>.jsonl.gz
+# Each write appends its own gzip member, so files are append-only and a crash mid-write loses at most the last record.
+# replay() re-ingests the archive through the normal parse/store path without touching the network, so parsing changes
+# can be applied to past scrapes for free (and the archive doubles as a realistic offline benchmark corpus)
+#
+# Usage:
+#   python -m backend.archive replay [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--query Q ...] [--salaries]
+
+import argparse
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone, date
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVE_DIR = os.getenv("JSEARCH_ARCHIVE_DIR", "archive")   # set to an empty string to turn archiving off
+
+ENDPOINT_DIRS = {"/search": "search", "/estimated-salary": "estimated-salary"}
+PARTITION_PARAMS = {"/search": "query", "/estimated-salary": "job_title"}   # param each endpoint is partitioned by
+
+
+# Filesystem-safe file name for a query
+def slugify(value):
+    return re.sub(r"[^a-z0-9]+", "-", (value or "").lower()).strip("-") or "unknown"
+
+
+class ResponseArchive:
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._lock = threading.Lock()    # one writer at a time, so concurrent fetches never interleave records
+
+
+    def partition_path(self, path, params, day):
+        endpoint = ENDPOINT_DIRS.get(path, slugify(path))
+        query = params.get(PARTITION_PARAMS.get(path, "query"))
+        return os.path.join(self.root, endpoint, day.isoformat(), f"{slugify(query)}.jsonl.gz")
+
+
+    # Appends one response. params are the request's query params, body the decoded JSON response
+    def write(self, path, params, body):
+        fetched_at = datetime.now(timezone.utc)
+        record = {"fetched_at": fetched_at.isoformat(), "path": path, "params": params, "response": body}
+        line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        file_path = self.partition_path(path, params, fetched_at.date())
+
+        with self._lock:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "ab") as f:
+                f.write(gzip.compress(line))
+
+
+    # Archive files for an endpoint, oldest day first, optionally limited to a day range and a set of queries
+    def files(self, path="/search", since=None, until=None, queries=None):
+        endpoint_dir = os.path.join(self.root, ENDPOINT_DIRS.get(path, slugify(path)))
+        if not os.path.isdir(endpoint_dir):
+            return []
+
+        slugs = {slugify(query) for query in queries} if queries else None
+        found = []
+        for day_name in sorted(os.listdir(endpoint_dir)):
+            try:
+                day = date.fromisoformat(day_name)
+            except ValueError:
+                continue
+            if (since and day < since) or (until and day > until):
+                continue
+            day_dir = os.path.join(endpoint_dir, day_name)
+            for name in sorted(os.listdir(day_dir)):
+                if name.endswith(".jsonl.gz") and (slugs is None or name[:-len(".jsonl.gz")] in slugs):
+                    found.append(os.path.join(day_dir, name))
+        return found
+
+
+    # Streams archived records one at a time (a truncated final record from an interrupted write is skipped)
+    def records(self, path="/search", since=None, until=None, queries=None):
+        for file_path in self.files(path, since, until, queries):
+            with gzip.open(file_path, "rt", encoding="utf-8") as f:
+                try:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                except (EOFError, gzip.BadGzipFile) as e:
+                    print(f"Stopped reading {file_path} early: {e}")
+
+
+
+def default_archive():
+    return ResponseArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
+
+
+# Re-ingests archived /search responses into job_listings in batches of batch_size jobs. Jobs are tagged with their
+# search_query the same way JSearchClient.search does. Returns the store stats plus records/jobs read and elapsed time
+def replay_jobs(archive=None, since=None, until=None, queries=None, batch_size=1000, method="copy", conn=None):
+    from backend.scraper import store_jobs
+
+    archive = archive or ResponseArchive()
+    stats = {"records": 0, "jobs": 0, "inserted": 0, "duplicates": 0, "parse_errors": 0}
+    batch = []
+
+    def flush():
+        result = store_jobs(batch, conn, method=method)
+        stats["inserted"] += result["inserted"]
+        stats["duplicates"] += result["duplicates"]
+        stats["parse_errors"] += len(result["errors"])
+        batch.clear()
+
+    start = time.perf_counter()
+    for record in archive.records("/search", since, until, queries):
+        search_query = f"{record['params'].get('query', '')}".strip()
+        jobs = (record.get("response") or {}).get("data") or []
+        for job in jobs:
+            job["search_query"] = search_query
+        stats["records"] += 1
+        stats["jobs"] += len(jobs)
+        batch.extend(jobs)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+# Re-ingests archived /estimated-salary responses into salaries. The newest response per (city, role) wins
+def replay_salaries(archive=None, since=None, until=None, roles=None, conn=None):
+    from backend.salary import store_salaries
+
+    archive = archive or ResponseArchive()
+    latest = {}
+    for record in archive.records("/estimated-salary", since, until, roles):
+        params = record["params"]
+        latest[(params.get("job_title"), params.get("location"))] = (record.get("response") or {}).get("data") or []
+
+    by_role = {}
+    for (role, city), data in latest.items():
+        by_role.setdefault(role, []).append((city, data))
+
+    stored = 0
+    for role, rows in by_role.items():
+        stored += store_salaries(role, rows, conn)
+    return {"records": len(latest), "stored": stored}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.archive")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    replay = subcommands.add_parser("replay", help="re-ingest archived responses without calling the API")
+    replay.add_argument("--since", type=date.fromisoformat)
+    replay.add_argument("--until", type=date.fromisoformat)
+    replay.add_argument("--query", action="append", dest="queries", help="only this query (repeatable)")
+    replay.add_argument("--batch-size", type=int, default=1000)
+    replay.add_argument("--method", choices=["values", "copy"], default="copy")
+    replay.add_argument("--salaries", action="store_true", help="also replay /estimated-salary responses")
+    args = parser.parse_args()
+
+    stats = replay_jobs(since=args.since, until=args.until, queries=args.queries, batch_size=args.batch_size,
+                        method=args.method)
+    rate = stats["jobs"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"Replayed {stats['records']} responses ({stats['jobs']} jobs) in {stats['seconds']:.2f}s ({rate:.0f} jobs/sec): "
+          f"{stats['inserted']} new, {stats['duplicates']} duplicates, {stats['parse_errors']} parse errors")
+
+    if args.salaries:
+        salary_stats = replay_salaries(since=args.since, until=args.until, roles=args.queries)
+        print(f"Replayed {salary_stats['records']} salary responses, stored {salary_stats['stored']}")
+
+
+if __name__ == "__main__":
+    main()
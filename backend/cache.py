@@ -0,0 +1,148 @@
+# Response cache for the dashboard endpoints
+# Entries are keyed by endpoint + query params, expire after a TTL, are evicted LRU, and are dropped as soon as
+# the data version of a table they were computed from changes
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+from backend.versions import version_tracker
+
+load_dotenv()
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+
+
+# Interface for cache storage. Swap in another implementation (e.g. Redis) with set_cache_backend()
+class CacheBackend:
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+# In-process cache with per-entry TTL and LRU eviction once max_entries is reached
+class TTLCache(CacheBackend):
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expirations = 0
+
+
+    # Returns the cached value, or None if missing/expired
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+
+# Ties a backend to the data version tracker
+class ResponseCache:
+
+    def __init__(self, backend, tracker=version_tracker):
+        self.backend = backend
+        self.tracker = tracker
+        self.hits = 0
+        self.misses = 0
+
+
+    @staticmethod
+    def make_key(endpoint, params):
+        params = {k: v for k, v in params.items() if v is not None}
+        return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+
+    # Returns the cached result for endpoint + params, or awaits compute() and caches it.
+    # tables lists the tables the result depends on; a version bump on any of them makes the entry stale
+    async def get_or_compute(self, endpoint, params, tables, compute, ttl=None):
+        key = self.make_key(endpoint, params)
+        versions = await self.tracker.version_of(tables)
+
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == versions:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = await compute()
+        self.backend.set(key, (versions, value), ttl)
+        return value
+
+
+    # Weak ETag for endpoint + params at the current data versions. Changes whenever a dependent table is written
+    async def etag(self, endpoint, params, tables):
+        versions = await self.tracker.version_of(tables)
+        raw = f"{self.make_key(endpoint, params)}|{versions}"
+        return f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+
+
+    def clear(self):
+        self.backend.clear()
+
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            **self.backend.stats(),
+        }
+
+
+response_cache = ResponseCache(TTLCache())
+
+
+def set_cache_backend(backend):
+    response_cache.backend = backend
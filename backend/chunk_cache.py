@@ -0,0 +1,193 @@
+# Chunk-level NER result cache
+# Descriptions repeat large blocks verbatim (EEO statements, benefits, company blurbs) and the same job gets reposted
+# under several queries, so many chunks reaching the model have been seen before. The raw entities for each chunk are
+# kept in Postgres keyed by a hash of the exact chunk text and the model/backend that produced them,
+# and extract_skills_batch only runs the model on chunks missing from it.
+# The table is bounded: prune() keeps the max_entries most recently used chunks
+#
+# Usage:
+#   python -m backend.chunk_cache stats     entries per model
+#   python -m backend.chunk_cache prune     evict down to CHUNK_CACHE_MAX_ENTRIES
+#   python -m backend.chunk_cache clear     drop every entry
+
+import argparse
+import hashlib
+import json
+import os
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from backend.db import connection
+
+load_dotenv()
+
+CHUNK_CACHE_ENABLED = os.getenv("NER_CHUNK_CACHE", "1") == "1"
+CHUNK_CACHE_MAX_ENTRIES = int(os.getenv("CHUNK_CACHE_MAX_ENTRIES", "500000"))
+# Part of every key. Bump it when what an entry means changes: entries stored under an older version never hit again
+# and age out through prune(). 2: keys hash the exact chunk text (entity offsets are only valid for that text)
+CHUNK_KEY_VERSION = 2
+
+
+def create_chunk_cache_table(conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS ner_chunk_cache (
+                chunk_hash TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                entities JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                last_used_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS ner_chunk_cache_last_used_idx ON ner_chunk_cache (last_used_at)")
+
+        conn.commit()
+
+
+# Cache key of a chunk. The text is hashed exactly as given: cached entities carry start/end offsets into it, which
+# kept_entities compares with the chunk's keep range, so a chunk that differs even in whitespace needs its own entry
+def chunk_key(chunk, model):
+    return hashlib.sha256(f"v{CHUNK_KEY_VERSION}\n{model}\n{chunk}".encode("utf-8")).hexdigest()
+
+
+# Keeps only the fields merge_entities and kept_entities read, as plain JSON types (the pipeline returns numpy floats)
+def compact_entities(entities):
+    return [{"word": ent["word"], "entity_group": ent.get("entity_group"), "score": float(ent["score"]),
+             "start": ent.get("start"), "end": ent.get("end")}
+            for ent in entities]
+
+
+# Postgres-backed chunk cache. Each call borrows its own pooled connection and commits, so it works the same in the
+# main process and in extraction workers. hits/misses count lookups made through this instance
+class ChunkCache:
+
+    def __init__(self, model=None, max_entries=CHUNK_CACHE_MAX_ENTRIES):
+        if model is None:
+            from backend.extract_skills import source_model
+            model = source_model()
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._schema_ready = False
+
+
+    def _ensure_table(self, conn):
+        if not self._schema_ready:
+            create_chunk_cache_table(conn)
+            self._schema_ready = True
+
+
+    # Returns {chunk: entities} for the chunks already cached, and marks them as used
+    def get_many(self, chunks):
+
+        keys = {chunk_key(chunk, self.model): chunk for chunk in set(chunks)}
+        if not keys:
+            return {}
+
+        with connection() as conn, conn.cursor() as c:
+            self._ensure_table(conn)
+            c.execute("""
+                UPDATE ner_chunk_cache
+                SET last_used_at = now()
+                WHERE chunk_hash = ANY(%s)
+                RETURNING chunk_hash, entities
+            """, (list(keys),))
+            found = {keys[chunk_hash]: entities for chunk_hash, entities in c.fetchall()}
+            conn.commit()
+
+        self.record(sum(chunk in found for chunk in chunks), sum(chunk not in found for chunk in chunks))
+        return found
+
+
+    # Stores {chunk: entities} for chunks that just went through the model
+    def put_many(self, results):
+
+        rows = [(chunk_key(chunk, self.model), self.model, json.dumps(compact_entities(entities)))
+                for chunk, entities in results.items()]
+        if not rows:
+            return
+
+        with connection() as conn, conn.cursor() as c:
+            self._ensure_table(conn)
+            execute_values(c, """
+                INSERT INTO ner_chunk_cache (chunk_hash, model, entities)
+                VALUES %s
+                ON CONFLICT (chunk_hash) DO UPDATE
+                    SET entities = EXCLUDED.entities,
+                    last_used_at = now()
+            """, rows, template="(%s, %s, %s::jsonb)")
+            conn.commit()
+
+
+    # Adds lookups counted elsewhere (e.g. by a worker process's own cache instance)
+    def record(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+
+    # Evicts the least recently used entries beyond max_entries. Returns how many were deleted
+    def prune(self):
+        with connection() as conn, conn.cursor() as c:
+            self._ensure_table(conn)
+            c.execute("""
+                DELETE FROM ner_chunk_cache
+                WHERE chunk_hash IN (
+                    SELECT chunk_hash FROM ner_chunk_cache
+                    ORDER BY last_used_at DESC
+                    OFFSET %s
+                )
+            """, (self.max_entries,))
+            deleted = c.rowcount
+            conn.commit()
+        return deleted
+
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Entries and last use per model
+def cache_summary(conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        create_chunk_cache_table(conn)
+        c.execute("""
+            SELECT model, COUNT(*), MAX(last_used_at)
+            FROM ner_chunk_cache
+            GROUP BY model
+            ORDER BY model
+        """)
+        return c.fetchall()
+
+
+def clear_cache(conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        create_chunk_cache_table(conn)
+        c.execute("TRUNCATE ner_chunk_cache")
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.chunk_cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        for model, entries, last_used in cache_summary():
+            print(f"{model}: {entries} chunks, last used {last_used}")
+    elif args.command == "prune":
+        deleted = ChunkCache(model="").prune()
+        print(f"Evicted {deleted} chunk(s), keeping at most {CHUNK_CACHE_MAX_ENTRIES}")
+    else:
+        clear_cache()
+        print("Cleared the chunk cache")
+
+
+if __name__ == "__main__":
+    main()
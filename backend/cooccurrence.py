@@ -0,0 +1,297 @@
+# Skill co-occurrence
+# job_skills is loaded once into a sparse job x skill incidence matrix X (skill names and search queries interned to
+# integer ids), and the co-occurrence counts C = X.T @ X are kept per search_query (plus one matrix over all jobs).
+# C[a, b] is the number of jobs listing both skills, C[a, a] the number of jobs listing a, so lift and PMI come out of
+# one sparse row lookup and related skills are served from memory in well under a millisecond.
+#
+# The matrices are refreshed incrementally: process_jobs bumps the job_skills data version, and the next request
+# re-reads only the jobs whose job_skills rows changed since the last refresh (job_skills.updated_at). Their old rows
+# are subtracted from C and their new rows added, so re-reading a job twice is harmless
+#
+# Usage:
+#   python -m backend.cooccurrence SKILL [--query Q] [--metric lift|pmi|count] [--top-k N]
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import timedelta
+import numpy as np
+from scipy import sparse
+from dotenv import load_dotenv
+from backend.db import connection
+from backend.versions import version_tracker
+
+load_dotenv()
+
+# Jobs whose job_skills rows changed up to this long before the last refresh are re-read, so a transaction that
+# committed after the refresh with an earlier now() is not missed (process_jobs commits every few seconds)
+REFRESH_OVERLAP_SECONDS = float(os.getenv("COOCCURRENCE_OVERLAP_SECONDS", "300"))
+MIN_COUNT = int(os.getenv("COOCCURRENCE_MIN_COUNT", "3"))   # pairs seen in fewer jobs are too noisy to rank on lift
+METRICS = ("lift", "pmi", "count")   # pmi is log2(lift), so it ranks like lift
+ALL_QUERIES = None   # scope key of the matrix over every job
+
+
+# (job_id, search_query, skill) for every job with a job_skills row changed after `since` (every job if None)
+def changed_jobs_query(since=None):
+    if since is None:
+        return "SELECT job_id, COALESCE(search_query, ''), skill FROM job_skills ORDER BY job_id", ()
+    return """
+        SELECT job_id, COALESCE(search_query, ''), skill
+        FROM job_skills
+        WHERE job_id IN (SELECT job_id FROM job_skills WHERE updated_at > %s)
+        ORDER BY job_id
+    """, (since,)
+
+
+# What the API reads: interned names and the co-occurrence matrices. Replaced as a whole on every refresh, so a request
+# never sees a half-applied update
+class CooccurrenceSnapshot:
+
+    def __init__(self, skills, queries, matrices, job_counts):
+        self.skills = skills                                    # skill id -> name
+        self.skill_ids = {skill.lower(): i for i, skill in enumerate(skills)}
+        self.query_ids = {query: i for i, query in enumerate(queries)}
+        self.matrices = matrices                                # scope -> CSR skill x skill counts
+        self.skill_counts = {scope: matrix.diagonal() for scope, matrix in matrices.items()}
+        self.job_counts = job_counts                            # scope -> jobs with at least one skill
+
+
+    # Top k skills co-occurring with `skill` in jobs of search_query (all jobs if None), ranked by metric.
+    # Returns [] for an unknown skill or query
+    def related(self, skill, search_query=None, top_k=10, metric="lift", min_count=MIN_COUNT):
+        if metric not in METRICS:
+            raise ValueError(f"Invalid metric. Allowed: {list(METRICS)}")
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+
+        skill_id = self.skill_ids.get((skill or "").strip().lower())
+        scope = ALL_QUERIES if search_query is None else self.query_ids.get(search_query)
+        if skill_id is None or scope not in self.matrices:
+            return []
+
+        matrix = self.matrices[scope]
+        start, end = matrix.indptr[skill_id], matrix.indptr[skill_id + 1]
+        others = matrix.indices[start:end]
+        counts = matrix.data[start:end]
+        keep = (others != skill_id) & (counts >= min_count)
+        others, counts = others[keep], counts[keep]
+        if not len(others):
+            return []
+
+        skill_counts = self.skill_counts[scope]
+        lift = counts.astype(np.float64) * self.job_counts[scope] / (skill_counts[skill_id] * skill_counts[others])
+        score = {"lift": lift, "pmi": lift, "count": counts}[metric]
+
+        top = np.argpartition(-score, top_k - 1)[:top_k] if len(score) > top_k else np.arange(len(score))
+        top = top[np.lexsort((-counts[top], -score[top]))]
+        return [{"skill": self.skills[others[i]], "count": int(counts[i]),
+                 "share": round(float(counts[i] / skill_counts[skill_id]), 4),
+                 "lift": round(float(lift[i]), 4), "pmi": round(float(np.log2(lift[i])), 4)}
+                for i in top]
+
+
+    # Stored name of a skill looked up case-insensitively ("react" -> "React"), or None if no job lists it
+    def canonical(self, skill):
+        skill_id = self.skill_ids.get((skill or "").strip().lower())
+        return None if skill_id is None else self.skills[skill_id]
+
+
+    # Jobs listing the skill in search_query (all jobs if None)
+    def skill_jobs(self, skill, search_query=None):
+        skill_id = self.skill_ids.get((skill or "").strip().lower())
+        scope = ALL_QUERIES if search_query is None else self.query_ids.get(search_query)
+        if skill_id is None or scope not in self.matrices:
+            return 0
+        return int(self.skill_counts[scope][skill_id])
+
+
+EMPTY_SNAPSHOT = CooccurrenceSnapshot([], [], {}, {})
+
+
+class SkillCooccurrence:
+
+    def __init__(self, overlap=REFRESH_OVERLAP_SECONDS):
+        self.overlap = timedelta(seconds=overlap)
+        self.snapshot = EMPTY_SNAPSHOT
+        self._reset()
+        self._version = None
+        self._lock = asyncio.Lock()
+
+
+    def _reset(self):
+        self._skills = []
+        self._skill_ids = {}
+        self._queries = []
+        self._query_ids = {}
+        self._job_rows = {}                                      # job_id -> row of the incidence matrix
+        self._row_query = np.zeros(0, dtype=np.int32)            # row -> query id
+        self._incidence = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._matrices = {}
+        self._job_counts = {}
+        self._watermark = None                                   # MAX(job_skills.updated_at) seen by the last refresh
+        self.refreshed_at = None
+        self.last_refresh_seconds = None
+
+
+    def _intern(self, names, ids, value):
+        if value not in ids:
+            ids[value] = len(names)
+            names.append(value)
+        return ids[value]
+
+
+    # Reads the jobs changed since the last refresh (everything on the first call) and applies them.
+    # Returns the number of jobs re-read
+    def refresh(self, conn=None):
+        start = time.perf_counter()
+        with connection(conn) as conn, conn.cursor() as c:
+            # Read before the rows: anything committed in between is re-read next time
+            c.execute("SELECT MAX(updated_at) FROM job_skills")
+            watermark = c.fetchone()[0]
+            since = None if self._watermark is None else self._watermark - self.overlap
+            c.execute(*changed_jobs_query(since))
+            rows = c.fetchall()
+            conn.rollback()
+
+        jobs = {}
+        for job_id, search_query, skill in rows:
+            jobs.setdefault(job_id, (search_query, []))[1].append(skill)
+        if jobs:
+            try:
+                self._apply(jobs)
+            except Exception:
+                self._reset()   # the published snapshot is untouched; the next refresh rebuilds from scratch
+                raise
+        self._watermark = watermark or self._watermark
+        self.refreshed_at = time.time()
+        self.last_refresh_seconds = time.perf_counter() - start
+        return len(jobs)
+
+
+    # Recomputes everything from job_skills
+    def rebuild(self, conn=None):
+        self._reset()
+        return self.refresh(conn)
+
+
+    # Replaces the incidence rows of the given jobs ({job_id: (search_query, [skills])}) and updates the co-occurrence
+    # matrices by the difference: C -= X_old.T @ X_old, C += X_new.T @ X_new, per affected scope
+    def _apply(self, jobs):
+        n_old = len(self._row_query)
+        rows, queries, cols, indptr = [], [], [], [0]
+        for job_id, (search_query, skills) in jobs.items():
+            row = self._job_rows.get(job_id)
+            if row is None:
+                row = self._job_rows[job_id] = len(self._job_rows)
+            rows.append(row)
+            queries.append(self._intern(self._queries, self._query_ids, search_query))
+            cols.extend(self._intern(self._skills, self._skill_ids, skill) for skill in skills)
+            indptr.append(len(cols))
+
+        n_rows, n_skills = len(self._job_rows), len(self._skills)
+        rows = np.array(rows, dtype=np.int64)
+        queries = np.array(queries, dtype=np.int32)
+        new = sparse.csr_matrix((np.ones(len(cols), dtype=np.int32), cols, indptr), shape=(len(rows), n_skills))
+
+        existing = rows < n_old
+        old = self._incidence[rows[existing]]
+        old.resize((old.shape[0], n_skills))
+        old_queries = self._row_query[rows[existing]]
+
+        # Incidence: drop the old rows of re-read jobs, then place every job's new row
+        incidence = self._incidence.copy()
+        incidence.resize((n_rows, n_skills))
+        keep = np.ones(n_rows, dtype=np.int32)
+        keep[rows] = 0
+        placed = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, np.arange(len(rows)))),
+                                   shape=(n_rows, len(rows)))
+        self._incidence = (sparse.diags(keep, dtype=np.int32) @ incidence + placed @ new).tocsr()
+        self._incidence.eliminate_zeros()
+
+        row_query = np.zeros(n_rows, dtype=np.int32)
+        row_query[:n_old] = self._row_query
+        row_query[rows] = queries
+        self._row_query = row_query
+
+        matrices = dict(self._matrices)
+        job_counts = dict(self._job_counts)
+        scopes = [(ALL_QUERIES, None, None)] + [(q, old_queries == q, queries == q)
+                                                for q in np.union1d(old_queries, queries).tolist()]
+        for scope, old_mask, new_mask in scopes:
+            old_rows = old if old_mask is None else old[old_mask]
+            new_rows = new if new_mask is None else new[new_mask]
+            matrix = matrices.get(scope, sparse.csr_matrix((n_skills, n_skills), dtype=np.int32)).copy()
+            matrix.resize((n_skills, n_skills))
+            matrix = matrix - (old_rows.T @ old_rows) + (new_rows.T @ new_rows)
+            matrix.eliminate_zeros()
+            matrices[scope] = matrix.tocsr()
+            job_counts[scope] = job_counts.get(scope, 0) + new_rows.shape[0] - old_rows.shape[0]
+
+        self._matrices, self._job_counts = matrices, job_counts
+        self.snapshot = CooccurrenceSnapshot(list(self._skills), list(self._queries), matrices, job_counts)
+
+
+    # Brings the matrices up to date with the job_skills data version the API currently sees. The refresh runs in a
+    # thread so the event loop keeps serving meanwhile; concurrent callers wait for the same refresh
+    async def ensure_current(self):
+        version = await version_tracker.version_of(("job_skills",))
+        if version == self._version:
+            return self.snapshot
+        async with self._lock:
+            if version != self._version:
+                await asyncio.to_thread(self.refresh)
+                self._version = version
+        return self.snapshot
+
+
+    # Builds the matrices in the background at API startup, so the first request doesn't pay for the full load
+    async def warm_up(self):
+        try:
+            await self.ensure_current()
+        except Exception as e:
+            print(f"Error building skill co-occurrence: {e}")   # the first request retries
+
+
+    async def related(self, skill, search_query=None, top_k=10, metric="lift", min_count=MIN_COUNT):
+        snapshot = await self.ensure_current()
+        return snapshot.related(skill, search_query, top_k, metric, min_count)
+
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "jobs": snapshot.job_counts.get(ALL_QUERIES, 0),
+            "skills": len(snapshot.skills),
+            "queries": len(snapshot.query_ids),
+            "pairs": int(snapshot.matrices[ALL_QUERIES].nnz) if ALL_QUERIES in snapshot.matrices else 0,
+            "refreshed_at": self.refreshed_at,
+            "last_refresh_ms": round(self.last_refresh_seconds * 1000, 1) if self.last_refresh_seconds else None,
+        }
+
+
+skill_cooccurrence = SkillCooccurrence()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skills that appear together with SKILL")
+    parser.add_argument("skill")
+    parser.add_argument("--query", default=None, help="search_query to restrict to (default: all jobs)")
+    parser.add_argument("--metric", default="lift", choices=METRICS)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    args = parser.parse_args()
+
+    jobs = skill_cooccurrence.refresh()
+    stats = skill_cooccurrence.stats()
+    print(f"{jobs} jobs, {stats['skills']} skills, {stats['pairs']} pairs loaded in {stats['last_refresh_ms']} ms")
+
+    snapshot = skill_cooccurrence.snapshot
+    print(f"{args.skill}: {snapshot.skill_jobs(args.skill, args.query)} jobs")
+    for entry in snapshot.related(args.skill, args.query, args.top_k, args.metric, args.min_count):
+        print(f"  {entry['skill']:<30} {entry['count']:>7} jobs  share {entry['share']:.2f}  "
+              f"lift {entry['lift']:.2f}  pmi {entry['pmi']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Batched dashboard payload
+# Computes every dashboard panel on a single connection. The three job_listings panels (counts per query,
+# remote vs onsite, jobs per state) come out of one query over the aggregate tables (backend.aggregates)
+
+from backend.db import fetch_rows
+from backend.analysis import location_states, top_skills_per_query_async, skills_per_query_records
+from backend.salary import query_salaries_async
+from backend.recent_info import get_recent_listings_async
+
+
+# Panel name -> tables it reads (used for caching/ETags)
+PANELS = {
+    "job_counts": ("job_listings",),
+    "top_skills": ("job_skills",),
+    "remote_v_onsite": ("job_listings",),
+    "geographic_distribution": ("job_listings",),
+    "salaries": ("salaries",),
+    "recent_listings": ("job_listings",),
+}
+
+LISTING_PANELS = ("job_counts", "remote_v_onsite", "geographic_distribution")
+
+
+# One round trip for the three job_listings panels. panel tags each row: 'query' rows are counts per search_query in
+# the requested country, 'work_type' rows remote vs onsite (not location filtered), 'state' rows jobs per state in the
+# location's states/provinces
+JOB_LISTINGS_PANELS_SQL = """
+    SELECT 'query' AS panel, search_query AS key, SUM(job_count)::bigint AS count
+    FROM agg_job_counts
+    WHERE %(location)s::text IS NULL OR job_country = LOWER(%(location)s::text)
+    GROUP BY search_query
+    UNION ALL
+    SELECT 'work_type', work_type, job_count
+    FROM agg_remote_counts
+    UNION ALL
+    SELECT 'state', job_state, job_count
+    FROM agg_state_counts
+    WHERE job_state NOT IN ('Remote', '') AND (%(states)s::text[] IS NULL OR job_state = ANY(%(states)s::text[]))
+"""
+
+
+# Parses the fields query param ("job_counts,salaries") into panel names. None/empty selects every panel
+def parse_fields(fields=None):
+    if not fields:
+        return list(PANELS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    invalid = [field for field in selected if field not in PANELS]
+    if invalid:
+        raise ValueError(f"Invalid fields: {invalid}. Allowed: {list(PANELS)}")
+    return selected
+
+
+# Tables the selected panels depend on
+def panel_tables(fields):
+    return tuple(sorted({table for field in fields for table in PANELS[field]}))
+
+
+async def job_listings_panels(aconn, location=None):
+    states = location_states(location)
+    params = {"location": location or None, "states": list(states) if states is not None else None}
+    rows = await fetch_rows(aconn, JOB_LISTINGS_PANELS_SQL, params)
+
+    counts_by_query = []
+    work_types = []
+    states = []
+    for panel, key, count in rows:
+        if panel == "query":
+            counts_by_query.append((key, count))
+        elif panel == "work_type":
+            work_types.append({"work_type": key, "count": count})
+        else:
+            states.append({"job_state": key, "job_count": count})
+
+    counts_by_query.sort(key=lambda row: -row[1])
+    states.sort(key=lambda row: -row["job_count"])
+
+    return {
+        "job_counts": {
+            "total_jobs": sum(count for _, count in counts_by_query),
+            "counts_by_query": counts_by_query,
+        },
+        "remote_v_onsite": work_types,
+        "geographic_distribution": states,
+    }
+
+
+# Builds the selected panels on one connection. Each panel has the same shape as its standalone endpoint
+async def dashboard_panels(aconn, location=None, fields=None, top_k=10):
+
+    fields = fields or list(PANELS)
+    payload = {}
+
+    if any(field in LISTING_PANELS for field in fields):
+        listings = await job_listings_panels(aconn, location=location)
+        payload.update({field: listings[field] for field in LISTING_PANELS if field in fields})
+
+    if "top_skills" in fields:
+        skills_dic = await top_skills_per_query_async(aconn, top_n=top_k)
+        payload["top_skills"] = {"skills": skills_per_query_records(skills_dic), "role": None}
+
+    if "salaries" in fields:
+        payload["salaries"] = await query_salaries_async(aconn, location=location)
+
+    if "recent_listings" in fields:
+        payload["recent_listings"] = await get_recent_listings_async(aconn, location=location)
+
+    return payload
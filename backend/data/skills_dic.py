@@ -9,6 +9,14 @@ SPECIAL_UPPER = {
 }
 
 
+# Skills that are also common English words ("make sure", "lean team", "swift delivery")
+# Used by the dictionary matcher, which only takes them with this exact capitalization and not as the first word of a
+# sentence or line
+COMMON_WORD_SKILLS = {
+    "Make", "Lean", "Unity", "Notion", "Chef", "Swift", "Rust", "Windows", "Hive", "Presto", "Sketch", "Confluence"
+}
+
+
 # List of skills and aliases
 # Used because job postings are inconsistent with the way they type/spell some skills
 ALIASES = {
@@ -0,0 +1,334 @@
+# Shared database access layer
+# Every module borrows connections from a single bounded, thread-safe pool instead of calling psycopg2.connect() per request
+
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+import psycopg2
+import psycopg2.extensions
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# DB CRED
+HOST = os.getenv("DB_HOST") or os.getenv("HOST")
+PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
+DBNAME = os.getenv("DBNAME")
+USER = os.getenv("USER")
+PASSWORD = os.getenv("PASSWORD")
+
+# POOL CONFIG
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))                      # seconds to wait for a free connection
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))          # seconds before a connection is recycled
+POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))  # idle seconds before a connection is pinged on checkout
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Bounded pool of psycopg2 connections
+# Connections are checked on checkout (closed, too old, or idle long enough to need a SELECT 1) and rolled back on return
+class ConnectionPool:
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 max_lifetime=POOL_MAX_LIFETIME, healthcheck_after=POOL_HEALTHCHECK_AFTER, **conn_kwargs):
+
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.healthcheck_after = healthcheck_after
+        self.conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # stack of (conn, last_used), most recently used last
+        self._created_at = {}    # id(conn) -> creation time, for max lifetime
+        self._size = 0           # open connections (idle + in use + being opened)
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "healthcheck_failures": 0,
+        }
+
+
+    # Opens min_size connections up front so the first requests don't pay the handshake
+    def open(self):
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._size >= self.min_size:
+                    break
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.conn_kwargs)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+
+    # Closes a connection and frees its slot in the pool
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self._stats["connections_discarded"] += 1
+            self._cond.notify()
+
+
+    def _expired(self, conn):
+        created = self._created_at.get(id(conn))
+        return created is not None and time.monotonic() - created > self.max_lifetime
+
+
+    # Returns True if an idle connection is still usable
+    def _healthy(self, conn, last_used):
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as c:
+                c.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["healthcheck_failures"] += 1
+            return False
+
+
+    # Borrow a connection, waiting up to timeout seconds if max_size connections are already in use
+    def getconn(self, timeout=None):
+
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            conn = None
+            create = False
+
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection")
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            wait_time = time.monotonic() - start
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                    self._stats["wait_time_total"] += wait_time
+                    self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+            return conn
+
+
+    # Give a connection back. Anything left uncommitted is rolled back
+    def putconn(self, conn, discard=False):
+
+        if discard or self._closed or conn.closed or self._expired(conn):
+            self._discard(conn)
+            return
+
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "in_use": self._size - idle,
+                "idle": idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats,
+            }
+
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Returns the process-wide pool, creating it on first use
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD)
+                pool.open()
+                _pool = pool
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+# Context manager used by every data function
+# Reuses the caller's connection if one is passed in, otherwise borrows one from the pool for the duration of the block
+@contextmanager
+def connection(conn=None):
+    if conn is not None:
+        yield conn
+        return
+
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def pool_stats():
+    if _pool is None:
+        return {"size": 0, "in_use": 0, "idle": 0, "min_size": POOL_MIN_SIZE, "max_size": POOL_MAX_SIZE}
+    return _pool.stats()
+
+
+
+# ASYNC POOL
+# Used by the FastAPI routes so a request awaits the database instead of blocking a threadpool worker
+_async_pool = None
+
+
+async def open_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        conninfo = make_conninfo(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD)
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            timeout=POOL_TIMEOUT,
+            max_lifetime=POOL_MAX_LIFETIME,
+            check=AsyncConnectionPool.check_connection,   # health check on checkout
+            open=False,
+        )
+        await pool.open()
+        _async_pool = pool
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+# Borrow a connection from the async pool for the duration of the block
+@asynccontextmanager
+async def async_connection():
+    pool = await open_async_pool()
+    async with pool.connection() as aconn:
+        yield aconn
+
+
+# Runs a query on an async connection and returns a list of dict rows (same shape as DataFrame.to_dict(orient="records"))
+async def fetch_records(aconn, query, params=None):
+    async with aconn.cursor(row_factory=dict_row) as c:
+        await c.execute(query, params)
+        return await c.fetchall()
+
+
+async def fetch_rows(aconn, query, params=None):
+    async with aconn.cursor() as c:
+        await c.execute(query, params)
+        return await c.fetchall()
+
+
+def async_pool_stats():
+    if _async_pool is None:
+        return {"pool_size": 0, "pool_min": POOL_MIN_SIZE, "pool_max": POOL_MAX_SIZE}
+    return _async_pool.get_stats()
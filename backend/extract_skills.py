@@ -1,32 +1,43 @@
 import os
-import psycopg2
+import multiprocessing
+import queue
 from typing import List, Tuple
 from dotenv import load_dotenv
-from transformers import AutoModelForTokenClassification, AutoTokenizer, pipeline
 from backend.data.skills_dic import SPECIAL_UPPER, ALIASES, SKILL_BLACKLIST, SKILLS_DIC
+from backend.db import connection
+from backend.versions import create_versions_table
+from backend.aggregates import create_aggregate_tables
 
 load_dotenv()
 
 
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")  # Fallback for compatibility
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")  # Fallback for compatibility
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
-
 # MODEL
 MODEL_ID = os.getenv('MODEL', 'ihk/skillner')  # get model
 DEVICE = 0 if os.getenv("USE_GPU") == "1" else -1    # Define processing unit (GPU should be default)
+BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "8"))   # chunks per forward pass in extract_skills_batch
+WORKERS = int(os.getenv("EXTRACT_WORKERS", "1"))   # extraction processes; >1 for CPU-only hosts with many cores
+BACKENDS = ("torch", "quantized", "onnx")
+BACKEND = os.getenv("NER_BACKEND", "torch")   # torch (fp32), quantized (dynamic int8 on CPU) or onnx (onnxruntime)
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/onnx")   # exported ONNX model is cached here after the first run
+CHUNK_TOKENS = int(os.getenv("NER_CHUNK_TOKENS", "0"))   # tokens per chunk; 0 fills the model's max length
+CHUNK_STRIDE = int(os.getenv("NER_CHUNK_STRIDE", "32"))  # tokens shared by consecutive chunks
+EXTRACTORS = ("ner", "dictionary", "hybrid")
+EXTRACTOR = os.getenv("SKILL_EXTRACTOR", "ner")   # ner (model), dictionary (backend.skill_matcher) or hybrid (union of both)
 
 
+# Value stored in job_skills.source_model, so rows extracted by a non-default backend or extractor can be told apart
+def source_model(backend=BACKEND, extractor="ner"):
+    if extractor == "dictionary":
+        return "dictionary"
+    model = MODEL_ID if backend == "torch" else f"{MODEL_ID}:{backend}"
+    return f"{model}+dictionary" if extractor == "hybrid" else model
 
-# Adds a table to our database. Table includes job_id and extracted skills from job desc
-def DB_migration(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD):
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
-    with conn.cursor() as c:
+# Adds a table to our database. Table includes job_id and extracted skills from job desc
+def DB_migration(conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
 
         c.execute("""
             CREATE TABLE IF NOT EXISTS job_skills (
@@ -35,13 +46,31 @@ def DB_migration(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWO
                 confidence REAL,
                 search_query TEXT,
                 source_model TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
                 PRIMARY KEY (job_id, skill),
                 FOREIGN KEY (job_id) REFERENCES job_listings(id)
             )
         """)
+        # Tables created before updated_at existed. The co-occurrence matrices re-read jobs changed since their last refresh
+        c.execute("ALTER TABLE job_skills ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()")
+
+        # Progress of process_jobs runs: jobs up to last_job_id (in id order) are committed, so an interrupted run
+        # resumes after it
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_checkpoints (
+                run_name TEXT PRIMARY KEY,
+                last_job_id TEXT,
+                jobs_done INTEGER NOT NULL DEFAULT 0,
+                started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ
+            )
+        """)
+
+        conn.commit()
 
-    conn.commit()
-    conn.close()
+        create_versions_table(conn)
+        create_aggregate_tables(conn)
 
 
 
@@ -71,6 +100,89 @@ def chunk_text(text, max_chars = 1000) -> List[str]:
 
 
 
+# Token budget of one chunk: the model's max length minus its special tokens ([CLS]/[SEP]). Tokenizers without a real
+# limit report a huge model_max_length, so it is capped at 512
+def chunk_token_budget(tokenizer, max_tokens=CHUNK_TOKENS):
+    if max_tokens:
+        return max_tokens
+    return min(tokenizer.model_max_length, 512) - tokenizer.num_special_tokens_to_add()
+
+
+# True if token k starts a word: nothing joins it to the previous token (a subword piece like "##flow" continues one)
+def starts_word(offsets, k):
+    return k == 0 or offsets[k - 1][1] < offsets[k][0]
+
+
+# Splits text into chunks of at most max_tokens tokens, using the tokenizer's offsets so chunks are packed close to the
+# model limit and never silently truncated. A chunk ends after the last sentence-ending token in its second half if
+# there is one. Consecutive chunks share `stride` tokens, so a skill cut at one chunk's edge is whole in the next.
+# Chunks start and end on word boundaries when there is one to move back to: a chunk starting mid-word re-tokenizes
+# that word's tail on its own, which can take more tokens than the window counted.
+# Returns [(chunk, keep_start, keep_end)]: entities are kept only if they start in chunk[keep_start:keep_end], which
+# splits each overlap down the middle so a skill seen in both chunks is counted once
+def chunk_tokens(text, tokenizer, max_tokens=CHUNK_TOKENS, stride=CHUNK_STRIDE):
+
+    text = text or ""
+    if not text.strip():
+        return []
+
+    max_tokens = chunk_token_budget(tokenizer, max_tokens)
+    stride = min(stride, max_tokens // 4)
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    n = len(offsets)
+    if n == 0:
+        return []
+    if n <= max_tokens:
+        return [(text, 0, len(text))]
+
+    windows = []
+    start = 0
+    while True:
+        end = min(start + max_tokens, n)
+        if end < n:
+            for k in range(end - 1, start + max_tokens // 2, -1):   # sentence break in the second half of the window
+                if text[offsets[k][1] - 1] in ".!?\n":
+                    end = k + 1
+                    break
+            cut = end
+            while cut > start + max_tokens // 2 and not starts_word(offsets, cut):
+                cut -= 1
+            if starts_word(offsets, cut):
+                end = cut
+        windows.append((start, end))
+        if end == n:
+            break
+        next_start = end - stride
+        while next_start > start + 1 and not starts_word(offsets, next_start):
+            next_start -= 1
+        start = next_start if starts_word(offsets, next_start) else end - stride
+
+    # Char position where ownership passes from each window to the next: the middle token of their overlap
+    handoffs = [offsets[(windows[i + 1][0] + windows[i][1]) // 2][0] for i in range(len(windows) - 1)]
+    bounds = [0] + handoffs + [len(text)]
+
+    chunks = []
+    for i, (start, end) in enumerate(windows):
+        chunk_start = offsets[start][0]
+        chunk = text[chunk_start:offsets[end - 1][1]]
+        chunks.append((chunk, bounds[i] - chunk_start, bounds[i + 1] - chunk_start))
+    return chunks
+
+
+# Chunks for the pipeline's tokenizer, or character chunks (keeping every entity) if it has none
+def pipeline_chunks(NLP, text):
+    tokenizer = getattr(NLP, "tokenizer", None)
+    if tokenizer is None:
+        return [(chunk, 0, len(chunk)) for chunk in chunk_text(text)]
+    return chunk_tokens(text, tokenizer)
+
+
+# Entities of a chunk that start in its kept range. Entities without offsets (older cache entries) are kept
+def kept_entities(entities, keep_start, keep_end):
+    return [ent for ent in entities if ent.get("start") is None or keep_start <= ent["start"] < keep_end]
+
+
+
 # Function nornmalizes all skills for consistency and use for dashboard/predictions later
 def normalize_skill(skill):
 
@@ -122,10 +234,47 @@ def sort_skills(skills):
 
 
 
+# Loads the token-classification model for the given backend
+# torch: the fp32 PyTorch model. quantized: the same model with its Linear layers dynamically quantized to int8 (CPU only).
+# onnx: the model exported to ONNX and run with onnxruntime (needs optimum[onnxruntime]); the export is saved to
+# ONNX_MODEL_DIR on first use and loaded from there afterwards
+def load_model(backend=BACKEND):
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {backend}. Allowed: {list(BACKENDS)}")
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForTokenClassification
+        except ImportError as e:
+            raise ImportError("NER_BACKEND=onnx needs optimum[onnxruntime] installed") from e
+
+        export_dir = os.path.join(ONNX_MODEL_DIR, MODEL_ID.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            return ORTModelForTokenClassification.from_pretrained(export_dir)
+        model = ORTModelForTokenClassification.from_pretrained(MODEL_ID, export=True)
+        model.save_pretrained(export_dir)
+        return model
+
+    from transformers import AutoModelForTokenClassification
+
+    model = AutoModelForTokenClassification.from_pretrained(MODEL_ID)
+    if backend == "quantized":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
 # Function initializes and returns a hugging face token-classification pipeline ready to process job descriptions
-def build_pipeline():
+# transformers (and torch) are imported here rather than at module load so nothing that only imports this module pays for them
+def build_pipeline(backend=BACKEND):
+    from transformers import AutoTokenizer, pipeline
+
+    if backend == "quantized" and DEVICE != -1:
+        raise ValueError("The quantized backend only runs on CPU, unset USE_GPU")
+
     tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
-    model = AutoModelForTokenClassification.from_pretrained(MODEL_ID)
+    model = load_model(backend)
     NLP = pipeline(
         "token-classification",
         model = model,
@@ -138,56 +287,173 @@ def build_pipeline():
 
 
 
-# Should've documented this when i wrote it because i honestly forgot it all
-def extract_skills(NLP, text):
+# Merges the pipeline's entities for one chunk into (skill, avg score) spans
+# Word pieces ("##...") are glued onto the skill before them, and a skill's score is the mean of its pieces' scores
+def merge_entities(entities):
 
-    # Handle empty job desc
-    if not text:
-        return []
-    
     skills = []
+    current_skill = ""
+    current_scores = []
 
-    chunks = chunk_text(text)
-
-    for chunk in chunks:
-        entities = NLP(chunk)
-
-        current_skill = ""
-        current_scores = []
+    for ent in entities:
+        token = ent['word']
 
-        for ent in entities:
-            token = ent['word']
-
-            if ent.get('entity_group') == 'SKILL':
-                if token.startswith('##'):
-                    current_skill += token[2:]
-                else:
-                    if current_skill:
-                        avg_score = sum(current_scores) / len(current_scores)
-                        skills.append((current_skill, avg_score))
-                    current_skill = token
-                    current_scores = []
-                current_scores.append(ent['score'])
-
-            elif token.startswith('##') and current_skill:
+        if ent.get('entity_group') == 'SKILL':
+            if token.startswith('##'):
                 current_skill += token[2:]
-                current_scores.append(ent['score'])
-            
             else:
                 if current_skill:
                     avg_score = sum(current_scores) / len(current_scores)
                     skills.append((current_skill, avg_score))
-                    current_skill = ""
-                    current_scores = []
-        
-        # In case last token is a skill
-        if current_skill:
-            avg_score = sum(current_scores) / len(current_scores)
-            skills.append((current_skill, avg_score))
+                current_skill = token
+                current_scores = []
+            current_scores.append(ent['score'])
+
+        elif token.startswith('##') and current_skill:
+            current_skill += token[2:]
+            current_scores.append(ent['score'])
         
+        else:
+            if current_skill:
+                avg_score = sum(current_scores) / len(current_scores)
+                skills.append((current_skill, avg_score))
+                current_skill = ""
+                current_scores = []
+    
+    # In case last token is a skill
+    if current_skill:
+        avg_score = sum(current_scores) / len(current_scores)
+        skills.append((current_skill, avg_score))
+
+    return skills
+
+
+# Extracts skills from one text, one chunk per pipeline call
+def extract_skills(NLP, text):
+
+    # Handle empty job desc
+    if not text:
+        return []
+    
+    skills = []
+
+    for chunk, keep_start, keep_end in pipeline_chunks(NLP, text):
+        skills.extend(merge_entities(kept_entities(NLP(chunk), keep_start, keep_end)))
     
     # Normalize skills and handle duplicates
     normalized_skills = [(normalize_skill(s), score) for s, score in skills]
 
 
     return sort_skills(normalized_skills)
+
+
+# Extracts skills for many jobs at once. jobs is a list of (job_id, text); returns {job_id: [(skill, confidence)]}
+# Chunks from every job are pooled and sorted by length, so each batch of batch_size chunks pads to a similar length,
+# and run through the pipeline together; results are then mapped back to their job by position.
+# With a cache (backend.chunk_cache.ChunkCache), chunks seen before reuse their stored entities, and a chunk repeated
+# within the group only goes through the model once
+def extract_skills_batch(NLP, jobs, batch_size=BATCH_SIZE, cache=None):
+
+    chunk_jobs = []    # (job_id, keep_start, keep_end) of each chunk
+    chunks = []
+    for job_id, text in jobs:
+        for chunk, keep_start, keep_end in pipeline_chunks(NLP, text):
+            chunk_jobs.append((job_id, keep_start, keep_end))
+            chunks.append(chunk)
+
+    skills = {job_id: [] for job_id, _ in jobs}
+    if not chunks:
+        return skills
+
+    entities = cache.get_many(chunks) if cache is not None else {}
+    todo = sorted({chunk for chunk in chunks if chunk not in entities}, key=len, reverse=True)
+    if todo:
+        computed = dict(zip(todo, NLP(todo, batch_size=batch_size)))
+        if cache is not None:
+            cache.put_many(computed)
+        entities.update(computed)
+
+    for (job_id, keep_start, keep_end), chunk in zip(chunk_jobs, chunks):
+        skills[job_id].extend(merge_entities(kept_entities(entities[chunk], keep_start, keep_end)))
+
+    return {job_id: sort_skills([(normalize_skill(s), score) for s, score in job_skills])
+            for job_id, job_skills in skills.items()}
+
+
+
+# Multi-process extraction
+# Each worker process builds the pipeline once (in the pool initializer) and caps torch's thread pools, so N workers
+# x threads_per_worker stays within the host's cores instead of every process spawning a thread per core
+
+_worker_nlp = None
+_worker_cache = None
+
+
+def _init_worker(threads, use_cache=False):
+    global _worker_nlp, _worker_cache
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _worker_nlp = build_pipeline()
+    if use_cache:
+        from backend.chunk_cache import ChunkCache
+        _worker_cache = ChunkCache()
+
+
+# Returns the group's skills and the worker cache's hits/misses for it
+def _extract_group(args):
+    jobs, batch_size = args
+    before = (_worker_cache.hits, _worker_cache.misses) if _worker_cache else (0, 0)
+    skills = extract_skills_batch(_worker_nlp, jobs, batch_size, _worker_cache)
+    after = (_worker_cache.hits, _worker_cache.misses) if _worker_cache else (0, 0)
+    return skills, after[0] - before[0], after[1] - before[1]
+
+
+# Like pool.imap_unordered, but with at most `window` items submitted and not yet returned, so `items` can be a
+# stream (imap_unordered drains its iterable into the task queue on the pool's own thread).
+# Items are read and submitted from the calling thread, so nothing in the pool ever waits on the consumer: if func
+# raises in a worker the exception is re-raised here, and if the consumer stops (or raises) the pool can be
+# terminated right away
+def imap_unordered_bounded(pool, func, items, window):
+    results = queue.SimpleQueue()
+    items = iter(items)
+    pending = 0
+    exhausted = False
+    while True:
+        while not exhausted and pending < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pool.apply_async(func, (item,), callback=lambda result: results.put((True, result)),
+                             error_callback=lambda error: results.put((False, error)))
+            pending += 1
+        if not pending:
+            return
+        ok, result = results.get()
+        pending -= 1
+        if not ok:
+            raise result
+        yield result
+
+
+# Runs extract_skills_batch over groups of (job_id, text) on `workers` processes and yields each group's
+# {job_id: skills} as soon as it is done (not in input order). Groups are handed out one at a time, so a worker that
+# gets short descriptions simply takes more groups.
+# At most 2 groups per worker are read ahead of the results, so job_groups can be a stream (the pool would otherwise
+# drain it into memory). An exception in a worker is raised here.
+# If a cache is given, each worker opens its own ChunkCache on the same table and its hits/misses are added to `cache`
+def extract_skills_parallel(job_groups, workers=WORKERS, threads_per_worker=None, batch_size=BATCH_SIZE, cache=None):
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    tasks = ((group, batch_size) for group in job_groups)
+
+    context = multiprocessing.get_context("spawn")   # fork would copy the parent's torch thread pools
+    with context.Pool(workers, initializer=_init_worker, initargs=(threads, cache is not None)) as pool:
+        for skills, hits, misses in imap_unordered_bounded(pool, _extract_group, tasks, 2 * workers):
+            if cache is not None:
+                cache.record(hits, misses)
+            yield skills
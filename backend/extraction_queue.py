@@ -0,0 +1,319 @@
+# Distributed skill extraction queue
+# store_jobs enqueues every new job in extraction_queue in the same transaction as the insert. Any number of workers,
+# on any number of machines, lease batches off the queue with SELECT ... FOR UPDATE SKIP LOCKED, so two workers never
+# get the same job. A worker keeps its lease alive with a heartbeat while the model runs and commits the skills and
+# the "done" mark together. Jobs whose worker died are picked up again once the lease runs out, and failed jobs go
+# back to pending until they have used up max_attempts.
+#
+# Usage:
+#   python -m backend.extraction_queue worker [--workers N] [--extractor ner|dictionary|hybrid] [--wait]
+#   python -m backend.extraction_queue backfill [--requeue]     enqueue existing jobs (and those done by another model)
+#   python -m backend.extraction_queue stats
+
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from backend.db import connection
+from backend.versions import bump_version
+
+load_dotenv()
+
+LEASE_SECONDS = int(os.getenv("EXTRACTION_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("EXTRACTION_MAX_ATTEMPTS", "3"))
+JOBS_PER_LEASE = int(os.getenv("EXTRACTION_JOBS_PER_LEASE", "64"))
+POLL_SECONDS = float(os.getenv("EXTRACTION_POLL_SECONDS", "10"))   # idle wait between empty leases with --wait
+
+
+# status: pending -> leased -> done, or back to pending on failure/expired lease, or failed after max_attempts.
+# model is the source_model that last completed the job
+def create_queue_table(conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_queue (
+                job_id TEXT PRIMARY KEY REFERENCES job_listings(id) ON DELETE CASCADE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                leased_until TIMESTAMPTZ,
+                leased_by TEXT,
+                model TEXT,
+                last_error TEXT,
+                enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        # Leasable rows only, in enqueue order
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS extraction_queue_ready_idx
+            ON extraction_queue (enqueued_at)
+            WHERE status IN ('pending', 'leased')
+        """)
+
+        conn.commit()
+
+
+# Adds jobs to the queue. Takes a cursor so it commits together with the insert into job_listings
+def enqueue_jobs(c, job_ids):
+    if job_ids:
+        execute_values(c, """
+            INSERT INTO extraction_queue (job_id)
+            VALUES %s
+            ON CONFLICT (job_id) DO NOTHING
+        """, [(job_id,) for job_id in job_ids])
+
+
+# Enqueues jobs that predate the queue: those with no job_skills rows as pending, the rest as done.
+# With requeue_model, done jobs last completed by a different model go back to pending
+def backfill(conn=None, requeue_model=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+        create_queue_table(conn)
+        c.execute("""
+            INSERT INTO extraction_queue (job_id, status, model)
+            SELECT j.id,
+                   CASE WHEN s.source_model IS NULL THEN 'pending' ELSE 'done' END,
+                   s.source_model
+            FROM job_listings j
+            LEFT JOIN LATERAL (
+                SELECT source_model FROM job_skills WHERE job_id = j.id LIMIT 1
+            ) s ON true
+            ON CONFLICT (job_id) DO NOTHING
+        """)
+        added = c.rowcount
+
+        requeued = 0
+        if requeue_model:
+            c.execute("""
+                UPDATE extraction_queue
+                SET status = 'pending', attempts = 0, leased_until = NULL, leased_by = NULL, updated_at = now()
+                WHERE status IN ('done', 'failed') AND model IS DISTINCT FROM %s
+            """, (requeue_model,))
+            requeued = c.rowcount
+
+        conn.commit()
+
+    return {"added": added, "requeued": requeued}
+
+
+# Leases up to `limit` jobs for worker_id and returns them as [(job_id, text, search_query)].
+# Pending jobs and leases that ran out are both leasable; rows locked by another worker's lease query are skipped
+# rather than waited on. Expired leases that have used up max_attempts are marked failed first
+def lease_jobs(worker_id, limit=JOBS_PER_LEASE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            UPDATE extraction_queue
+            SET status = 'failed', last_error = COALESCE(last_error, 'lease expired'), leased_by = NULL,
+                leased_until = NULL, updated_at = now()
+            WHERE status = 'leased' AND leased_until < now() AND attempts >= %s
+        """, (max_attempts,))
+
+        c.execute("""
+            WITH leased AS (
+                UPDATE extraction_queue q
+                SET status = 'leased', attempts = q.attempts + 1, leased_by = %(worker)s,
+                    leased_until = now() + make_interval(secs => %(lease)s), updated_at = now()
+                WHERE q.job_id IN (
+                    SELECT job_id FROM extraction_queue
+                    WHERE (status = 'pending' OR (status = 'leased' AND leased_until < now()))
+                      AND attempts < %(max_attempts)s
+                    ORDER BY enqueued_at
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING q.job_id
+            )
+            SELECT j.id, j.job_description, j.qualifications, j.search_query
+            FROM leased l
+            JOIN job_listings j ON j.id = l.job_id
+            ORDER BY j.id
+        """, {"worker": worker_id, "lease": lease_seconds, "max_attempts": max_attempts, "limit": limit})
+        rows = c.fetchall()
+        conn.commit()
+
+    return [(job_id, " ".join(filter(None, [desc, qualifications])), search_query)
+            for job_id, desc, qualifications, search_query in rows]
+
+
+# Pushes the lease of worker_id's jobs out by lease_seconds. Returns how many jobs it still holds
+def extend_lease(worker_id, job_ids, lease_seconds=LEASE_SECONDS, conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            UPDATE extraction_queue
+            SET leased_until = now() + make_interval(secs => %s), updated_at = now()
+            WHERE job_id = ANY(%s) AND leased_by = %s AND status = 'leased'
+        """, (lease_seconds, list(job_ids), worker_id))
+        held = c.rowcount
+        conn.commit()
+    return held
+
+
+# Marks jobs done. Takes a cursor so it commits together with their job_skills rows. Jobs that were leased again by
+# another worker after this one's lease ran out are marked done all the same: their skills have just been written
+def complete_jobs(c, job_ids, model):
+    c.execute("""
+        UPDATE extraction_queue
+        SET status = 'done', model = %s, leased_until = NULL, leased_by = NULL, last_error = NULL, updated_at = now()
+        WHERE job_id = ANY(%s)
+    """, (model, list(job_ids)))
+
+
+# Returns worker_id's jobs to pending, or failed once they have used up max_attempts
+def fail_jobs(worker_id, job_ids, error, max_attempts=MAX_ATTEMPTS, conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            UPDATE extraction_queue
+            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                last_error = %s, leased_until = NULL, leased_by = NULL, updated_at = now()
+            WHERE job_id = ANY(%s) AND leased_by = %s
+        """, (max_attempts, str(error)[:1000], list(job_ids), worker_id))
+        conn.commit()
+
+
+# Extends the lease on a batch every lease_seconds / 3 from a background thread while the batch is being extracted
+class Heartbeat:
+
+    def __init__(self, worker_id, job_ids, lease_seconds=LEASE_SECONDS):
+        self.worker_id = worker_id
+        self.job_ids = job_ids
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                extend_lease(self.worker_id, self.job_ids, self.lease_seconds)
+            except Exception as e:
+                print(f"Heartbeat failed for {self.worker_id}: {e}")   # the lease may lapse; another worker then retries
+
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def queue_stats(conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            SELECT status, COUNT(*), MAX(attempts)
+            FROM extraction_queue
+            GROUP BY status
+            ORDER BY status
+        """)
+        return {status: {"jobs": count, "max_attempts": attempts} for status, count, attempts in c.fetchall()}
+
+
+# Leases, extracts and completes batches until the queue has nothing leasable (or forever, with wait=True).
+# Returns {"worker", "batches", "done", "failed"}
+def run_worker(worker_id=None, extractor=None, jobs_per_lease=JOBS_PER_LEASE, lease_seconds=LEASE_SECONDS,
+               wait=False, poll_seconds=POLL_SECONDS):
+    from backend.extract_skills import DB_migration, EXTRACTOR, EXTRACTORS, source_model, build_pipeline, extract_skills_batch
+    from backend.chunk_cache import ChunkCache, CHUNK_CACHE_ENABLED
+    from backend.skill_matcher import extract_skills_dictionary, merge_skill_sets
+    from backend.process_skills import store_job_skills
+
+    extractor = extractor or EXTRACTOR
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"Invalid extractor: {extractor}. Allowed: {list(EXTRACTORS)}")
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    model = source_model(extractor=extractor)
+    DB_migration()
+    create_queue_table()
+
+    NLP = build_pipeline() if extractor != "dictionary" else None
+    cache = ChunkCache() if CHUNK_CACHE_ENABLED and NLP is not None else None
+    stats = {"worker": worker_id, "batches": 0, "done": 0, "failed": 0}
+
+    while True:
+        group = lease_jobs(worker_id, jobs_per_lease, lease_seconds)
+        if not group:
+            if not wait:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        job_ids = [job_id for job_id, _, _ in group]
+        texts = [(job_id, text) for job_id, text, _ in group]
+        try:
+            with Heartbeat(worker_id, job_ids, lease_seconds):
+                if extractor == "dictionary":
+                    skills = extract_skills_dictionary(texts)
+                else:
+                    skills = extract_skills_batch(NLP, texts, cache=cache)
+                    if extractor == "hybrid":
+                        skills = merge_skill_sets(skills, extract_skills_dictionary(texts))
+
+            with connection() as conn, conn.cursor() as c:
+                store_job_skills(c, skills, {job_id: search_query for job_id, _, search_query in group}, model)
+                complete_jobs(c, job_ids, model)
+                bump_version(c, "job_skills")   # invalidates cached dashboard results
+                conn.commit()
+            stats["done"] += len(job_ids)
+        except Exception as e:
+            print(f"Worker {worker_id} failed on a batch of {len(job_ids)} job(s): {e}")
+            fail_jobs(worker_id, job_ids, e)
+            stats["failed"] += len(job_ids)
+        stats["batches"] += 1
+
+    return stats
+
+
+def _worker_main(args):
+    return run_worker(extractor=args["extractor"], jobs_per_lease=args["jobs_per_lease"], wait=args["wait"])
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.extraction_queue")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    worker = subcommands.add_parser("worker", help="lease and extract jobs until the queue is empty")
+    worker.add_argument("--workers", type=int, default=1, help="local worker processes")
+    worker.add_argument("--extractor", choices=["ner", "dictionary", "hybrid"])
+    worker.add_argument("--jobs-per-lease", type=int, default=JOBS_PER_LEASE)
+    worker.add_argument("--wait", action="store_true", help="keep polling for new jobs instead of exiting when idle")
+    backfill_parser = subcommands.add_parser("backfill", help="enqueue jobs stored before the queue existed")
+    backfill_parser.add_argument("--requeue", action="store_true", help="also requeue jobs done by another model")
+    backfill_parser.add_argument("--extractor", dest="extractor_model", choices=["ner", "dictionary", "hybrid"],
+                                 help="extractor the requeued jobs should be done with (default SKILL_EXTRACTOR)")
+    subcommands.add_parser("stats", help="jobs per status")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        options = {"extractor": args.extractor, "jobs_per_lease": args.jobs_per_lease, "wait": args.wait}
+        if args.workers > 1:
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(args.workers) as pool:
+                results = pool.map(_worker_main, [options] * args.workers)
+        else:
+            results = [_worker_main(options)]
+        for stats in results:
+            print(f"{stats['worker']}: {stats['batches']} batches, {stats['done']} done, {stats['failed']} failed")
+
+    elif args.command == "backfill":
+        requeue_model = None
+        if args.requeue:
+            from backend.extract_skills import source_model, EXTRACTOR
+            requeue_model = source_model(extractor=args.extractor_model or EXTRACTOR)
+        result = backfill(requeue_model=requeue_model)
+        print(f"Enqueued {result['added']} job(s), requeued {result['requeued']}")
+
+    else:
+        for status, row in queue_stats().items():
+            print(f"{status:<8} {row['jobs']:>8} jobs (max attempts {row['max_attempts']})")
+
+
+if __name__ == "__main__":
+    main()
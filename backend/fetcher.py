@@ -0,0 +1,249 @@
+# Concurrent JSearch fetcher
+# Fans requests out across roles, locations and page ranges on a thread pool, under a shared token-bucket rate limit.
+# One requests.Session keeps connections alive between calls; 429/5xx responses and network errors are retried with
+# exponential backoff (honouring Retry-After). Successful responses are appended to the raw response archive
+
+import os
+import queue
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from backend.archive import default_archive
+
+load_dotenv()
+
+API_KEY = os.getenv("RAPIDAPI_KEY")
+API_HOST = os.getenv("RAPIDAPI_HOST")
+API_URL = "https://jsearch.p.rapidapi.com"
+BASE_URL = os.getenv("JSEARCH_BASE_URL", API_URL)   # point at a local stub server for testing
+
+REQUESTS_PER_SECOND = float(os.getenv("JSEARCH_RPS", "5"))
+MAX_WORKERS = int(os.getenv("JSEARCH_MAX_WORKERS", "8"))
+MAX_RETRIES = int(os.getenv("JSEARCH_MAX_RETRIES", "4"))
+REQUEST_TIMEOUT = float(os.getenv("JSEARCH_TIMEOUT", "30"))
+BACKOFF_BASE = float(os.getenv("JSEARCH_BACKOFF_BASE", "1"))   # seconds, doubled on every retry
+PAGES_PER_REQUEST = int(os.getenv("JSEARCH_PAGES_PER_REQUEST", "10"))   # JSearch allows up to 20 pages per call
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JSearchError(Exception):
+    pass
+
+
+# Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`
+class TokenBucket:
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=None):
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    # Blocks until a token is available
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+
+class JSearchClient:
+
+    def __init__(self, base_url=BASE_URL, api_key=API_KEY, api_host=API_HOST, rate=REQUESTS_PER_SECOND,
+                 max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, backoff_base=BACKOFF_BASE, pool_size=MAX_WORKERS,
+                 archive=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.bucket = TokenBucket(rate)
+        # archive=False turns archiving off; by default only real API responses are archived, never a stub server's
+        if archive is None:
+            archive = default_archive() if self.base_url == API_URL else False
+        self.archive = archive
+
+        # Keep-alive connections shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'x-rapidapi-key' : api_key or "",
+            'x-rapidapi-host' : api_host or "",
+        })
+
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+
+    # Seconds to wait before retry number `attempt` (0-based), from Retry-After if the server sent one
+    def _backoff(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random())   # jitter so workers don't retry in lockstep
+
+
+    # GET path with rate limiting and retries. Returns the decoded JSON body
+    def get(self, path, params):
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 200:
+                    body = response.json()
+                    if self.archive:
+                        self.archive.write(path, params, body)
+                    return body
+                error = f"API Error: {response.status_code} - {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    self._count("failures")
+                    raise JSearchError(error)
+
+            if attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._backoff(attempt, response))
+
+        self._count("failures")
+        raise JSearchError(f"{error} (gave up after {self.max_retries + 1} attempts)")
+
+
+    # One /search call covering num_pages pages starting at page. Jobs are tagged with their search_query
+    def search(self, query, location="US", page=1, num_pages=1, date_posted="today"):
+        search_query = f"{query}".strip()
+        params = {
+            "query" : search_query,
+            "page" : str(page),
+            "num_pages" : str(num_pages),
+            "country" : location,
+            "date_posted" : date_posted,
+        }
+        jobs = self.get("/search", params).get("data", [])
+        for job in jobs:
+            job['search_query'] = search_query
+        return jobs
+
+
+    def estimated_salary(self, role, city):
+        params = {
+            "job_title": role,
+            "location": city,
+            "fields": ["min_salary", "min_base_salary", "median_salary", "median_base_salary"]
+        }
+        return self.get("/estimated-salary", params).get("data", [])
+
+
+    def close(self):
+        self.session.close()
+
+
+
+# Splits pages 1..pages into (start_page, num_pages) ranges of at most pages_per_request
+def page_ranges(pages, pages_per_request=PAGES_PER_REQUEST):
+    return [(start, min(pages_per_request, pages - start + 1)) for start in range(1, pages + 1, pages_per_request)]
+
+
+# One unit of work: a page range of one role in one location
+def search_tasks(roles, locations, pages, pages_per_request=PAGES_PER_REQUEST):
+    return [
+        {"query": role, "location": location, "page": page, "num_pages": num_pages}
+        for role in roles
+        for location in locations
+        for page, num_pages in page_ranges(pages, pages_per_request)
+    ]
+
+
+# Runs fn(task) for every task on max_workers threads and yields (task, result, error) as each one finishes.
+# Finished results wait in a queue of at most queue_size items; when the consumer falls behind, workers block instead of
+# fetching more (backpressure), so at most max_workers + queue_size results are held in memory.
+# A failed task yields its error instead of stopping the others. Closing the generator early stops the workers
+def stream_results(fn, tasks, max_workers=MAX_WORKERS, queue_size=None):
+
+    pending = queue.Queue()
+    for task in tasks:
+        pending.put(task)
+    results = queue.Queue(maxsize=queue_size or max_workers)
+    stop = threading.Event()
+    done = object()
+
+    # put() that gives up if the consumer has gone away
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker():
+        while not stop.is_set():
+            try:
+                task = pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                put((task, fn(task), None))
+            except Exception as e:
+                put((task, None, e))
+        put(done)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        finished = 0
+        while finished < len(threads):
+            item = results.get()
+            if item is done:
+                finished += 1
+                continue
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+# Streams every search task concurrently and yields (task, jobs, error) as each one finishes
+def fetch_all(client, roles, locations=("US",), pages=1, date_posted="today", pages_per_request=PAGES_PER_REQUEST,
+              max_workers=MAX_WORKERS, queue_size=None):
+
+    tasks = search_tasks(roles, locations, pages, pages_per_request)
+
+    def fetch(task):
+        return client.search(task["query"], task["location"], task["page"], task["num_pages"], date_posted)
+
+    for task, jobs, error in stream_results(fetch, tasks, max_workers, queue_size):
+        yield task, jobs or [], error
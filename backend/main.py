@@ -1,15 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from typing import Optional
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from .scraper import job_counts
-from .analysis import top_skills, remote_vs_onsite, geographic_distribution
-from .process_skills import top_skills_per_query
-from .salary import query_salaries
-from .recent_info import get_recent_listings
+from .scraper import job_counts_async
+from .analysis import top_skills_async, remote_vs_onsite_async, geographic_distribution_async, top_skills_per_query_async, skills_per_query_records, job_volume_query, job_volume_over_time_async, trending_skills_query, trending_skills_async
+from .salary import query_salaries_async
+from .recent_info import get_recent_listings_async
+from .dashboard import dashboard_panels, parse_fields, panel_tables
+from .db import async_connection, open_async_pool, close_async_pool, async_pool_stats, close_pool, pool_stats
+from .cache import response_cache
+from .versions import version_tracker
+from .cooccurrence import skill_cooccurrence, METRICS, MIN_COUNT
 from .models import *
 
-app = FastAPI()
+
+# Open the async pool on startup (and start loading the skill co-occurrence matrices) and close both pools on shutdown
+@asynccontextmanager
+async def lifespan(app):
+    await open_async_pool()
+    warm_up = asyncio.create_task(skill_cooccurrence.warm_up())
+    yield
+    warm_up.cancel()
+    await close_async_pool()
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 origins = [
@@ -28,7 +48,8 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"]
 )
 
 
@@ -43,71 +64,224 @@ def health_check():
     return {"status": "healthy", "message": "API is running"}
 
 
+# Connection pool stats for monitoring (in use, waits, wait time)
+@app.get('/health/db')
+def db_health():
+    return {"pool": pool_stats(), "async_pool": async_pool_stats()}
+
+
+# Response cache hit/miss counters
+@app.get('/health/cache')
+def cache_health():
+    return {"cache": response_cache.stats(), "cooccurrence": skill_cooccurrence.stats()}
+
+
+# True if the client's cached copy (If-None-Match / If-Modified-Since) is still current
+def not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# Serves an endpoint body through the response cache with ETag/Last-Modified headers derived from the data versions.
+# A client holding the current version gets a 304 without any query running.
+# Endpoints whose result depends on the current date pass it as `today`: it becomes part of the cache key/ETag, and
+# no Last-Modified is sent (nor If-Modified-Since honoured), since the result can change at midnight without any write
+async def serve_cached(request, response, endpoint, params, tables, compute, today=None):
+    if today is not None:
+        params = {**params, "day": today.isoformat()}
+    etag = await response_cache.etag(endpoint, params, tables)
+    last_modified = None if today is not None else await version_tracker.last_modified(tables)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return await response_cache.get_or_compute(endpoint, params, tables, compute)
+
+
 # ACTUAL API ROUTE FOR PROJECT
 
 # Get total job count and count per query/role
 @app.get('/job_listings/counts')
-def job_count(location = "US"):
+async def job_count(request: Request, response: Response, location = "US"):
+    async def compute():
+        async with async_connection() as aconn:
+            return await job_counts_async(aconn, location=location)
+
     try:
-        count = job_counts(location=location)
-        return count
+        return await serve_cached(request, response, "job_counts", {"location": location}, ("job_listings",), compute)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Get top skills
 @app.get('/skills/top', response_model=SkillsResponse)
-def get_top_skils(request: SkillsRequest = Depends()):
+async def get_top_skils(request: Request, response: Response, skills_request: SkillsRequest = Depends()):
+    async def compute():
+        async with async_connection() as aconn:
+            if skills_request.role:
+                # List of skill objects
+                skills_data = await top_skills_async(aconn, role = skills_request.role, top_k = skills_request.top_k)
+                skills_list = [{"search_query": skills_request.role, "skills": skills_data}]
+            else:
+                skills_dic = await top_skills_per_query_async(aconn, top_n = skills_request.top_k,
+                                                              location = skills_request.location,
+                                                              start_date = skills_request.start_date,
+                                                              end_date = skills_request.end_date)
+                skills_list = skills_per_query_records(skills_dic)
+        return SkillsResponse(skills=skills_list, role = skills_request.role)
+
     try:
-        if request.role:
-            df = top_skills(role = request.role, top_k = request.top_k)
-            # Convert DF to list of skill objects
-            skills_data = df.to_dict(orient="records")
-            skills_list = [{"search_query": request.role, "skills": skills_data}]
-        else:
-            skills_dic = top_skills_per_query(top_n = request.top_k)
-            skills_list = [
-                {
-                    "search_query": query, 
-                    "skills": [{"skill": skill, "freq": freq} for skill, freq in skill_list]
-                }
-                for query, skill_list in skills_dic.items()
-            ]
-        return SkillsResponse(skills=skills_list, role = request.role)
+        params = {"role": skills_request.role, "top_k": skills_request.top_k, "location": skills_request.location,
+                  "start_date": skills_request.start_date, "end_date": skills_request.end_date}
+        tables = ("job_skills", "job_listings") if skills_request.location or skills_request.start_date or skills_request.end_date else ("job_skills",)
+        return await serve_cached(request, response, "skills_top", params, tables, compute)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Gets data for remote vs onsite position
 @app.get("/remote_v_onsite")
-def remote_v_onsite():
-    df = remote_vs_onsite()
-    dict = df.to_dict(orient="records")
-    return {"data": dict}
+async def remote_v_onsite(request: Request, response: Response):
+    async def compute():
+        async with async_connection() as aconn:
+            dict = await remote_vs_onsite_async(aconn)
+        return {"data": dict}
+
+    return await serve_cached(request, response, "remote_v_onsite", {}, ("job_listings",), compute)
+
+
+# Fastest rising and falling skills: share of skill mentions in the last `weeks` full weeks vs the `baseline_weeks`
+# before them, for a role (search_query match) and/or country. Ranked by z-score, from agg_skill_weekly_counts
+@app.get("/skills/trending")
+async def get_trending_skills(request: Request, response: Response, role:str = None, location:str = None, weeks:int = 4,
+                              baseline_weeks:int = 12, top_k:int = 10, min_count:int = 5):
+    as_of = date.today()
+    try:
+        trending_skills_query(role, location, weeks, baseline_weeks, top_k, min_count, as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def compute():
+        async with async_connection() as aconn:
+            return await trending_skills_async(aconn, role=role, location=location, weeks=weeks,
+                                               baseline_weeks=baseline_weeks, top_k=top_k, min_count=min_count,
+                                               as_of=as_of)
+
+    # The windows move with today's date
+    params = {"role": role, "location": location, "weeks": weeks, "baseline_weeks": baseline_weeks, "top_k": top_k,
+              "min_count": min_count}
+    return await serve_cached(request, response, "skills_trending", params, ("job_skills",), compute, today=as_of)
+
+
+# Skills listed in the same jobs as `skill`, within one search_query or across all jobs, ranked by lift, pmi or count.
+# Served from the in-memory co-occurrence matrices, which catch up with new job_skills rows before answering
+@app.get("/skills/related")
+async def get_related_skills(request: Request, response: Response, skill:str, search_query:str = None, top_k:int = 10,
+                             metric:str = "lift", min_count:int = MIN_COUNT):
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Allowed: {list(METRICS)}")
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+
+    async def compute():
+        snapshot = await skill_cooccurrence.ensure_current()
+        # Cached per normalized name, so echo the stored name rather than this request's spelling
+        return {"skill": snapshot.canonical(skill) or params["skill"], "search_query": search_query,
+                "jobs": snapshot.skill_jobs(skill, search_query),
+                "related": snapshot.related(skill, search_query, top_k, metric, min_count)}
+
+    params = {"skill": skill.strip().lower(), "search_query": search_query, "top_k": top_k, "metric": metric,
+              "min_count": min_count}
+    return await serve_cached(request, response, "skills_related", params, ("job_skills",), compute)
 
 
 # Get geographic distribution by state/province/territory
 @app.get("/geographic_distribution")
-def get_geographic_distribution(location:str = None):
-    df = geographic_distribution(location=location)
-    dict = df.to_dict(orient="records")
-    return {"data": dict}
+async def get_geographic_distribution(request: Request, response: Response, location:str = None):
+    async def compute():
+        async with async_connection() as aconn:
+            dict = await geographic_distribution_async(aconn, location=location)
+        return {"data": dict}
+
+    return await serve_cached(request, response, "geographic_distribution", {"location": location}, ("job_listings",), compute)
 
 
 # Get salary data
 @app.get("/salaries")
-def get_salary_data(location:str = None):
-    df = query_salaries(location=location)
-    dict = df.to_dict(orient="records")
-    return {"data": dict}
+async def get_salary_data(request: Request, response: Response, location:str = None):
+    async def compute():
+        async with async_connection() as aconn:
+            dict = await query_salaries_async(aconn, location=location)
+        return {"data": dict}
+
+    return await serve_cached(request, response, "salaries", {"location": location}, ("salaries",), compute)
 
 
 # Returns info for recent job listings
 @app.get("/recent_listings")
-def get_listings(location:str = None):
-    df = get_recent_listings(location=location)
-    dict = df.to_dict(orient="records")
-    return {"data": dict}
+async def get_listings(request: Request, response: Response, location:str = None):
+    async def compute():
+        async with async_connection() as aconn:
+            dict = await get_recent_listings_async(aconn, location=location)
+        return {"data": dict}
+
+    # Listings are relative to today's date
+    return await serve_cached(request, response, "recent_listings", {"location": location}, ("job_listings",), compute,
+                              today=date.today())
+
+
+# Job postings per day/week/month, per group_by column (must be in ALLOWED_GROUPS; empty for one "total" series)
+# Returns {"freq", "group_by", "dates": [...], "series": {group: [counts aligned with dates]}}
+@app.get("/job_volume")
+async def get_job_volume(request: Request, response: Response, freq:str = "week", group_by:str = "search_query",
+                         start_date:Optional[date] = None, end_date:Optional[date] = None, location:str = None):
+    group_by = group_by or None
+    try:
+        job_volume_query(freq, start_date, end_date, group_by, location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def compute():
+        async with async_connection() as aconn:
+            return await job_volume_over_time_async(aconn, freq=freq, start_date=start_date, end_date=end_date,
+                                                    group_by=group_by, location=location)
+
+    params = {"freq": freq, "group_by": group_by, "start_date": start_date, "end_date": end_date, "location": location}
+    return await serve_cached(request, response, "job_volume", params, ("job_listings",), compute)
+
+
+
+# All dashboard panels in one request/connection
+# fields selects panels (comma separated, default all): job_counts, top_skills, remote_v_onsite, geographic_distribution, salaries, recent_listings
+@app.get("/dashboard")
+async def get_dashboard(request: Request, response: Response, location:str = None, fields:str = None, top_k:int = 10):
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def compute():
+        async with async_connection() as aconn:
+            return await dashboard_panels(aconn, location=location, fields=selected, top_k=top_k)
+
+    params = {"location": location or None, "fields": ",".join(selected), "top_k": top_k}
+    today = date.today() if "recent_listings" in selected else None
+    return await serve_cached(request, response, "dashboard", params, panel_tables(selected), compute, today=today)
 
 
 
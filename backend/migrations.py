@@ -0,0 +1,158 @@
+# Schema migrations
+# Tables are still created by the ingest functions (init_database, DB_migration, create_salary_table); this module adds
+# what the read paths need on top of them, and checks with EXPLAIN that the dashboard queries can use it
+#
+# Usage:
+#   python -m backend.migrations            apply pending migrations
+#   python -m backend.migrations explain    print which index each dashboard query uses
+
+import sys
+from backend.db import connection
+from backend.scraper import init_database, job_counts_query
+from backend.extract_skills import DB_migration
+from backend.salary import create_salary_table, salaries_query
+from backend.analysis import geographic_distribution_query, top_skills_per_query_query, trending_skills_query
+from backend.recent_info import recent_listings_query
+from backend.aggregates import rebuild_sql
+
+
+# Aggregates as of aggregate_tables_initial_build. Applied migrations must not change, so tables added later get
+# their own build migration instead of joining this list
+INITIAL_AGGREGATE_TABLES = ("agg_job_counts", "agg_state_counts", "agg_remote_counts", "agg_daily_counts",
+                            "agg_skill_counts")
+
+
+# (name, statement) in the order they must run. Names are recorded in schema_migrations so each runs once
+MIGRATIONS = [
+    # job_counts filters on LOWER(job_country) then groups by search_query: expression index, index-only scan
+    ("job_listings_country_query_idx", """
+        CREATE INDEX IF NOT EXISTS job_listings_country_query_idx
+        ON job_listings (LOWER(job_country), search_query)
+    """),
+    # geographic_distribution: job_state = ANY(states)
+    ("job_listings_state_idx", """
+        CREATE INDEX IF NOT EXISTS job_listings_state_idx
+        ON job_listings (job_state)
+    """),
+    # recent listings: date_posted = CURRENT_DATE - 1 AND job_country = %s
+    ("job_listings_date_country_idx", """
+        CREATE INDEX IF NOT EXISTS job_listings_date_country_idx
+        ON job_listings (date_posted, job_country)
+    """),
+    ("job_listings_search_query_idx", """
+        CREATE INDEX IF NOT EXISTS job_listings_search_query_idx
+        ON job_listings (search_query)
+    """),
+    # top skills per query: GROUP BY search_query, skill straight off the index
+    ("job_skills_query_skill_idx", """
+        CREATE INDEX IF NOT EXISTS job_skills_query_skill_idx
+        ON job_skills (search_query, skill)
+    """),
+    # skill co-occurrence refresh: job_skills rows changed since the last refresh
+    ("job_skills_updated_at_idx", """
+        CREATE INDEX IF NOT EXISTS job_skills_updated_at_idx
+        ON job_skills (updated_at)
+    """),
+    # aggregate tables (created empty by init_database) counted from the rows stored before they existed
+    ("aggregate_tables_initial_build", rebuild_sql(INITIAL_AGGREGATE_TABLES)),
+    ("skill_weekly_counts_initial_build", rebuild_sql(("agg_skill_weekly_counts",))),
+]
+
+
+def create_migrations_table(conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        conn.commit()
+
+
+# Applies every migration not yet recorded in schema_migrations, each in its own transaction
+def apply_migrations(conn=None):
+
+    with connection(conn) as conn:
+        # Base tables first, migrations reference them
+        init_database(conn)
+        DB_migration(conn)
+        create_salary_table(conn)
+        create_migrations_table(conn)
+
+        with conn.cursor() as c:
+            c.execute("SELECT name FROM schema_migrations")
+            applied = {name for (name,) in c.fetchall()}
+
+        applied_now = []
+        for name, statement in MIGRATIONS:
+            if name in applied:
+                continue
+            with conn.cursor() as c:
+                c.execute(statement)
+                c.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            conn.commit()
+            applied_now.append(name)
+            print(f"Applied migration {name}")
+
+        if not applied_now:
+            print("No pending migrations")
+
+    return applied_now
+
+
+# Dashboard queries to check, with the index each one should be able to use
+def dashboard_queries():
+    return [
+        ("job_counts", job_counts_query("US"), "agg_job_counts_pkey"),
+        ("geographic_distribution", geographic_distribution_query("US"), "agg_state_counts_pkey"),
+        ("recent_listings", recent_listings_query("US"), "job_listings_date_country_idx"),
+        ("top_skills_per_query", top_skills_per_query_query(10), "agg_skill_counts_pkey"),
+        ("trending_skills", trending_skills_query(location="US"), "agg_skill_weekly_counts_pkey"),
+        ("salaries", salaries_query("US"), "salaries_pkey"),
+    ]
+
+
+# Collects the index names used anywhere in an EXPLAIN (FORMAT JSON) plan
+def plan_indexes(node):
+    found = set()
+    if "Index Name" in node:
+        found.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+
+# Runs EXPLAIN on each dashboard query and reports whether its index is used.
+# Sequential scans are disabled for the check: on small tables the planner rightly prefers them, so this verifies the
+# index is usable for the query shape rather than what today's table size happens to favour
+def check_index_usage(conn=None):
+
+    results = {}
+
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("SET LOCAL enable_seqscan = off")
+        for name, (query, params), expected in dashboard_queries():
+            c.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = c.fetchone()[0][0]["Plan"]
+            used = plan_indexes(plan)
+            results[name] = {"expected": expected, "used": sorted(used), "ok": expected in used}
+        conn.rollback()
+
+    return results
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "explain":
+        results = check_index_usage()
+        for name, r in results.items():
+            status = "OK  " if r["ok"] else "MISS"
+            print(f"{status} {name:<25} expected {r['expected']}, used {', '.join(r['used']) or 'no index'}")
+        if not all(r["ok"] for r in results.values()):
+            sys.exit(1)
+    else:
+        apply_migrations()
+
+
+if __name__ == "__main__":
+    main()
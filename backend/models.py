@@ -1,6 +1,7 @@
 #SCHEMAS
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from datetime import date
 
 
 class SkillsResponse(BaseModel):
@@ -10,4 +11,7 @@ class SkillsResponse(BaseModel):
 
 class SkillsRequest(BaseModel):
     role: Optional[str] = None
-    top_k: Optional[int] = 10
\ No newline at end of file
+    top_k: Optional[int] = 10
+    location: Optional[str] = None      # country, only used for the per-role breakdown (no role)
+    start_date: Optional[date] = None   # date_posted range, same
+    end_date: Optional[date] = None
\ No newline at end of file
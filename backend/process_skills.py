@@ -1,100 +1,217 @@
+from collections import deque
 from tqdm import tqdm
+from psycopg2.extras import execute_values
 from backend.extract_skills import *
-import os
-from collections import defaultdict
+from backend.db import connection
+from backend.versions import bump_version
+from backend.chunk_cache import ChunkCache, CHUNK_CACHE_ENABLED
+from backend.skill_matcher import extract_skills_dictionary, merge_skill_sets
+from backend.extraction_queue import create_queue_table, complete_jobs
+from backend.aggregates import add_skills
+from backend.analysis import top_skills_per_query
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
+
+JOBS_PER_BATCH = 256   # jobs whose chunks are pooled for batched inference and written together
+
+
+# Upserts the skills extracted for a group of jobs. skills is {job_id: [(skill, confidence)]}
+# Rows that are new (not updates of a skill already stored for the job) are added to agg_skill_counts
+def store_job_skills(c, skills, search_queries, model=None):
+
+    model = model or source_model()
+    rows = [(job_id, skill, float(confidence), search_queries[job_id], model)
+            for job_id, job_skills in skills.items()
+            for skill, confidence in job_skills]
+
+    if rows:
+        written = execute_values(c, """
+            INSERT INTO job_skills (job_id, skill, confidence, search_query, source_model)
+            VALUES %s
+            ON CONFLICT (job_id, skill) DO UPDATE
+                SET confidence = EXCLUDED.confidence,
+                search_query = EXCLUDED.search_query,
+                source_model = EXCLUDED.source_model,
+                updated_at = now()
+            RETURNING xmax = 0 AS inserted, job_id, search_query, skill;
+        """, rows, fetch=True)
+        add_skills(c, [(job_id, search_query, skill) for inserted, job_id, search_query, skill in written if inserted])
+
+
+# Candidate jobs in id order, optionally only those with no job_skills rows yet, starting after after_id
+def candidates_query(new_jobs_only=True, after_id=None):
+    where = []
+    params = []
+    if new_jobs_only:
+        where.append("NOT EXISTS (SELECT 1 FROM job_skills s WHERE s.job_id = job_listings.id)")
+    if after_id is not None:
+        where.append("id > %s")
+        params.append(after_id)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    return f"""
+        SELECT id, job_description, qualifications, search_query
+        FROM job_listings
+        {where_sql}
+        ORDER BY id
+    """, params
+
+
+# Streams candidate jobs as groups of jobs_per_batch [(job_id, text, search_query)] through a named (server-side)
+# cursor on its own connection, so only one group of descriptions is in memory at a time
+def candidate_groups(new_jobs_only=True, after_id=None, jobs_per_batch=JOBS_PER_BATCH):
+    query, params = candidates_query(new_jobs_only, after_id)
+    with connection() as read_conn, read_conn.cursor(name="process_jobs_candidates") as rc:
+        rc.itersize = jobs_per_batch
+        rc.execute(query, params)
+        while True:
+            rows = rc.fetchmany(jobs_per_batch)
+            if not rows:
+                break
+            # skip None, concatenates desc and qualifications into 1 string
+            yield [(job_id, " ".join(filter(None, [desc, qualifications])), search_query)
+                   for job_id, desc, qualifications, search_query in rows]
+        read_conn.rollback()
+
+
+def count_candidates(c, new_jobs_only=True, after_id=None):
+    query, params = candidates_query(new_jobs_only, after_id)
+    c.execute(f"SELECT COUNT(*) FROM ({query}) candidates", params)
+    return c.fetchone()[0]
+
+
+# Checkpoint of an unfinished run with this name, or None
+def load_checkpoint(c, run_name):
+    c.execute("""
+        SELECT last_job_id, jobs_done
+        FROM extraction_checkpoints
+        WHERE run_name = %s AND finished_at IS NULL
+    """, (run_name,))
+    return c.fetchone()
+
+
+def start_checkpoint(c, run_name):
+    c.execute("""
+        INSERT INTO extraction_checkpoints (run_name, last_job_id, jobs_done, started_at, updated_at, finished_at)
+        VALUES (%s, NULL, 0, now(), now(), NULL)
+        ON CONFLICT (run_name) DO UPDATE
+            SET last_job_id = NULL, jobs_done = 0, started_at = now(), updated_at = now(), finished_at = NULL
+    """, (run_name,))
+
+
+def save_checkpoint(c, run_name, last_job_id, jobs_done, finished=False):
+    c.execute("""
+        UPDATE extraction_checkpoints
+        SET last_job_id = %s, jobs_done = %s, updated_at = now(), finished_at = CASE WHEN %s THEN now() END
+        WHERE run_name = %s
+    """, (last_job_id, jobs_done, finished, run_name))
 
 
 # Function to process job postings in DB, extract skills and store into job_skills table
-def process_jobs(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, new_jobs_only=True):
-
-    DB_migration(host, port, dbname, user, password)
-
-    # Connect to DB
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
-
-    with conn.cursor() as c:
-        if new_jobs_only:
-            # Only jobs with no entries in job_skills
-            c.execute("""
-                SELECT id, job_description, qualifications, search_query
-                FROM job_listings
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM job_skills s WHERE s.job_id = job_listings.id
-                )
-            """)
+# Candidates are streamed through a server-side cursor JOBS_PER_BATCH at a time: their chunks go through the model in
+# batches of batch_size, and each group's skills are committed together with the run's checkpoint, so memory stays flat
+# as job_listings grows and an interrupted run (resume=True) picks up after the last committed job.
+# Resume only covers ids after the checkpoint: jobs inserted since the interrupted run whose ids sort below it are not
+# picked up by the resumed run (in "new" mode the next run finds them; in "all" mode the next full pass does). A pass
+# that completes clears the checkpoint, so the next run starts from the first id.
+# With workers > 1 the groups are spread over that many extraction processes, and this process stays the only writer.
+# With use_cache, chunks already in the NER chunk cache skip the model; the run's hit rate is printed at the end.
+# extractor picks how skills are found: "ner" (the model), "dictionary" (SKILLS_DIC matcher, no model loaded) or
+# "hybrid" (union of both).
+# This is the single-node path; backend.extraction_queue spreads the same work over several machines
+def process_jobs(conn=None, new_jobs_only=True, batch_size=BATCH_SIZE, jobs_per_batch=JOBS_PER_BATCH, workers=WORKERS,
+                 threads_per_worker=None, use_cache=CHUNK_CACHE_ENABLED, extractor=EXTRACTOR, resume=True):
+
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"Invalid extractor: {extractor}. Allowed: {list(EXTRACTORS)}")
+    model = source_model(extractor=extractor)
+    run_name = f"{'new' if new_jobs_only else 'all'}:{model}"
+
+    # Borrow a pooled connection for the whole run (writes and checkpoints)
+    with connection(conn) as conn, conn.cursor() as c:
+        DB_migration(conn)
+        create_queue_table(conn)
+
+        checkpoint = load_checkpoint(c, run_name) if resume else None
+        if checkpoint:
+            after_id, done = checkpoint
+            print(f"Resuming {run_name} after {done} job(s), from job id {after_id} (ids below it are not revisited)")
         else:
-            # Process everything
-            c.execute("SELECT id, job_description, qualifications, search_query FROM job_listings")
-
-        jobs = c.fetchall()
-        print(f"Found {len(jobs)} job(s) to process.")
+            after_id, done = None, 0
+            start_checkpoint(c, run_name)
+        conn.commit()
+
+        total = count_candidates(c, new_jobs_only, after_id)
+        print(f"Found {total} job(s) to process.")
+
+        # Groups read but not yet committed, in id order. Results can come back out of order from the workers, so the
+        # checkpoint only moves past a group once every group before it is committed too
+        pending = deque()    # last job id of each group
+        groups = {}          # last job id -> group
+        owner = {}           # job id -> last job id of its group
+
+        def dispatch():
+            for group in candidate_groups(new_jobs_only, after_id, jobs_per_batch):
+                last_id = group[-1][0]
+                groups[last_id] = group
+                owner.update((job_id, last_id) for job_id, _, _ in group)
+                pending.append(last_id)
+                yield [(job_id, text) for job_id, text, _ in group]
+
+        cache = ChunkCache() if use_cache and extractor != "dictionary" else None
+
+        if extractor == "dictionary":
+            results = (extract_skills_dictionary(group) for group in dispatch())
+        elif workers > 1:
+            results = extract_skills_parallel(dispatch(), workers, threads_per_worker, batch_size, cache)
+        else:
+            # build NLP pipeline 
+            NLP = build_pipeline()
+            results = (extract_skills_batch(NLP, group, batch_size, cache) for group in dispatch())
 
-        # build NLP pipeline 
-        NLP = build_pipeline()
-        
+        finished = set()
+        checkpoint_id = after_id
 
         # process jobs
-        for job_id, desc, qualifications, search_query in tqdm(jobs, desc="Extracting skills"):
-            text = " ".join(filter(None, [desc, qualifications]))  # skip None, concatenates desc and qualifications into 1 string
-            skills = extract_skills(NLP, text)  # List of tuples (skills, confidence)
-
-            # Batch insert
-            c.executemany("""
-                INSERT INTO job_skills (job_id, skill, confidence, search_query, source_model)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (job_id, skill) DO UPDATE
-                    SET confidence = EXCLUDED.confidence,
-                    search_query = EXCLUDED.search_query,
-                    source_model = EXCLUDED.source_model;
-            """, [(job_id, skill, float(confidence), search_query, MODEL_ID) for skill, confidence in skills])
-
-
-    conn.commit()
-    conn.close()
-    print(f"Processed {len(jobs)} job(s) and stored skills in job_skills.")
-
+        with tqdm(total=total, desc="Extracting skills") as progress:
+            for skills in results:  # job_id -> list of tuples (skills, confidence)
+                last_id = owner[next(iter(skills))]
+                group = groups.pop(last_id)
+                for job_id, _, _ in group:
+                    del owner[job_id]
 
+                if extractor == "hybrid":
+                    skills = merge_skill_sets(skills, extract_skills_dictionary((job_id, text) for job_id, text, _ in group))
 
+                store_job_skills(c, skills, {job_id: search_query for job_id, _, search_query in group}, model)
+                complete_jobs(c, skills.keys(), model)   # so queue workers don't redo them
+                done += len(group)
+                finished.add(last_id)
+                while pending and pending[0] in finished:
+                    finished.remove(pending[0])
+                    checkpoint_id = pending.popleft()
+                save_checkpoint(c, run_name, checkpoint_id, done)
+                bump_version(c, "job_skills")   # invalidates cached dashboard results
+                conn.commit()
+                progress.update(len(group))
 
-# Get the top N most frequent skills for each search_query (role)
-# Returns dict: {search_query: [(skill, count), ...]}
-def top_skills_per_query(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, top_n=10):
-   
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
+        save_checkpoint(c, run_name, None, done, finished=True)   # full pass done: the next run starts over
+        conn.commit()
+    print(f"Processed {done} job(s) and stored skills in job_skills.")
 
-    with conn.cursor() as c:
-        # Run query
-        c.execute("""
-            SELECT search_query, skill, COUNT(*) as freq
-            FROM job_skills
-            GROUP BY search_query, skill
-            ORDER BY search_query, freq DESC;
-        """)
-        rows = c.fetchall()
-        conn.close()
+    if cache is not None:
+        stats = cache.stats()
+        evicted = cache.prune()
+        print(f"Chunk cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+              f"evicted {evicted} chunk(s)")
 
-    # Organize into defaultdict (to prevent KeyError)
-    results = defaultdict(list)
-    for search_query, skill, freq in rows:
-        if len(results[search_query]) < top_n:
-            results[search_query].append((skill, freq))
 
-    return dict(results)   # converting back to normal dict
 
 
 def main():
     #TODO: set new_jobs_only to TRUE when setting up ETL job
-    process_jobs(HOST, PORT, DBNAME, USER, PASSWORD, new_jobs_only=False)
+    process_jobs(new_jobs_only=False)
     top_skills = top_skills_per_query(top_n=50)
     for query, skills in top_skills.items():
         print(f"Top skills for {query}:")
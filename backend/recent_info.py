@@ -1,41 +1,39 @@
-import psycopg2
-import os
 import pandas as pd
 from dotenv import load_dotenv
+from .db import connection, fetch_records
 
 load_dotenv()
 
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
 
+# Builds the recent listings query (jobs posted yesterday)
+# CURRENT_DATE - 1 stays a DATE so the (date_posted, job_country) index can be used, unlike subtracting an INTERVAL
+def recent_listings_query(location=None):
+    query = """
+        SELECT job_title, employer_name, job_country, apply_link, search_query 
+        FROM job_listings
+        WHERE date_posted = CURRENT_DATE - 1
+        """
+    params = ()
+    if location in ("US", "CA"):
+        query += " AND job_country = %s"
+        params = (location,)
+    return query, params
 
-def get_recent_listings(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, location=None):
-    
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
+def get_recent_listings(conn=None, location=None):
 
-    query = """
-            SELECT job_title, employer_name, job_country, apply_link, search_query 
-            FROM job_listings
-            WHERE date_posted = CURRENT_DATE - INTERVAL '1 day'
-            """
-    
-    df = pd.read_sql(query, conn)
+    query, params = recent_listings_query(location)
 
-    if location == "US":
-        df = df[df["job_country"] == "US"]
-    elif location == "CA":
-        df = df[df["job_country"] == "CA"]
+    with connection(conn) as conn:
+        df = pd.read_sql(query, conn, params=params)
 
-    
-    conn.close()
 
     return df
-    
+
+
+async def get_recent_listings_async(aconn, location=None):
+    return await fetch_records(aconn, *recent_listings_query(location))
+
 # MAIN
 def main():
 
@@ -1,28 +1,18 @@
-import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from .data.skills_dic import US_CITIES, CA_CITIES
-import requests
-import psycopg2
 import pandas as pd
+from .db import connection, fetch_records
+from .versions import create_versions_table, bump_version
+from .fetcher import JSearchClient, MAX_WORKERS
 
 load_dotenv()
 
-API_KEY = os.getenv("RAPIDAPI_KEY")
-API_HOST = os.getenv("RAPIDAPI_HOST")
-
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
 
 # Creates salaries job table in DB
-def create_salary_table(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD):
+def create_salary_table(conn=None):
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
-    
-    with conn.cursor() as c:
+    with connection(conn) as conn, conn.cursor() as c:
 
         c.execute("""
             CREATE TABLE IF NOT EXISTS salaries (
@@ -36,20 +26,61 @@ def create_salary_table(host=HOST, port=PORT, dbname=DBNAME, user=USER, password
             )
         """)
 
-    conn.commit()
-    conn.close()
+        conn.commit()
 
+        create_versions_table(conn)
 
-# Get salary data for top 10 cities
-def fetch_salary(country: str, role: str, host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD):
-    
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
-    url = "https://jsearch.p.rapidapi.com/estimated-salary"
-    headers = {
-        'x-rapidapi-key' : API_KEY,
-        'x-rapidapi-host' : API_HOST
-    }
+# Stores (city, API data) rows for a role. Existing rows are refreshed, so re-ingesting (e.g. replaying the response
+# archive) updates them instead of failing on the primary key. Returns how many rows were written
+def store_salaries(role, rows, conn=None):
+
+    salaries_counter = 0
+
+    with connection(conn) as conn:
+        create_salary_table(conn)
+
+        for city, data in rows:
+            if not data:
+                print(f"No salary data for {role} in {city}")
+                continue
+            try:
+                with conn.cursor() as c:
+                    d_city = city
+                    d_role = role
+                    d_min_salary = data[0].get("min_salary")
+                    d_min_base_salary = data[0].get("min_base_salary")
+                    d_median_salary = data[0].get("median_salary")
+                    d_median_base_salary = data[0].get("median_base_salary")
+
+                    c.execute("""
+                        INSERT INTO salaries (city, role, min_salary, min_base_salary, median_salary, median_base_salary)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (city, role) DO UPDATE SET
+                            min_salary = EXCLUDED.min_salary,
+                            min_base_salary = EXCLUDED.min_base_salary,
+                            median_salary = EXCLUDED.median_salary,
+                            median_base_salary = EXCLUDED.median_base_salary
+                    """, (d_city, d_role, d_min_salary, d_min_base_salary, d_median_salary, d_median_base_salary))
+
+                    if c.rowcount > 0:
+                        salaries_counter += 1
+            
+            except Exception as e:
+                print(f"Error saving salary: {e}")
+                continue
+
+        if salaries_counter > 0:
+            with conn.cursor() as c:
+                bump_version(c, "salaries")   # invalidates cached dashboard results
+
+        conn.commit()
+
+    return salaries_counter
+
+
+# Get salary data for top 10 cities
+def fetch_salary(country: str, role: str, conn=None, client=None):
 
     if country == "US":
         cities = US_CITIES
@@ -58,77 +89,57 @@ def fetch_salary(country: str, role: str, host=HOST, port=PORT, dbname=DBNAME, u
     else:
         return "Invalid country: {country}"
 
-    salaries_counter = 0
+    # Cities are fetched concurrently through the rate-limited client (timeouts, retries on 429/5xx)
+    client = client or JSearchClient()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        results = pool.map(lambda city: client.estimated_salary(role, city), cities)
+        rows = list(zip(cities, results))
 
-    for city in cities:
-        params = {
-                "job_title": role,
-                "location": city,
-                "fields": ["min_salary", "min_base_salary", "median_salary", "median_base_salary"]
-            }
-        
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception(f"API Error: {response.status_code} - {response.text}")
-        
-        data = response.json().get("data", [])
-
-        try:
-            with conn.cursor() as c:
-                d_city = city
-                d_role = role
-                d_min_salary = data[0].get("min_salary")
-                d_min_base_salary = data[0].get("min_base_salary")
-                d_median_salary = data[0].get("median_salary")
-                d_median_base_salary = data[0].get("median_base_salary")
-
-                c.execute("""
-                    INSERT INTO salaries (city, role, min_salary, min_base_salary, median_salary, median_base_salary)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (d_city, d_role, d_min_salary, d_min_base_salary, d_median_salary, d_median_base_salary))
-
-                if c.rowcount > 0:
-                    salaries_counter += 1
-        
-        except Exception as e:
-            print(f"Error saving salary: {e}")
-            continue
+    salaries_counter = store_salaries(role, rows, conn)
 
     print(f"Succesfully inserted salary info for {salaries_counter} cities in {country}, for {role}!")
 
-    conn.commit()
-    conn.close()
-
     return "Success!!"
 
 
-# QUERY SALARIES FOR TESTING PURPOSES
-def query_salaries(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, location=None):
+# Top cities to keep for a given location (None keeps everything)
+def location_cities(location):
+    if location == "US":
+        return US_CITIES
+    elif location == "CA":
+        return CA_CITIES
+    return None
 
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
+# Builds the salaries query. The location filter is applied in SQL (city = ANY uses the (city, role) primary key)
+def salaries_query(location=None):
+    cities = location_cities(location)
     query = """
-            SELECT city, role, min_salary, min_base_salary, median_salary, median_base_salary 
-            FROM salaries
-            """
-    with conn.cursor() as c:
-        c.execute(query)
-
-        
-        df = pd.read_sql(query, conn)
-
-        if location == "US":
-            cities = US_CITIES
-            df = df[df["city"].isin(cities)]
-        elif location == "CA":
-            cities = CA_CITIES
-            df = df[df["city"].isin(cities)]
-
-    
-    conn.close()
+        SELECT city, role, min_salary, min_base_salary, median_salary, median_base_salary 
+        FROM salaries
+        """
+    params = ()
+    if cities is not None:
+        query += " WHERE city = ANY(%s)"
+        params = (list(cities),)
+    return query, params
+
+
+# QUERY SALARIES FOR TESTING PURPOSES
+def query_salaries(conn=None, location=None):
+
+    query, params = salaries_query(location)
+
+    with connection(conn) as conn:
+        df = pd.read_sql(query, conn, params=params)
+
     return df
 
 
+async def query_salaries_async(aconn, location=None):
+    return await fetch_records(aconn, *salaries_query(location))
+
+
 # MAIN
 def main():
 
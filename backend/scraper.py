@@ -2,31 +2,25 @@
 # Author: Viktor Blais (GitHub: https://github.com/vblais12)
 # Fetch Job listings and store in database for analysis
 
-import requests
-from datetime import datetime
-import psycopg2
-import os
+from datetime import datetime, date, timedelta
+import io
+import sys
 from dotenv import load_dotenv
 import hashlib
+from psycopg2.extras import execute_values
+from backend.db import connection, fetch_rows
+from backend.versions import create_versions_table, bump_version
+from backend.extraction_queue import create_queue_table, enqueue_jobs
+from backend.aggregates import create_aggregate_tables, add_listings
+from backend.fetcher import JSearchClient, fetch_all, stream_results, page_ranges
 load_dotenv()
 
-API_KEY = os.getenv("RAPIDAPI_KEY")
-API_HOST = os.getenv("RAPIDAPI_HOST")
-
-# DB CRED
-HOST = os.getenv("DB_HOST") or os.getenv("HOST")
-PORT = os.getenv("DB_PORT") or os.getenv("PORT", "5432")
-DBNAME = os.getenv("DBNAME")
-USER = os.getenv("USER")
-PASSWORD = os.getenv("PASSWORD")
 
 # Function connects to AWS RDS instance, connects to database and creates a job table
 # Nothing happens if database was already created
-def init_database(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD):
-
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
+def init_database(conn=None):
 
-    with conn.cursor() as c:
+    with connection(conn) as conn, conn.cursor() as c:
 
         c.execute("""
             CREATE TABLE IF NOT EXISTS job_listings (
@@ -46,8 +40,27 @@ def init_database(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSW
             )
         """)
 
-    conn.commit()
-    conn.close()
+        # Per (query, country) watermark for incremental scraping: newest posting seen and the pages of the last run
+        # that held only known jobs
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS scrape_state (
+                search_query TEXT NOT NULL,
+                job_country TEXT NOT NULL,
+                newest_posted DATE,
+                duplicate_pages INTEGER[] NOT NULL DEFAULT '{}',
+                last_run_at TIMESTAMPTZ,
+                last_pages INTEGER NOT NULL DEFAULT 0,
+                last_inserted INTEGER NOT NULL DEFAULT 0,
+                last_duplicates INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (search_query, job_country)
+            )
+        """)
+
+        conn.commit()
+
+        create_versions_table(conn)
+        create_queue_table(conn)
+        create_aggregate_tables(conn)
 
 
 # Prevents againsts storing repeated job postings for the same job as different jobs.
@@ -60,169 +73,401 @@ def generate_job_key(title, employer, city, description):
 
 
 # API call, fetches jobs and returns json dictionary of jobs
-# TODO: Maybe had some location features
-#
-def fetch_jobs(query="Machine Learning", location="US", pages=9, date_posted="today"):
+# Goes through JSearchClient, so the call has a timeout, retries and a keep-alive session
+def fetch_jobs(query="Machine Learning", location="US", pages=9, date_posted="today", client=None):
+
+    client = client or JSearchClient()
+    return client.search(query, location=location, page=1, num_pages=pages, date_posted=date_posted)
+
+
+JOB_COLUMNS = (
+    "id", "job_title", "date_posted", "job_is_remote", "employer_name", "job_employment_type", "job_city",
+    "job_country", "job_state", "job_description", "qualifications", "apply_link", "search_query"
+)
+
+
+# Parses the API's posting timestamp into a date. Returns None if the job has no date
+def parse_date_posted(date):
+    if not date:
+        return None
+    try:
+        return datetime.strptime(date, "%Y-%m-%dT%H:%M:%S.%fZ").date()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(date.replace("Z", "+00:00")).date()   # if date formatting doesnt work
+    except ValueError:
+        raise ValueError(f"Unparseable job_posted_at_datetime_utc: {date!r}")
+
+
+# Converts one API job dict into a job_listings row (tuple in JOB_COLUMNS order)
+def parse_job(job):
+    job_title = (job.get("job_title") or "").strip()
+    date_posted = parse_date_posted(job.get("job_posted_at_datetime_utc"))
+    job_is_remote = job.get("job_is_remote") or ""
+    if job_is_remote is True:
+        job_is_remote = "true"   # stored as text, same as the old per-row INSERT produced
+    employer_name = (job.get("employer_name") or "").strip()
+    job_employment_type = job.get("job_employment_type") or ""
+    job_city = (job.get("job_city") or "Remote").strip()
+    job_country = job.get("job_country") or "Remote"
+    job_state = job.get("job_state") or "Remote"
+    job_description = job.get("job_description") or ""
+    job_highlights = job.get("job_highlights") or {}
+    qualifications_raw = job_highlights.get("Qualifications", [])
+    if isinstance(qualifications_raw, list):        # converting list to string
+        qualifications = ". ".join(qualifications_raw)
+    else:
+        qualifications = qualifications_raw or "Not specified"
+    apply_link = job.get("job_apply_link") or ""
+    search_query = job.get("search_query") or ""
+    job_id = generate_job_key(job_title, employer_name, job_city, job_description)
+
+    return (job_id, job_title, date_posted, job_is_remote, employer_name, job_employment_type, job_city, job_country,
+            job_state, job_description, qualifications, apply_link, search_query)
+
+
+# Parses a list of jobs. Returns (rows, errors) where errors holds {"index", "error"} for jobs that could not be parsed
+def parse_jobs(jobs):
+    rows = []
+    errors = []
+    for i, job in enumerate(jobs):
+        try:
+            rows.append(parse_job(job))
+        except Exception as e:
+            errors.append({"index": i, "error": str(e)})
+    return rows, errors
 
-    url = 'https://jsearch.p.rapidapi.com/search'
 
-    search_query = f"{query}".strip()
+INSERT_JOBS_SQL = f"""
+    INSERT INTO job_listings ({", ".join(JOB_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id
+"""
 
-    params = {
-        "query" : search_query,
-        "page" : "1",
-        "num_pages" : str(pages),
-        "country" : {location},
-        "date_posted" : date_posted,
-    }
 
-    headers = {
-        'x-rapidapi-key' : API_KEY,
-        'x-rapidapi-host' : API_HOST
-    }
+# Multi-row INSERT ... VALUES in pages of batch_size rows. Returns the ids that were actually inserted
+def insert_rows_values(c, rows, batch_size=1000):
+    inserted = execute_values(c, INSERT_JOBS_SQL, rows, page_size=batch_size, fetch=True)
+    return [job_id for (job_id,) in inserted]
+
+
+# Escapes a value for COPY ... FROM STDIN in text format
+def copy_value(value):
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
 
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
-        raise Exception(f"API Error: {response.status_code} - {response.text}")
-    
 
-    jobs_data = response.json().get("data", [])
+# COPY every row into a session-local staging table, then move them over with one INSERT ... SELECT.
+# Fastest path for large loads. Returns the ids that were actually inserted
+def insert_rows_copy(c, rows):
+    columns = ", ".join(JOB_COLUMNS)
+    c.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS job_listings_staging
+        (LIKE job_listings INCLUDING DEFAULTS)
+    """)
+    c.execute("TRUNCATE job_listings_staging")
 
-    for job in jobs_data:
-        job['search_query'] = search_query
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    c.copy_expert(f"COPY job_listings_staging ({columns}) FROM STDIN", buffer)
 
+    c.execute(f"""
+        INSERT INTO job_listings ({columns})
+        SELECT {columns} FROM job_listings_staging
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    """)
+    inserted = [job_id for (job_id,) in c.fetchall()]
+    c.execute("TRUNCATE job_listings_staging")
+    return inserted
 
-    return jobs_data
+
+_schema_ready = False
 
 
 # Stores jobs in job listings database
-#
-#
-def store_jobs(jobs, host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD):
-
-    init_database(host, port, dbname, user, password)
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
-
-    job_inserted_counter = 0
-
-    with conn.cursor() as c:       # automatically takes care of closing cursor (even if error occurs)
-        for job in jobs:
-            try:
-                job_title = (job.get("job_title") or "").strip()
-                date = job.get("job_posted_at_datetime_utc")
-                date_posted = ""
-                if date:
-                    try:
-                        date_posted = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d")
-                    except ValueError:
-                        date_posted = date   # if date formatting doesnt work
-                job_is_remote = job.get("job_is_remote") or ""
-                employer_name = (job.get("employer_name") or "").strip()
-                job_employment_type = job.get("job_employment_type") or ""
-                job_city = (job.get("job_city") or "Remote").strip()
-                job_country = job.get("job_country") or "Remote"
-                job_state = job.get("job_state") or "Remote"
-                job_description = job.get("job_description") or ""
-                job_highlights = job.get("job_highlights", {})
-                qualifications_raw = job_highlights.get("Qualifications", [])
-                if isinstance(qualifications_raw, list):        # converting list to string
-                    qualifications = ". ".join(qualifications_raw)
-                else:
-                    qualifications = qualifications_raw or "Not specified"
-                apply_link = job.get("job_apply_link") or ""
-                search_query = job.get("search_query") or ""
-                job_id = generate_job_key(job_title, employer_name, job_city, job_description)
-
-                c.execute("""
-                    INSERT INTO job_listings (id, job_title, date_posted, job_is_remote, employer_name, job_employment_type, job_city, job_country, job_state, job_description, qualifications, apply_link, search_query)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO NOTHING;
-                """, (job_id, job_title, date_posted, job_is_remote, employer_name, job_employment_type, job_city, job_country, job_state, job_description, qualifications, apply_link, search_query))
-
-                if c.rowcount > 0:  # only count if inserted
-                    job_inserted_counter += 1
-
-
-            except Exception as e:
-                print(f"Error saving job: {e}")
-                continue
-    
-    conn.commit()
-    conn.close()
+# Rows are parsed up front (parse errors are reported per job and skipped), then written in bulk:
+# method="values" uses multi-row INSERTs of batch_size rows, method="copy" uses COPY into a staging table.
+# Returns {"inserted", "duplicates", "errors"}
+def store_jobs(jobs, conn=None, method="values", batch_size=1000):
+    global _schema_ready
+
+    rows, errors = parse_jobs(jobs)
+    for error in errors:
+        print(f"Error saving job #{error['index']}: {error['error']}")
+
+    with connection(conn) as conn:
+        if not _schema_ready:   # DDL once per process rather than on every call
+            init_database(conn)
+            _schema_ready = True
+
+        with conn.cursor() as c:       # automatically takes care of closing cursor (even if error occurs)
+            if not rows:
+                inserted = []
+            elif method == "copy":
+                inserted = insert_rows_copy(c, rows)
+            elif method == "values":
+                inserted = insert_rows_values(c, rows, batch_size)
+            else:
+                raise ValueError(f"Invalid method: {method}. Allowed: ['values', 'copy']")
+
+            if inserted:
+                enqueue_jobs(c, inserted)         # new jobs wait for skill extraction
+                add_listings(c, inserted)         # dashboard counts
+                bump_version(c, "job_listings")   # invalidates cached dashboard results
+
+        conn.commit()
+
+    job_inserted_counter = len(inserted)
     print(f"Stored {job_inserted_counter} jobs to the database")
 
+    return {
+        "inserted": job_inserted_counter,
+        "duplicates": len(rows) - job_inserted_counter,
+        "errors": errors,
+    }
+
+
+
+# Jobs grouped by search_query, read from agg_job_counts. The total is the sum of the groups, so one query covers both
+def job_counts_query(location=None):
+    if location:
+        return """
+            SELECT search_query, SUM(job_count)::bigint as count
+            FROM agg_job_counts
+            WHERE job_country = LOWER(%s)
+            GROUP BY search_query
+            ORDER BY count DESC
+        """, (location,)
+    return """
+        SELECT search_query, SUM(job_count)::bigint as count
+        FROM agg_job_counts
+        GROUP BY search_query
+        ORDER BY count DESC
+    """, ()
+
+
+def format_job_counts(counts_by_query):
+    return {
+        "total_jobs": sum(count for _, count in counts_by_query),
+        "counts_by_query": counts_by_query
+    }
 
 
 # Counts how many jobs are in the DB (TOTAL and per role)
-def job_counts(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD, location=None):
-    
-    conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
+def job_counts(conn=None, location=None):
 
-    with conn.cursor() as c:
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute(*job_counts_query(location))
+        counts_by_query = c.fetchall()
 
-        # Total jobs
+    return format_job_counts(counts_by_query)
 
-        if location:
-            c.execute("""
-                SELECT COUNT(*) FROM job_listings
-                WHERE LOWER(job_country) = LOWER(%s)
-            """, (location,))
-            total_jobs = c.fetchone()[0]
 
-             # Jobs grouped by search_query
-            c.execute("""
-                SELECT search_query, COUNT(*) as count
-                FROM job_listings
-                WHERE LOWER(job_country) = LOWER(%s)
-                GROUP BY search_query
-                ORDER BY count DESC
-            """, (location,))
+async def job_counts_async(aconn, location=None):
+    counts_by_query = await fetch_rows(aconn, *job_counts_query(location))
+    return format_job_counts(counts_by_query)
 
-            counts_by_query = c.fetchall()
 
 
-        else:
-            c.execute("SELECT COUNT(*) FROM job_listings")
-            total_jobs = c.fetchone()[0]
+# Streaming scrape-to-store pipeline
+# Fetched pages are parsed and flushed to the DB in batches of batch_size jobs as they arrive, instead of collecting
+# every job first. fetch_all's bounded queue gives backpressure while a batch is being written, so memory stays flat
+# however many roles/pages are scraped, and a failure late in the run only loses the batch in progress
+def scrape_and_store(roles, locations=("US",), pages=1, date_posted="today", client=None, batch_size=500,
+                     method="values", max_workers=None, queue_size=None):
 
-            # Jobs grouped by search_query
-            c.execute("""
-                SELECT search_query, COUNT(*) as count
-                FROM job_listings
-                GROUP BY search_query
-                ORDER BY count DESC
-            """)
-            counts_by_query = c.fetchall()
+    client = client or JSearchClient()
+    stats = {"pages": 0, "fetched": 0, "inserted": 0, "duplicates": 0, "parse_errors": 0, "failed_requests": 0}
+    batch = []
 
-    
-    conn.close()
-    # return total_jobs, counts_by_query
+    def flush():
+        result = store_jobs(batch, method=method)
+        stats["inserted"] += result["inserted"]
+        stats["duplicates"] += result["duplicates"]
+        stats["parse_errors"] += len(result["errors"])
+        batch.clear()
 
-    return {
-        "total_jobs": total_jobs,
-        "counts_by_query": counts_by_query
-    }
+    workers = {"max_workers": max_workers} if max_workers else {}
+    for task, jobs, error in fetch_all(client, roles, locations, pages=pages, date_posted=date_posted,
+                                       queue_size=queue_size, **workers):
+        if error:
+            print(f"Error while fetching job for {task['query']} (pages {task['page']}-{task['page'] + task['num_pages'] - 1}): {error}")
+            stats["failed_requests"] += 1
+            continue
+        stats["pages"] += task["num_pages"]
+        stats["fetched"] += len(jobs)
+        batch.extend(jobs)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return stats
 
 
+# Incremental scraping
+# JSearch returns the most relevant postings first, so once a page holds only jobs already in the DB the pages after it
+# are mostly old ones too. scrape_incremental walks the pages in order, stores each one, and stops at the first fully
+# duplicate page. The date_posted window is also narrowed to reach back only to the newest posting seen last run
+
+# JSearch date_posted windows, narrowest first, with how many days back each one reaches
+DATE_POSTED_DAYS = {"today": 1, "3days": 3, "week": 7, "month": 30}
+
+
+def load_scrape_state(query, country, conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            SELECT newest_posted, duplicate_pages, last_run_at
+            FROM scrape_state
+            WHERE search_query = %s AND job_country = %s
+        """, (query, country))
+        row = c.fetchone()
+    if row is None:
+        return None
+    return {"newest_posted": row[0], "duplicate_pages": row[1], "last_run_at": row[2]}
+
+
+def save_scrape_state(query, country, newest_posted, duplicate_pages, stats, conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute("""
+            INSERT INTO scrape_state (search_query, job_country, newest_posted, duplicate_pages, last_run_at,
+                                      last_pages, last_inserted, last_duplicates)
+            VALUES (%s, %s, %s, %s, now(), %s, %s, %s)
+            ON CONFLICT (search_query, job_country) DO UPDATE SET
+                newest_posted = GREATEST(scrape_state.newest_posted, EXCLUDED.newest_posted),
+                duplicate_pages = EXCLUDED.duplicate_pages,
+                last_run_at = EXCLUDED.last_run_at,
+                last_pages = EXCLUDED.last_pages,
+                last_inserted = EXCLUDED.last_inserted,
+                last_duplicates = EXCLUDED.last_duplicates
+        """, (query, country, newest_posted, duplicate_pages, stats["pages"], stats["inserted"], stats["duplicates"]))
+        conn.commit()
+
+
+# Narrowest date_posted window that still reaches the newest posting seen last run (plus a day of slack for postings
+# that show up late), never wider than the window asked for
+def date_posted_since(newest_posted, date_posted):
+    if newest_posted is None or (date_posted not in DATE_POSTED_DAYS and date_posted != "all"):
+        return date_posted
+    age = (date.today() - newest_posted).days + 1
+    for window, days in DATE_POSTED_DAYS.items():
+        if date_posted != "all" and days >= DATE_POSTED_DAYS[date_posted]:
+            break
+        if age <= days:
+            return window
+    return date_posted
+
+
+# Newest posting date among jobs, ignoring ones without a parseable date
+def newest_posting(jobs, newest=None):
+    for job in jobs:
+        try:
+            posted = parse_date_posted(job.get("job_posted_at_datetime_utc"))
+        except ValueError:
+            continue
+        if posted and (newest is None or posted > newest):
+            newest = posted
+    return newest
+
+
+# Scrapes one (query, country) page by page, storing each page, until a page holds only known jobs, the results run
+# out, or `pages` is reached. Updates its scrape_state row and returns the run's stats
+def scrape_incremental(query, country="US", pages=50, date_posted="week", client=None, pages_per_request=1,
+                       method="values"):
+
+    client = client or JSearchClient()
+    state = load_scrape_state(query, country)
+    newest = state["newest_posted"] if state else None
+    window = date_posted_since(newest, date_posted)
+
+    stats = {"query": query, "country": country, "date_posted": window, "pages": 0, "fetched": 0, "inserted": 0,
+             "duplicates": 0, "parse_errors": 0, "stopped_at": None}
+    duplicate_pages = []
+
+    for page, num_pages in page_ranges(pages, pages_per_request):
+        jobs = client.search(query, country, page, num_pages, window)
+        stats["pages"] += num_pages
+        if not jobs:    # past the last page of results
+            break
+
+        result = store_jobs(jobs, method=method)
+        stats["fetched"] += len(jobs)
+        stats["inserted"] += result["inserted"]
+        stats["duplicates"] += result["duplicates"]
+        stats["parse_errors"] += len(result["errors"])
+        newest = newest_posting(jobs, newest)
+
+        if result["inserted"] == 0 and result["duplicates"] > 0:
+            duplicate_pages.append(page)
+            stats["stopped_at"] = page
+            break
+
+    save_scrape_state(query, country, newest, duplicate_pages, stats)
+    return stats
+
+
+# Runs scrape_incremental for every (role, location) concurrently. Returns {"totals", "runs", "failed"}
+def scrape_all_incremental(roles, locations=("US",), pages=50, date_posted="week", client=None, max_workers=None,
+                           method="values"):
+
+    client = client or JSearchClient()
+    pairs = [(role, location) for role in roles for location in locations]
+    totals = {"pages": 0, "fetched": 0, "inserted": 0, "duplicates": 0, "parse_errors": 0, "stopped_early": 0}
+    runs = []
+    failed = []
+
+    def scrape(pair):
+        return scrape_incremental(pair[0], pair[1], pages, date_posted, client, method=method)
+
+    workers = {"max_workers": min(max_workers or len(pairs), len(pairs))} if pairs else {}
+    for (role, location), stats, error in stream_results(scrape, pairs, **workers):
+        if error:
+            print(f"Error while scraping {role} ({location}): {error}")
+            failed.append({"query": role, "country": location, "error": str(error)})
+            continue
+        runs.append(stats)
+        for key in ("pages", "fetched", "inserted", "duplicates", "parse_errors"):
+            totals[key] += stats[key]
+        totals["stopped_early"] += stats["stopped_at"] is not None
+
+    return {"totals": totals, "runs": runs, "failed": failed}
+
 
 # Main
 def main():
     # roles = ['Machine Learning engineer', 'Front-end developer', 'Back-end developer']
     
     roles = ['Machine Learning engineer', 'Software engineer']
-    all_jobs = []
-
-    for role in roles:
-        try:
-            jobs = fetch_jobs(query=role, location="CA", pages=50, date_posted="week")
-            all_jobs.extend(jobs)
-        except Exception as e:
-            print(f"Error while fetching job for {role}: {e}")
-    
-    store_jobs(all_jobs)
+    client = JSearchClient()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "full":
+        # Every page of every role, fetched concurrently and stored in batches as they arrive
+        stats = scrape_and_store(roles, locations=["CA"], pages=50, date_posted="week", client=client)
+        print(f"Fetched {stats['fetched']} jobs in {client.stats['requests']} requests ({client.stats['retries']} retries), "
+              f"stored {stats['inserted']} new jobs ({stats['duplicates']} duplicates)")
+    else:
+        # Stops paging each role once a page holds only jobs already stored
+        result = scrape_all_incremental(roles, locations=["CA"], pages=50, date_posted="week", client=client)
+        for run in result["runs"]:
+            stop = f"stopped at page {run['stopped_at']}" if run["stopped_at"] else "no duplicate page"
+            print(f"-----{run['query']} ({run['country']}, {run['date_posted']}): {run['pages']} pages, "
+                  f"{run['inserted']} new, {run['duplicates']} duplicates, {stop}")
+        totals = result["totals"]
+        print(f"Fetched {totals['pages']} pages in {client.stats['requests']} requests ({client.stats['retries']} retries), "
+              f"stored {totals['inserted']} new jobs ({totals['duplicates']} duplicates)")
+    client.close()
     
     
-    jobs = job_counts(HOST, PORT, DBNAME, USER, PASSWORD)
+    jobs = job_counts()
     print(f"Total jobs in the database: {jobs['total_jobs']}")
     print(f"Jobs per query: ")
     for role, count in jobs['counts_by_query']:
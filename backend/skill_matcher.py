@@ -0,0 +1,136 @@
+# Dictionary-based skill extraction
+# is_valid_skill only keeps skills in SKILLS_DIC, so the NER model's output is restricted to a known vocabulary anyway.
+# SkillMatcher compiles SKILLS_DIC and ALIASES into a character trie and scans a description once, trying matches only
+# where a word starts, so a job costs time linear in its length (times the longest skill name) and needs no model.
+#
+# Matching rules:
+#   - leftmost-longest: "ASP.NET" wins over ".NET", "C++" over "C", "Apache Spark" over "Apache"
+#   - a match must end at a boundary: the next character is not a letter/digit or one of "+#" ("C" never matches
+#     inside "C++", "Go" never inside "Google")
+#   - names of up to 2 characters and SPECIAL_UPPER names ("C", "R", "Go", "AWS") match case-sensitively, so plain
+#     words like "go" or "r" don't count; everything else matches case-insensitively
+#   - COMMON_WORD_SKILLS ("Make", "Lean", "Swift", ...) match case-sensitively and never as the first word of a
+#     sentence or line, where capitalization says nothing ("Make sure ...", "- Lean team")
+
+from backend.data.skills_dic import SPECIAL_UPPER, ALIASES, SKILLS_DIC, COMMON_WORD_SKILLS
+from backend.extract_skills import normalize_skill, is_valid_skill, sort_skills
+
+DICTIONARY_CONFIDENCE = 1.0    # confidence stored for dictionary matches
+BOUNDARY_SUFFIX = "+#"         # characters that continue a skill name ("C" + "++"), so they can't follow a match
+COMMON_WORDS = {word.lower(): word for word in COMMON_WORD_SKILLS}
+SENTENCE_END = ".!?;\n•*-"     # characters after which the next word starts a sentence, line or bullet
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+# True if the word at text[i] is the first of a sentence, line or bullet item
+def starts_sentence(text, i):
+    i -= 1
+    while i >= 0 and text[i] in " \t\r":
+        i -= 1
+    return i < 0 or text[i] in SENTENCE_END
+
+
+# Skill name a surface form maps to, or None if it doesn't resolve to a valid skill
+def canonical_skill(surface):
+    skill = normalize_skill(surface)
+    return skill if is_valid_skill(skill) else None
+
+
+class SkillMatcher:
+
+    def __init__(self, skills=SKILLS_DIC, aliases=ALIASES):
+        self._root = {}
+        self.patterns = 0
+        for surface in set(skills) | set(aliases):
+            skill = canonical_skill(surface)
+            if skill:
+                self.add(surface, skill)
+
+
+    # Adds a surface form. The trie is keyed on the lowercased form; each terminal keeps
+    # (surface, skill, case_sensitive, common_word)
+    def add(self, surface, skill):
+        surface = " ".join(surface.split())
+        common_word = surface.lower() in COMMON_WORDS
+        if common_word:
+            surface = COMMON_WORDS[surface.lower()]   # the capitalization it must appear with
+        case_sensitive = len(surface) <= 2 or surface.upper() in SPECIAL_UPPER or common_word
+        node = self._root
+        for ch in surface.lower():
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append((surface, skill, case_sensitive, common_word))
+        self.patterns += 1
+
+
+    # Returns [(skill, start, end)] for every non-overlapping match in text, left to right
+    def find(self, text):
+
+        text = text or ""
+        lowered = text.lower()
+        if len(lowered) != len(text):    # a few characters lowercase to two; fall back to per-character lowering
+            lowered = "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+        matches = []
+        n = len(text)
+        i = 0
+        while i < n:
+            if i > 0 and is_word_char(text[i - 1]) and is_word_char(text[i]):   # not the start of a word
+                i += 1
+                continue
+
+            node = self._root
+            best = None
+            j = i
+            while j < n:
+                node = node.get(lowered[j])
+                if node is None:
+                    break
+                j += 1
+                terminals = node.get(None)
+                if terminals and (j == n or not (is_word_char(text[j]) or text[j] in BOUNDARY_SUFFIX)):
+                    for surface, skill, case_sensitive, common_word in terminals:
+                        if case_sensitive and text[i:j] != surface:
+                            continue
+                        if common_word and starts_sentence(text, i):
+                            continue
+                        best = (skill, i, j)
+                        break
+
+            if best:
+                matches.append(best)
+                i = best[2]
+            else:
+                i += 1
+
+        return matches
+
+
+    # [(skill, confidence)] for a description, in the same shape as extract_skills
+    def extract(self, text):
+        return sort_skills([(skill, DICTIONARY_CONFIDENCE) for skill, _, _ in self.find(text)])
+
+
+_matcher = None
+
+
+# Process-wide matcher, compiled on first use
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = SkillMatcher()
+    return _matcher
+
+
+# Dictionary counterpart of extract_skills_batch: {job_id: [(skill, confidence)]} for a list of (job_id, text)
+def extract_skills_dictionary(jobs, matcher=None):
+    matcher = matcher or get_matcher()
+    return {job_id: matcher.extract(text) for job_id, text in jobs}
+
+
+# Union of NER and dictionary skills per job. A skill found by both keeps the higher confidence
+def merge_skill_sets(ner_skills, dictionary_skills):
+    return {job_id: sort_skills(ner_skills.get(job_id, []) + dictionary_skills.get(job_id, []))
+            for job_id in ner_skills.keys() | dictionary_skills.keys()}
@@ -0,0 +1,101 @@
+# Data version tracking
+# Ingest functions bump a per-table version in the same transaction as their writes.
+# The API compares versions to know when cached results are stale (ingest runs in other processes, so the counter lives in Postgres)
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from backend.db import connection, async_connection, fetch_rows
+
+load_dotenv()
+
+TRACKED_TABLES = ("job_listings", "job_skills", "salaries")
+VERSION_REFRESH_SECONDS = float(os.getenv("DATA_VERSION_REFRESH_SECONDS", "5"))   # how stale the API's view of the versions may be
+
+
+# Creates the data_versions table, one row per tracked table
+def create_versions_table(conn=None):
+
+    with connection(conn) as conn, conn.cursor() as c:
+
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+
+        conn.commit()
+
+
+# Bumps the version of the given tables. Takes a cursor so it commits together with the ingest writes
+def bump_version(c, *tables):
+    for table in tables:
+        c.execute("""
+            INSERT INTO data_versions (table_name, version, updated_at)
+            VALUES (%s, 1, now())
+            ON CONFLICT (table_name) DO UPDATE
+                SET version = data_versions.version + 1,
+                updated_at = now();
+        """, (table,))
+
+
+VERSIONS_SQL = "SELECT table_name, version, updated_at FROM data_versions"
+
+
+# Returns {table_name: (version, updated_at)}
+def fetch_versions(conn=None):
+    with connection(conn) as conn, conn.cursor() as c:
+        c.execute(VERSIONS_SQL)
+        return {table: (version, updated_at) for table, version, updated_at in c.fetchall()}
+
+
+async def fetch_versions_async(aconn):
+    rows = await fetch_rows(aconn, VERSIONS_SQL)
+    return {table: (version, updated_at) for table, version, updated_at in rows}
+
+
+# Keeps the API's copy of data_versions, re-reading it at most once every refresh_interval seconds
+class VersionTracker:
+
+    def __init__(self, refresh_interval=VERSION_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+
+    async def current(self):
+        if self._fresh():
+            return self._versions
+        async with self._lock:
+            if not self._fresh():   # another request may have refreshed while we waited
+                try:
+                    async with async_connection() as aconn:
+                        self._versions = await fetch_versions_async(aconn)
+                except Exception as e:
+                    print(f"Error reading data versions: {e}")   # keep serving the last known versions
+                self._loaded_at = time.monotonic()
+        return self._versions
+
+
+    def _fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval
+
+
+    # Versions of the given tables, used as part of cache keys
+    async def version_of(self, tables):
+        versions = await self.current()
+        return tuple(versions.get(table, (0, None))[0] for table in tables)
+
+
+    # Latest write time across the given tables (None if none of them has been written yet)
+    async def last_modified(self, tables):
+        versions = await self.current()
+        stamps = [versions[table][1] for table in tables if table in versions]
+        return max(stamps) if stamps else None
+
+
+version_tracker = VersionTracker()
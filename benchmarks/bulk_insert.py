@@ -0,0 +1,92 @@
+# Compares job ingestion throughput: the old per-row INSERT loop vs the bulk store_jobs paths (execute_values, COPY)
+# Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.bulk_insert [sizes...]      (default 1000 10000 100000)
+
+import random
+import string
+import sys
+import time
+import psycopg2
+from backend.db import HOST, PORT, DBNAME, USER, PASSWORD
+from backend.scraper import store_jobs, parse_job, init_database
+
+SCHEMA = "bench_ingest"
+ROLES = ["Machine Learning engineer", "Software engineer", "Data engineer"]
+
+
+def synthetic_jobs(n, seed=0):
+    rng = random.Random(seed)
+    words = ["python", "docker", "kubernetes", "react", "sql", "aws", "team", "build", "models", "data"]
+    jobs = []
+    for i in range(n):
+        jobs.append({
+            "job_title": f"Engineer {i}",
+            "employer_name": f"Company {rng.randint(1, 500)}",
+            "job_city": rng.choice(["Toronto", "Seattle", "Austin", "Montreal"]),
+            "job_state": rng.choice(["Ontario", "Washington", "Texas", "Quebec"]),
+            "job_country": rng.choice(["US", "CA"]),
+            "job_is_remote": rng.random() < 0.3,
+            "job_employment_type": "FULLTIME",
+            "job_posted_at_datetime_utc": f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T12:00:00.000Z",
+            "job_description": " ".join(rng.choice(words) for _ in range(300)) + "".join(rng.choices(string.ascii_letters, k=8)),
+            "job_highlights": {"Qualifications": ["Python", "SQL"]},
+            "job_apply_link": f"https://example.com/{i}",
+            "search_query": rng.choice(ROLES),
+        })
+    return jobs
+
+
+# The pre-bulk ingestion path: one INSERT round trip per job
+def store_jobs_rowwise(jobs, conn):
+    inserted = 0
+    with conn.cursor() as c:
+        for job in jobs:
+            c.execute("""
+                INSERT INTO job_listings (id, job_title, date_posted, job_is_remote, employer_name, job_employment_type, job_city, job_country, job_state, job_description, qualifications, apply_link, search_query)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (id) DO NOTHING;
+            """, parse_job(job))
+            inserted += c.rowcount
+    conn.commit()
+    return inserted
+
+
+def reset(conn):
+    with conn.cursor() as c:
+        c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        c.execute(f"CREATE SCHEMA {SCHEMA}")
+        c.execute(f"SET search_path TO {SCHEMA}")
+    conn.commit()
+    init_database(conn)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    conn = psycopg2.connect(host=HOST, port=PORT, dbname=DBNAME, user=USER, password=PASSWORD)
+
+    methods = {
+        "row-by-row": lambda jobs: store_jobs_rowwise(jobs, conn),
+        "execute_values": lambda jobs: store_jobs(jobs, conn, method="values")["inserted"],
+        "copy": lambda jobs: store_jobs(jobs, conn, method="copy")["inserted"],
+    }
+
+    print(f"{'jobs':>8} {'method':<15} {'seconds':>8} {'jobs/sec':>10} {'inserted':>9}")
+    try:
+        for n in sizes:
+            jobs = synthetic_jobs(n)
+            for name, run in methods.items():
+                reset(conn)
+                start = time.perf_counter()
+                inserted = run(jobs)
+                elapsed = time.perf_counter() - start
+                print(f"{n:>8} {name:<15} {elapsed:>8.2f} {n / elapsed:>10.0f} {inserted:>9}")
+    finally:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
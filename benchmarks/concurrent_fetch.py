@@ -0,0 +1,42 @@
+# Compares sequential vs concurrent fetching against the local JSearch stub (no API key or network needed)
+# Every 7th request fails with a 429 to exercise the retry path
+#
+# Usage: python -m benchmarks.concurrent_fetch
+
+import time
+from backend.fetcher import JSearchClient, fetch_all
+from benchmarks.stub_jsearch import start_stub
+
+ROLES = ["Machine Learning engineer", "Software engineer", "Data engineer"]
+LOCATIONS = ["US", "CA"]
+PAGES = 20
+
+
+def run(base_url, max_workers, rate):
+    client = JSearchClient(base_url=base_url, rate=rate, backoff_base=0.05, pool_size=max_workers,
+                           archive=False)
+    start = time.perf_counter()
+    jobs = 0
+    errors = 0
+    for task, page_jobs, error in fetch_all(client, ROLES, LOCATIONS, pages=PAGES, pages_per_request=2,
+                                            max_workers=max_workers):
+        jobs += len(page_jobs)
+        errors += error is not None
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed, jobs, errors, client.stats
+
+
+def main():
+    server, base_url = start_stub(latency=0.2, fail_every=7)
+    try:
+        print(f"{'workers':>7} {'rps limit':>9} {'seconds':>8} {'jobs':>6} {'errors':>6} {'requests':>8} {'retries':>7}")
+        for workers, rate in [(1, 100), (4, 100), (8, 100), (16, 100), (16, 10)]:
+            elapsed, jobs, errors, stats = run(base_url, workers, rate)
+            print(f"{workers:>7} {rate:>9} {elapsed:>8.2f} {jobs:>6} {errors:>6} {stats['requests']:>8} {stats['retries']:>7}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
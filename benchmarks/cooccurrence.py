@@ -0,0 +1,170 @@
+# Skill co-occurrence: full load of job_skills into the sparse matrices, an incremental refresh after a process_jobs
+# style batch (new jobs through store_job_skills), and the latency of a related-skills lookup from memory vs the same
+# top k computed per request with a job_skills self-join in SQL. Also checks that the incremental matrices match a
+# fresh rebuild.
+# Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.cooccurrence [jobs] [new jobs]      (default 100000 jobs, 1000 new)
+
+import os
+import sys
+import time
+
+SCHEMA = "bench_cooccurrence"
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"   # every pooled connection lands in the throwaway schema
+
+import random
+import numpy as np
+import backend.scraper as scraper
+from backend.db import connection, close_pool
+from backend.extract_skills import DB_migration
+from backend.process_skills import store_job_skills
+from backend.cooccurrence import SkillCooccurrence, MIN_COUNT
+
+SKILLS_PER_JOB = 10
+QUERIES = 8
+VOCABULARY = 2000
+LOOKUPS = 1000
+
+
+def setup(jobs):
+    with connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            c.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+        scraper._schema_ready = False
+        scraper.init_database(conn)
+        DB_migration(conn)
+        with conn.cursor() as c:
+            c.execute("""
+                INSERT INTO job_listings (id, job_country, date_posted, search_query)
+                SELECT 'job-' || i, 'US', DATE '2025-01-01' + (i %% 365), 'query-' || (i %% %s)
+                FROM generate_series(1, %s) i
+            """, (QUERIES, jobs))
+            # Skills follow a skewed distribution, like real postings: a few very common, a long tail of rare ones
+            c.execute("""
+                INSERT INTO job_skills (job_id, skill, confidence, search_query, source_model)
+                SELECT DISTINCT ON (j, skill) 'job-' || j, skill, 0.9, 'query-' || (j %% %s), 'bench'
+                FROM (
+                    SELECT j, 'skill-' || floor(%s * power(random(), 3))::int AS skill
+                    FROM generate_series(1, %s) j, generate_series(1, %s) k
+                ) s
+            """, (QUERIES, VOCABULARY, jobs, SKILLS_PER_JOB))
+            c.execute("CREATE INDEX ON job_skills (updated_at)")
+            c.execute("ANALYZE job_skills")
+        conn.commit()
+
+
+# A process_jobs batch: new listings and their skills written the way process_jobs writes them
+def add_jobs(first, count):
+    ids = [f"job-{i}" for i in range(first, first + count)]
+    skills = {job_id: [(f"skill-{int(VOCABULARY * random.random() ** 3)}", 0.9) for _ in range(SKILLS_PER_JOB)]
+              for job_id in ids}
+    skills = {job_id: list(dict(pairs).items()) for job_id, pairs in skills.items()}
+    queries = {job_id: f"query-{i % QUERIES}" for i, job_id in zip(range(first, first + count), ids)}
+    with connection() as conn, conn.cursor() as c:
+        c.execute("""
+            INSERT INTO job_listings (id, job_country, date_posted, search_query)
+            SELECT unnest(%s::text[]), 'US', CURRENT_DATE, unnest(%s::text[])
+        """, (ids, [queries[job_id] for job_id in ids]))
+        store_job_skills(c, skills, queries, model="bench")
+        conn.commit()
+
+
+# The per-request alternative: self-join job_skills on job_id for one skill
+def sql_related(c, skill, search_query, top_k):
+    c.execute("""
+        WITH scope AS (
+            SELECT job_id, skill FROM job_skills WHERE search_query = %(query)s
+        ),
+        totals AS (
+            SELECT skill, COUNT(*) AS jobs FROM scope GROUP BY skill
+        ),
+        pairs AS (
+            SELECT b.skill, COUNT(*) AS together
+            FROM scope a JOIN scope b ON a.job_id = b.job_id AND b.skill != a.skill
+            WHERE a.skill = %(skill)s
+            GROUP BY b.skill
+            HAVING COUNT(*) >= %(min_count)s
+        )
+        SELECT p.skill, p.together,
+               p.together::float * (SELECT COUNT(DISTINCT job_id) FROM scope)
+                   / ((SELECT jobs FROM totals WHERE skill = %(skill)s) * t.jobs) AS lift
+        FROM pairs p JOIN totals t USING (skill)
+        ORDER BY lift DESC, p.together DESC
+        LIMIT %(top_k)s
+    """, {"query": search_query, "skill": skill, "min_count": MIN_COUNT, "top_k": top_k})
+    return c.fetchall()
+
+
+# {(search_query, skill, skill): count}, comparable across snapshots that interned names in a different order
+def named_pairs(snapshot):
+    queries = {i: query for query, i in snapshot.query_ids.items()}
+    pairs = {}
+    for scope, matrix in snapshot.matrices.items():
+        matrix = matrix.tocoo()
+        for a, b, count in zip(matrix.row, matrix.col, matrix.data):
+            pairs[(queries.get(scope), snapshot.skills[a], snapshot.skills[b])] = int(count)
+    return pairs
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    new_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    random.seed(0)
+
+    try:
+        setup(jobs)
+        index = SkillCooccurrence(overlap=0)   # every setup row is recent, so the default overlap would re-read them all
+
+        start = time.perf_counter()
+        index.refresh()
+        stats = index.stats()
+        print(f"full load: {stats['jobs']} jobs, {stats['skills']} skills, {stats['pairs']} pairs "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        add_jobs(jobs + 1, new_jobs)
+        start = time.perf_counter()
+        reread = index.refresh()
+        print(f"incremental refresh: {new_jobs} new jobs ({reread} re-read) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        fresh = SkillCooccurrence()
+        fresh.refresh()
+        same = named_pairs(index.snapshot) == named_pairs(fresh.snapshot)
+        print(f"incremental == rebuild: {same}")
+
+        snapshot = index.snapshot
+        lookups = [(f"skill-{int(VOCABULARY * random.random() ** 3)}", f"query-{random.randrange(QUERIES)}")
+                   for _ in range(LOOKUPS)]
+        timings = []
+        for skill, search_query in lookups:
+            start = time.perf_counter()
+            snapshot.related(skill, search_query, 10)
+            timings.append(time.perf_counter() - start)
+        p50, p99 = percentiles(timings)
+        print(f"{'in-memory related':<20} p50 {p50:>8.3f} ms  p99 {p99:>8.3f} ms  ({LOOKUPS} lookups)")
+
+        timings = []
+        with connection() as conn, conn.cursor() as c:
+            for skill, search_query in lookups[:50]:
+                start = time.perf_counter()
+                sql_related(c, skill, search_query, 10)
+                timings.append(time.perf_counter() - start)
+        p50, p99 = percentiles(timings)
+        print(f"{'sql self-join':<20} p50 {p50:>8.3f} ms  p99 {p99:>8.3f} ms  (50 lookups)")
+    finally:
+        with connection() as conn:
+            with conn.cursor() as c:
+                c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Dictionary matcher vs NER model: jobs/sec of each, and how far their skill sets agree. Precision/recall treat the
+# NER output as the reference; the skills each side finds most often on its own are listed to show where they differ
+#
+# Usage: python -m benchmarks.dictionary_extractor [jobs]          (default 200 synthetic jobs)
+#        python -m benchmarks.dictionary_extractor 200 --db        sample real descriptions from job_listings instead
+#        python -m benchmarks.dictionary_extractor 5000 --no-ner   dictionary throughput only
+
+import sys
+import time
+from collections import Counter
+from backend.skill_matcher import SkillMatcher, extract_skills_dictionary
+from benchmarks.ner_batching import synthetic_texts
+from benchmarks.ner_backends import db_texts, run_backend, agreement
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    n = int(args[0]) if args else 200
+    texts = db_texts(n) if "--db" in sys.argv else synthetic_texts(n)
+    n = len(texts)
+
+    start = time.perf_counter()
+    matcher = SkillMatcher()
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dictionary = extract_skills_dictionary(texts, matcher)
+    elapsed = time.perf_counter() - start
+    print(f"dictionary: {matcher.patterns} patterns compiled in {compile_time * 1000:.1f} ms, "
+          f"{n} jobs in {elapsed:.3f}s ({n / elapsed:.0f} jobs/sec)")
+
+    if "--no-ner" in sys.argv:
+        return
+
+    ner_time, ner = run_backend("torch", texts)
+    print(f"ner:        {n} jobs in {ner_time:.2f}s ({n / ner_time:.1f} jobs/sec), dictionary is {ner_time / elapsed:.0f}x faster")
+
+    found = {job_id: {skill for skill, _ in skills} for job_id, skills in dictionary.items()}
+    score = agreement(ner, found)
+    print(f"agreement:  precision {score['precision']:.3f}, recall {score['recall']:.3f}, same skills {score['same']}/{n}")
+
+    ner_only = Counter(skill for job_id in ner for skill in ner[job_id] - found[job_id])
+    dictionary_only = Counter(skill for job_id in ner for skill in found[job_id] - ner[job_id])
+    print(f"NER only:        {', '.join(f'{skill} ({count})' for skill, count in ner_only.most_common(15)) or '-'}")
+    print(f"dictionary only: {', '.join(f'{skill} ({count})' for skill, count in dictionary_only.most_common(15)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Runs several local queue workers against the same extraction_queue and checks that they split the work: every job
+# ends up done, none was leased twice, and throughput grows with the worker count. Uses the dictionary extractor so the
+# queue itself, not the model, is what's measured (pass --extractor ner to include the model).
+# Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.extraction_queue [jobs] [workers...] [--extractor E]     (default 5000 jobs, workers 1 2 4)
+
+import multiprocessing
+import os
+import sys
+import time
+
+SCHEMA = "bench_queue"
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"   # every pooled connection (and every worker's) lands in the throwaway schema
+
+import backend.scraper as scraper
+from backend.db import connection, close_pool
+from backend.extraction_queue import run_worker, queue_stats
+from benchmarks.bulk_insert import synthetic_jobs
+
+
+def reset(create=True):
+    with connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            if create:
+                c.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+    scraper._schema_ready = False
+
+
+def _worker(extractor):
+    return run_worker(extractor=extractor)
+
+
+def main():
+    extractor = "dictionary"
+    args = sys.argv[1:]
+    if "--extractor" in args:
+        i = args.index("--extractor")
+        extractor = args[i + 1]
+        del args[i:i + 2]
+    n = int(args[0]) if args else 5000
+    worker_counts = [int(arg) for arg in args[1:]] or [1, 2, 4]
+    jobs = synthetic_jobs(n)
+
+    print(f"{n} jobs, {extractor} extractor")
+    print(f"{'workers':>7} {'seconds':>8} {'jobs/sec':>9} {'done':>6} {'leased twice':>13} {'per worker':>20}")
+
+    try:
+        for workers in worker_counts:
+            reset()
+            scraper.store_jobs(jobs, method="copy")   # enqueues every job
+
+            context = multiprocessing.get_context("spawn")
+            start = time.perf_counter()
+            with context.Pool(workers) as pool:
+                results = pool.map(_worker, [extractor] * workers)
+            elapsed = time.perf_counter() - start
+
+            with connection() as conn, conn.cursor() as c:
+                c.execute("SELECT COUNT(*) FROM extraction_queue WHERE attempts > 1")
+                leased_twice = c.fetchone()[0]
+            done = queue_stats().get("done", {}).get("jobs", 0)
+            split = "/".join(str(stats["done"]) for stats in results)
+            print(f"{workers:>7} {elapsed:>8.2f} {done / elapsed:>9.1f} {done:>6} {leased_twice:>13} {split:>20}")
+    finally:
+        reset(create=False)
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
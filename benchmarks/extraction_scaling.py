@@ -0,0 +1,35 @@
+# Scaling of multi-process skill extraction on CPU: 1/2/4/8 worker processes over the same synthetic jobs, each worker
+# capped at cpu_count // workers torch threads. Times include each worker loading the model once
+#
+# Usage: python -m benchmarks.extraction_scaling [jobs] [workers...]      (default 400 jobs, workers 1 2 4 8)
+
+import os
+import sys
+import time
+from backend.extract_skills import extract_skills_parallel, BATCH_SIZE
+from benchmarks.ner_batching import synthetic_texts
+
+JOBS_PER_GROUP = 25
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    worker_counts = [int(arg) for arg in sys.argv[2:]] or [1, 2, 4, 8]
+    texts = synthetic_texts(n)
+    groups = [texts[start:start + JOBS_PER_GROUP] for start in range(0, n, JOBS_PER_GROUP)]
+
+    print(f"{os.cpu_count()} CPUs, {n} jobs, groups of {JOBS_PER_GROUP}, batch size {BATCH_SIZE}")
+    print(f"{'workers':>7} {'threads':>7} {'seconds':>8} {'jobs/sec':>9} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        start = time.perf_counter()
+        done = sum(len(skills) for skills in extract_skills_parallel(groups, workers, threads))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{workers:>7} {threads:>7} {elapsed:>8.2f} {done / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
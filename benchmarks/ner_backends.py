@@ -0,0 +1,70 @@
+# Accuracy vs speed of the NER inference backends on CPU. Every backend extracts skills from the same fixed sample of
+# descriptions, and its skill sets are compared with the fp32 torch model's: precision/recall of the skills it returns,
+# and how many jobs get exactly the same set
+#
+# Usage: python -m benchmarks.ner_backends [jobs] [backend...]      (default 200 jobs, backends quantized onnx)
+#        python -m benchmarks.ner_backends 200 --db                  sample real descriptions from job_listings instead
+
+import sys
+import time
+from backend.db import connection
+from backend.extract_skills import build_pipeline, extract_skills_batch
+from benchmarks.ner_batching import synthetic_texts
+
+
+# First n descriptions by id, so reruns see the same sample
+def db_texts(n):
+    with connection() as conn, conn.cursor() as c:
+        c.execute("""
+            SELECT id, job_description, qualifications
+            FROM job_listings
+            ORDER BY id
+            LIMIT %s
+        """, (n,))
+        return [(job_id, " ".join(filter(None, [desc, qualifications]))) for job_id, desc, qualifications in c.fetchall()]
+
+
+# Runs one backend over texts. Returns (seconds, {job_id: set of skills}); model loading is not timed
+def run_backend(backend, texts):
+    NLP = build_pipeline(backend)
+    extract_skills_batch(NLP, texts[:1])   # warm-up
+    start = time.perf_counter()
+    skills = extract_skills_batch(NLP, texts)
+    elapsed = time.perf_counter() - start
+    return elapsed, {job_id: {skill for skill, _ in job_skills} for job_id, job_skills in skills.items()}
+
+
+# Micro-averaged precision/recall of candidate skill sets against the reference, plus jobs with identical sets
+def agreement(reference, candidate):
+    true_positives = sum(len(reference[job_id] & candidate[job_id]) for job_id in reference)
+    returned = sum(len(skills) for skills in candidate.values())
+    expected = sum(len(skills) for skills in reference.values())
+    return {
+        "precision": true_positives / returned if returned else 1.0,
+        "recall": true_positives / expected if expected else 1.0,
+        "same": sum(reference[job_id] == candidate[job_id] for job_id in reference),
+    }
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--db"]
+    n = int(args[0]) if args else 200
+    backends = args[1:] or ["quantized", "onnx"]
+    texts = db_texts(n) if "--db" in sys.argv else synthetic_texts(n)
+    n = len(texts)
+
+    print(f"{'backend':<10} {'seconds':>8} {'jobs/sec':>9} {'speedup':>8} {'precision':>10} {'recall':>7} {'same skills':>12}")
+
+    baseline_time, reference = run_backend("torch", texts)
+    print(f"{'torch':<10} {baseline_time:>8.2f} {n / baseline_time:>9.1f} {'1.00x':>8} {'-':>10} {'-':>7} {'-':>12}")
+
+    for backend in backends:
+        elapsed, skills = run_backend(backend, texts)
+        score = agreement(reference, skills)
+        same = f"{score['same']}/{n}"
+        print(f"{backend:<10} {elapsed:>8.2f} {n / elapsed:>9.1f} {baseline_time / elapsed:>7.2f}x "
+              f"{score['precision']:>10.3f} {score['recall']:>7.3f} {same:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Compares skill extraction throughput on CPU: one pipeline call per chunk (extract_skills per job) vs chunks pooled
+# across jobs and run in length-sorted batches (extract_skills_batch). Also checks both return the same skills
+#
+# Usage: python -m benchmarks.ner_batching [jobs]      (default 200; set USE_GPU=1 to run on GPU instead)
+
+import random
+import sys
+import time
+from backend.data.skills_dic import SKILLS_DIC
+from backend.extract_skills import build_pipeline, extract_skills, extract_skills_batch
+
+FILLER = [
+    "You will work closely with product and design to ship features end to end.",
+    "We value ownership, clear communication and a bias for action.",
+    "Experience mentoring junior engineers is a plus.",
+    "The role is hybrid with two days a week in the office.",
+    "You will design, build and maintain services used by millions of customers.",
+]
+
+
+# Job descriptions of varied length (a few sentences to several chunks), mentioning skills from the dictionary
+def synthetic_texts(n, seed=0):
+    rng = random.Random(seed)
+    skills = sorted(SKILLS_DIC)
+    texts = []
+    for i in range(n):
+        sentences = []
+        for _ in range(rng.randint(3, 40)):
+            if rng.random() < 0.4:
+                sentences.append(f"Experience with {', '.join(rng.sample(skills, 3))} is required.")
+            else:
+                sentences.append(rng.choice(FILLER))
+        texts.append((f"job-{i}", " ".join(sentences)))
+    return texts
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    texts = synthetic_texts(n)
+    NLP = build_pipeline()
+    extract_skills(NLP, texts[0][1])   # warm-up
+
+    print(f"{'method':<22} {'seconds':>8} {'jobs/sec':>9} {'same skills':>12}")
+
+    start = time.perf_counter()
+    baseline = {job_id: extract_skills(NLP, text) for job_id, text in texts}
+    elapsed = time.perf_counter() - start
+    print(f"{'per job':<22} {elapsed:>8.2f} {n / elapsed:>9.1f} {'-':>12}")
+
+    for batch_size in (1, 8, 16, 32, 64):
+        start = time.perf_counter()
+        batched = extract_skills_batch(NLP, texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        same = sum({s for s, _ in batched[job_id]} == {s for s, _ in baseline[job_id]} for job_id, _ in texts)
+        print(f"{f'batched (size {batch_size})':<22} {elapsed:>8.2f} {n / elapsed:>9.1f} {f'{same}/{n}':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Measures cold-start import time and memory of the API process
+# Each module is imported in a fresh interpreter so nothing is already cached in sys.modules
+#
+# Usage: python -m benchmarks.startup_profile [module ...]
+# Default compares the API (backend.main) with the extraction pipeline (backend.process_skills + build_pipeline deps)
+
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("transformers", "torch")
+
+# Runs inside the child interpreter: import the target module, report wall time, peak RSS and which heavy modules got loaded
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+__import__({module!r})
+{extra}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": rss_kb / 1024,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def profile(module, extra="", runs=3):
+    results = []
+    for _ in range(runs):
+        code = PROBE.format(module=module, extra=extra, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{out.stderr}")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    best = min(results, key=lambda r: r["seconds"])   # best of N hides disk cache noise
+    return best
+
+
+def main():
+    targets = [(module, "") for module in sys.argv[1:]] or [
+        ("backend.main", ""),
+        # What the API used to pay: the extraction module plus the transformers stack it pulled in at import time
+        ("backend.process_skills", "import transformers"),
+    ]
+
+    print(f"{'module':<30} {'import (s)':>10} {'max RSS (MB)':>13}  heavy modules loaded")
+    for module, extra in targets:
+        r = profile(module, extra)
+        label = module + (" + transformers" if extra else "")
+        print(f"{label:<30} {r['seconds']:>10.2f} {r['max_rss_mb']:>13.1f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    api = profile("backend.main")
+    if api["heavy_modules"]:
+        print(f"FAIL: backend.main imports {api['heavy_modules']}")
+        sys.exit(1)
+    print("OK: backend.main does not import transformers/torch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Compares peak memory of collecting every fetched job before storing vs the streaming scrape_and_store pipeline,
+# against the local JSearch stub. Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.streaming_ingest [pages]      (default 200 pages per role)
+
+import os
+import sys
+import time
+import tracemalloc
+
+SCHEMA = "bench_streaming"
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"   # every pooled connection lands in the throwaway schema
+
+import backend.scraper as scraper
+from backend.db import connection, close_pool
+from backend.fetcher import JSearchClient, fetch_all
+from backend.scraper import store_jobs, scrape_and_store
+from benchmarks.stub_jsearch import start_stub
+
+ROLES = ["Machine Learning engineer", "Software engineer", "Data engineer"]
+
+
+def reset(create=True):
+    with connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            if create:
+                c.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+    scraper._schema_ready = False   # store_jobs recreates the tables in the fresh schema
+
+
+# The old main(): every page is held in memory until the whole scrape finishes
+def collect_then_store(client, pages):
+    all_jobs = []
+    for task, jobs, error in fetch_all(client, ROLES, ["US"], pages=pages):
+        all_jobs.extend(jobs)
+    return store_jobs(all_jobs)["inserted"]
+
+
+def streaming(client, pages):
+    return scrape_and_store(ROLES, ["US"], pages=pages, client=client, batch_size=500)["inserted"]
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server, base_url = start_stub(latency=0.05)
+
+    try:
+        print(f"{'method':<20} {'seconds':>8} {'peak MB':>8} {'inserted':>9}")
+        for name, run in [("collect then store", collect_then_store), ("streaming", streaming)]:
+            reset()
+            client = JSearchClient(base_url=base_url, rate=1000, archive=False)
+            tracemalloc.start()
+            start = time.perf_counter()
+            inserted = run(client, pages)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            client.close()
+            print(f"{name:<20} {elapsed:>8.2f} {peak / 1e6:>8.1f} {inserted:>9}")
+    finally:
+        server.shutdown()
+        reset(create=False)
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Local stand-in for the JSearch API, for exercising the fetcher without paying for API calls
+# Serves /search and /estimated-salary with deterministic synthetic data, an artificial latency, and optional
+# injected failures (every Nth request returns 429 or 503)
+#
+# Usage: python -m benchmarks.stub_jsearch [port]      then set JSEARCH_BASE_URL=http://127.0.0.1:<port>
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+JOBS_PER_PAGE = 10
+
+
+def stub_job(query, country, page, i):
+    return {
+        "job_title": f"{query} #{page}-{i}",
+        "employer_name": f"Employer {(page * 7 + i) % 40}",
+        "job_city": "Toronto" if country == "CA" else "Seattle",
+        "job_state": "Ontario" if country == "CA" else "Washington",
+        "job_country": country,
+        "job_is_remote": i % 3 == 0,
+        "job_employment_type": "FULLTIME",
+        "job_posted_at_datetime_utc": "2025-06-01T12:00:00.000Z",
+        "job_description": f"{query} role on page {page}. Python, SQL, Docker and Kubernetes.",
+        "job_highlights": {"Qualifications": ["Python", "SQL"]},
+        "job_apply_link": f"https://example.com/{country}/{page}/{i}",
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    latency = 0.2          # seconds per request
+    fail_every = 0         # inject a failure on every Nth request (0 = never)
+    fail_status = 429
+    total_pages = 1000     # pages past this return no jobs
+
+    _count = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def do_GET(self):
+        with StubHandler._lock:
+            StubHandler._count += 1
+            count = StubHandler._count
+
+        time.sleep(self.latency)
+
+        if self.fail_every and count % self.fail_every == 0:
+            self._send(self.fail_status, {"message": "injected failure"}, {"Retry-After": "0"})
+            return
+
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/search":
+            query = params.get("query", "")
+            country = params.get("country", "US")
+            page = int(params.get("page", 1))
+            num_pages = int(params.get("num_pages", 1))
+            jobs = [
+                stub_job(query, country, p, i)
+                for p in range(page, min(page + num_pages, self.total_pages + 1))
+                for i in range(JOBS_PER_PAGE)
+            ]
+            self._send(200, {"status": "OK", "data": jobs})
+        elif url.path == "/estimated-salary":
+            self._send(200, {"status": "OK", "data": [{
+                "min_salary": 90000, "min_base_salary": 85000, "median_salary": 120000, "median_base_salary": 110000,
+            }]})
+        else:
+            self._send(404, {"message": "not found"})
+
+
+# Starts the stub on a background thread. Returns (server, base_url); call server.shutdown() when done
+def start_stub(port=0, **settings):
+    handler = type("ConfiguredStubHandler", (StubHandler,), settings)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server, url = start_stub(port)
+    print(f"Stub JSearch API on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
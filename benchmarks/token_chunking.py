@@ -0,0 +1,55 @@
+# Character chunking (chunk_text, 1000 chars) vs tokenizer-aware chunking (chunk_tokens): forward passes per job, how
+# full each pass is, how many character chunks overflow the model limit (and get truncated), extraction time, and
+# whether both find the same skills
+#
+# Usage: python -m benchmarks.token_chunking [jobs]      (default 200)
+
+import sys
+import time
+from backend.extract_skills import build_pipeline, chunk_text, chunk_tokens, chunk_token_budget, extract_skills_batch
+from benchmarks.ner_batching import synthetic_texts
+
+
+# Pipeline wrapper without a tokenizer attribute, so extract_skills_batch falls back to chunk_text
+class CharChunked:
+
+    def __init__(self, NLP):
+        self.NLP = NLP
+
+    def __call__(self, *args, **kwargs):
+        return self.NLP(*args, **kwargs)
+
+
+def token_counts(tokenizer, chunks):
+    return [len(tokenizer(chunk, add_special_tokens=False, verbose=False)["input_ids"]) for chunk in chunks]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    texts = synthetic_texts(n)
+    NLP = build_pipeline()
+    tokenizer = NLP.tokenizer
+    budget = chunk_token_budget(tokenizer)
+
+    char_chunks = [chunk for _, text in texts for chunk in chunk_text(text)]
+    token_chunks = [chunk for _, text in texts for chunk, _, _ in chunk_tokens(text, tokenizer)]
+
+    print(f"token budget {budget} per chunk")
+    print(f"{'chunking':<8} {'chunks':>7} {'per job':>8} {'avg tokens':>11} {'over budget':>12} {'seconds':>8} {'jobs/sec':>9}")
+
+    results = {}
+    for name, chunks, nlp in (("chars", char_chunks, CharChunked(NLP)), ("tokens", token_chunks, NLP)):
+        counts = token_counts(tokenizer, chunks)
+        extract_skills_batch(nlp, texts[:1])   # warm-up
+        start = time.perf_counter()
+        results[name] = extract_skills_batch(nlp, texts)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<8} {len(chunks):>7} {len(chunks) / n:>8.2f} {sum(counts) / len(counts):>11.1f} "
+              f"{sum(count > budget for count in counts):>12} {elapsed:>8.2f} {n / elapsed:>9.1f}")
+
+    same = sum({s for s, _ in results["chars"][job_id]} == {s for s, _ in results["tokens"][job_id]} for job_id, _ in texts)
+    print(f"same skills: {same}/{n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# top_skills_per_query at scale: the old path (every (search_query, skill, freq) row shipped to Python and truncated
+# in a loop) vs the top N ranked in SQL, both over raw job_skills and over agg_skill_counts, plus the filtered path
+# (location + date range joined to job_listings). Reports time and rows transferred.
+# Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.top_skills [job_skills rows] [top_n]      (default 1000000 rows, top 10)
+
+import os
+import sys
+import time
+
+SCHEMA = "bench_top_skills"
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"   # every pooled connection lands in the throwaway schema
+
+import backend.scraper as scraper
+from collections import defaultdict
+from backend.db import connection, close_pool
+from backend.extract_skills import DB_migration
+from backend.aggregates import rebuild_aggregates
+from backend.analysis import top_skills_per_query_query, group_top_skills
+
+SKILLS_PER_JOB = 10
+QUERIES = 8
+VOCABULARY = 2000
+
+
+def setup(rows):
+    jobs = rows // SKILLS_PER_JOB
+    with connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            c.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+        scraper._schema_ready = False
+        scraper.init_database(conn)
+        DB_migration(conn)
+        with conn.cursor() as c:
+            # Skills follow a skewed distribution, like real postings: a few very common, a long tail of rare ones
+            c.execute("""
+                INSERT INTO job_listings (id, job_country, date_posted, search_query)
+                SELECT 'job-' || i, CASE WHEN i %% 3 = 0 THEN 'CA' ELSE 'US' END,
+                       DATE '2025-01-01' + (i %% 365), 'query-' || (i %% %s)
+                FROM generate_series(1, %s) i
+            """, (QUERIES, jobs))
+            c.execute("""
+                INSERT INTO job_skills (job_id, skill, confidence, search_query, source_model)
+                SELECT DISTINCT ON (j, skill) 'job-' || j, skill, 0.9, 'query-' || (j %% %s), 'bench'
+                FROM (
+                    SELECT j, 'skill-' || floor(%s * power(random(), 3))::int AS skill
+                    FROM generate_series(1, %s) j, generate_series(1, %s) k
+                ) s
+            """, (QUERIES, VOCABULARY, jobs, SKILLS_PER_JOB))
+            c.execute("ANALYZE job_listings")
+            c.execute("ANALYZE job_skills")
+        conn.commit()
+        rebuild_aggregates(conn)
+        with conn.cursor() as c:
+            c.execute("SELECT COUNT(*) FROM job_skills")
+            return c.fetchone()[0]
+
+
+# The pre-rewrite implementation
+def python_top_n(c, top_n):
+    c.execute("""
+        SELECT search_query, skill, COUNT(*) as freq
+        FROM job_skills
+        GROUP BY search_query, skill
+        ORDER BY search_query, freq DESC;
+    """)
+    rows = c.fetchall()
+    results = defaultdict(list)
+    for search_query, skill, freq in rows:
+        if len(results[search_query]) < top_n:
+            results[search_query].append((skill, freq))
+    return len(rows), dict(results)
+
+
+def sql_top_n(c, query, params):
+    c.execute(query, params)
+    rows = c.fetchall()
+    return len(rows), group_top_skills(rows)
+
+
+# SQL top N over raw job_skills (what the SQL ranking costs without the aggregate table)
+def raw_sql_query(top_n):
+    return """
+        SELECT search_query, skill, freq
+        FROM (
+            SELECT search_query, skill, COUNT(*) AS freq,
+                   ROW_NUMBER() OVER (PARTITION BY search_query ORDER BY COUNT(*) DESC, skill) AS rank
+            FROM job_skills
+            GROUP BY search_query, skill
+        ) ranked
+        WHERE rank <= %s
+        ORDER BY search_query, rank
+    """, (top_n,)
+
+
+def timed(run, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    top_n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    try:
+        stored = setup(rows)
+        print(f"{stored} job_skills rows, {QUERIES} queries, top {top_n}")
+        print(f"{'method':<36} {'ms':>9} {'rows sent':>10}")
+
+        with connection() as conn, conn.cursor() as c:
+            elapsed, (sent, reference) = timed(lambda: python_top_n(c, top_n))
+            print(f"{'python truncation (job_skills)':<36} {elapsed * 1000:>9.1f} {sent:>10}")
+
+            elapsed, (sent, result) = timed(lambda: sql_top_n(c, *raw_sql_query(top_n)))
+            same = all([f for _, f in result[q]] == [f for _, f in reference[q]] for q in reference)
+            print(f"{'sql row_number (job_skills)':<36} {elapsed * 1000:>9.1f} {sent:>10}   same counts: {same}")
+
+            elapsed, (sent, result) = timed(lambda: sql_top_n(c, *top_skills_per_query_query(top_n)))
+            same = all([f for _, f in result[q]] == [f for _, f in reference[q]] for q in reference)
+            print(f"{'sql row_number (agg_skill_counts)':<36} {elapsed * 1000:>9.1f} {sent:>10}   same counts: {same}")
+
+            query = top_skills_per_query_query(top_n, location="US", start_date="2025-03-01", end_date="2025-06-30")
+            elapsed, (sent, _) = timed(lambda: sql_top_n(c, *query))
+            print(f"{'sql row_number (US, Mar-Jun)':<36} {elapsed * 1000:>9.1f} {sent:>10}")
+    finally:
+        with connection() as conn:
+            with conn.cursor() as c:
+                c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Trending skills from the pre-aggregated weekly buckets (agg_skill_weekly_counts) vs the same query over a fresh
+# GROUP BY of job_skills joined to job_listings, which is what every request would cost without the aggregate. Also
+# checks that the buckets maintained by store_job_skills match a recount.
+# Runs in a throwaway schema on the configured database, so job_listings is untouched
+#
+# Usage: python -m benchmarks.trending_skills [job_skills rows]      (default 1000000)
+
+import os
+import sys
+import time
+
+SCHEMA = "bench_trending"
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"   # every pooled connection lands in the throwaway schema
+
+import backend.scraper as scraper
+from datetime import date
+from backend.db import connection, close_pool
+from backend.extract_skills import DB_migration
+from backend.process_skills import store_job_skills
+from backend.aggregates import rebuild_aggregates, check_aggregates, skill_weekly_counts_sql
+from backend.analysis import trending_skills_query
+
+SKILLS_PER_JOB = 10
+QUERIES = 8
+VOCABULARY = 2000
+DAYS = 180
+AS_OF = date(2025, 7, 1)
+
+
+def setup(rows):
+    jobs = rows // SKILLS_PER_JOB
+    with connection() as conn:
+        with conn.cursor() as c:
+            c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            c.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+        scraper._schema_ready = False
+        scraper.init_database(conn)
+        DB_migration(conn)
+        with conn.cursor() as c:
+            c.execute("""
+                INSERT INTO job_listings (id, job_country, date_posted, search_query)
+                SELECT 'job-' || i, CASE WHEN i %% 3 = 0 THEN 'CA' ELSE 'US' END,
+                       %s::date - (i %% %s), 'query-' || (i %% %s)
+                FROM generate_series(1, %s) i
+            """, (AS_OF, DAYS, QUERIES, jobs))
+            # Skewed popularity, plus one skill per job drawn from skill-0..49 with a probability that grows the more
+            # recent the posting, so there is a trend to find
+            c.execute("""
+                INSERT INTO job_skills (job_id, skill, confidence, search_query, source_model)
+                SELECT DISTINCT ON (j, skill) 'job-' || j, skill, 0.9, 'query-' || (j %% %s), 'bench'
+                FROM (
+                    SELECT j, CASE WHEN k = 1 AND random() < 1 - (j %% %s)::float / %s
+                                   THEN 'skill-' || floor(50 * random())::int
+                                   ELSE 'skill-' || floor(%s * power(random(), 3))::int END AS skill
+                    FROM generate_series(1, %s) j, generate_series(1, %s) k
+                ) s
+            """, (QUERIES, DAYS, DAYS, VOCABULARY, jobs, SKILLS_PER_JOB))
+            c.execute("ANALYZE job_listings")
+            c.execute("ANALYZE job_skills")
+        conn.commit()
+        rebuild_aggregates(conn)
+        with conn.cursor() as c:
+            c.execute("SELECT COUNT(*) FROM job_skills")
+            return c.fetchone()[0]
+
+
+# The trending query over a fresh GROUP BY instead of the aggregate table
+def raw_query(query):
+    assert query.count("FROM agg_skill_weekly_counts") == 1
+    return query.replace("FROM agg_skill_weekly_counts", f"FROM ({skill_weekly_counts_sql()}) raw")
+
+
+# A process_jobs batch for jobs posted the day before AS_OF, written through store_job_skills so the buckets are updated
+def add_jobs(first, count):
+    ids = [f"job-{i}" for i in range(first, first + count)]
+    queries = {job_id: f"query-{i % QUERIES}" for i, job_id in zip(range(first, first + count), ids)}
+    skills = {job_id: [(f"skill-{(i * 7 + k) % 50}", 0.9) for k in range(SKILLS_PER_JOB)]
+              for i, job_id in zip(range(first, first + count), ids)}
+    with connection() as conn, conn.cursor() as c:
+        c.execute("""
+            INSERT INTO job_listings (id, job_country, date_posted, search_query)
+            SELECT unnest(%s::text[]), 'US', %s::date - 1, unnest(%s::text[])
+        """, (ids, AS_OF, [queries[job_id] for job_id in ids]))
+        store_job_skills(c, skills, queries, model="bench")
+        conn.commit()
+
+
+def timed(c, query, params, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        c.execute(query, params)
+        rows = c.fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    try:
+        stored = setup(rows)
+        print(f"{stored} job_skills rows over {DAYS} days, {QUERIES} queries, as of {AS_OF}")
+        print(f"{'scope':<22} {'aggregate ms':>13} {'raw ms':>9} {'same':>5}")
+
+        with connection() as conn, conn.cursor() as c:
+            for name, role, location in (("all jobs", None, None), ("US", None, "US"), ("query-3, CA", "query-3", "CA")):
+                query, params = trending_skills_query(role, location, as_of=AS_OF)
+                aggregate_time, aggregate_rows = timed(c, query, params)
+                raw_time, raw_rows = timed(c, raw_query(query), params)
+                same = [row[:3] for row in aggregate_rows] == [row[:3] for row in raw_rows]
+                print(f"{name:<22} {aggregate_time * 1000:>13.1f} {raw_time * 1000:>9.1f} {str(same):>5}")
+
+            query, params = trending_skills_query(as_of=AS_OF, top_k=3)
+            c.execute(query, params)
+            for direction, skill, recent, baseline, _, _, growth, z in c.fetchall():
+                growth = f"{growth:+.0%}" if growth is not None else "new"
+                print(f"  {direction:<8} {skill:<12} {baseline:>7} -> {recent:>7}  {growth:>6}  z {z:.1f}")
+
+        add_jobs(rows, 1000)
+        mismatches = check_aggregates()["agg_skill_weekly_counts"]
+        print(f"buckets after a store_job_skills batch match a recount: {not mismatches}")
+    finally:
+        with connection() as conn:
+            with conn.cursor() as c:
+                c.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ import type {
   GeographicData,
   SalaryData,
   RecentListing,
+  DashboardField,
+  DashboardResponse,
 } from '../types/api';
 
 interface UseApiState<T> {
@@ -206,4 +208,40 @@ export function useRecentListings(location?: string): UseApiState<RecentListing[
   }, [fetchData]);
 
   return { ...state, refetch: fetchData };
-}
\ No newline at end of file
+}
+
+export function useDashboard(location?: string, fields?: DashboardField[], topK = 10): UseApiState<DashboardResponse> {
+  const [state, setState] = useState<{
+    data: DashboardResponse | null;
+    loading: boolean;
+    error: string | null;
+  }>({
+    data: null,
+    loading: true,
+    error: null,
+  });
+
+  // Join so a new array with the same fields doesn't trigger a refetch
+  const fieldsKey = fields?.join(',');
+
+  const fetchData = useCallback(async () => {
+    try {
+      setState(prev => ({ ...prev, loading: true, error: null }));
+      const selected = fieldsKey ? (fieldsKey.split(',') as DashboardField[]) : undefined;
+      const data = await apiService.getDashboard(location, selected, topK);
+      setState({ data, loading: false, error: null });
+    } catch (error) {
+      setState({
+        data: null,
+        loading: false,
+        error: error instanceof Error ? error.message : 'Failed to fetch dashboard data'
+      });
+    }
+  }, [location, fieldsKey, topK]);
+
+  useEffect(() => {
+    fetchData();
+  }, [fetchData]);
+
+  return { ...state, refetch: fetchData };
+}
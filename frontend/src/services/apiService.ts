@@ -7,6 +7,8 @@ import type {
   SalaryData,
   RecentListing,
   ApiResponse,
+  DashboardField,
+  DashboardResponse,
 } from '../types/api';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
@@ -33,11 +35,35 @@ apiClient.interceptors.response.use(
   }
 );
 
+// Accept 304 Not Modified alongside 2xx so conditional GETs don't throw
+const acceptNotModified = (status: number) => (status >= 200 && status < 300) || status === 304;
+
 export class ApiService {
+  // Last ETag and body seen per URL, replayed when the server answers 304
+  private conditionalCache = new Map<string, { etag: string; data: unknown }>();
+
+  // Conditional GET: sends If-None-Match for URLs fetched before and reuses the cached body on 304
+  private async get<T>(url: string): Promise<T> {
+    const cached = this.conditionalCache.get(url);
+    const response = await apiClient.get<T>(url, {
+      headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+      validateStatus: acceptNotModified,
+    });
+
+    if (response.status === 304 && cached) {
+      return cached.data as T;
+    }
+
+    const etag = response.headers['etag'];
+    if (etag) {
+      this.conditionalCache.set(url, { etag, data: response.data });
+    }
+    return response.data;
+  }
+
   // Get job counts by location
   async getJobCounts(location = 'US'): Promise<JobCountsResponse> {
-    const response = await apiClient.get(`/job_listings/counts?location=${location}`);
-    return response.data;
+    return this.get<JobCountsResponse>(`/job_listings/counts?location=${location}`);
   }
 
   // Get top skills (overall or by role)
@@ -46,36 +72,45 @@ export class ApiService {
     if (role) params.append('role', role);
     params.append('top_k', topK.toString());
     
-    const response = await apiClient.get(`/skills/top?${params.toString()}`);
-    return response.data;
+    return this.get<SkillsResponse>(`/skills/top?${params.toString()}`);
   }
 
   // Get remote vs onsite distribution
   async getRemoteVsOnsite(): Promise<RemoteVsOnsiteData[]> {
-    const response = await apiClient.get<ApiResponse<RemoteVsOnsiteData[]>>('/remote_v_onsite');
-    return response.data.data || [];
+    const response = await this.get<ApiResponse<RemoteVsOnsiteData[]>>('/remote_v_onsite');
+    return response.data || [];
   }
 
   // Get geographic distribution
   async getGeographicDistribution(location?: string): Promise<GeographicData[]> {
     const url = location ? `/geographic_distribution?location=${location}` : '/geographic_distribution';
-    const response = await apiClient.get<ApiResponse<GeographicData[]>>(url);
-    return response.data.data || [];
+    const response = await this.get<ApiResponse<GeographicData[]>>(url);
+    return response.data || [];
   }
 
   // Get salary data
   async getSalaryData(location?: string): Promise<SalaryData[]> {
     const url = location ? `/salaries?location=${location}` : '/salaries';
-    const response = await apiClient.get<ApiResponse<SalaryData[]>>(url);
-    return response.data.data || [];
+    const response = await this.get<ApiResponse<SalaryData[]>>(url);
+    return response.data || [];
   }
 
   // Get recent listings
   async getRecentListings(location?: string): Promise<RecentListing[]> {
     const url = location ? `/recent_listings?location=${location}` : '/recent_listings';
-    const response = await apiClient.get<ApiResponse<RecentListing[]>>(url);
-    return response.data.data || [];
+    const response = await this.get<ApiResponse<RecentListing[]>>(url);
+    return response.data || [];
+  }
+
+  // Get several dashboard panels in one request (all panels if fields is omitted)
+  async getDashboard(location?: string, fields?: DashboardField[], topK = 10): Promise<DashboardResponse> {
+    const params = new URLSearchParams();
+    if (location) params.append('location', location);
+    if (fields?.length) params.append('fields', fields.join(','));
+    params.append('top_k', topK.toString());
+
+    return this.get<DashboardResponse>(`/dashboard?${params.toString()}`);
   }
 }
 
-export const apiService = new ApiService();
\ No newline at end of file
+export const apiService = new ApiService();
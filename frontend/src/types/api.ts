@@ -59,4 +59,22 @@ export interface RecentListing {
 export interface ApiResponse<T> {
   data?: T;
   [key: string]: any;
-}
\ No newline at end of file
+}
+
+export type DashboardField =
+  | 'job_counts'
+  | 'top_skills'
+  | 'remote_v_onsite'
+  | 'geographic_distribution'
+  | 'salaries'
+  | 'recent_listings';
+
+// Response of /dashboard. Only the requested fields are present
+export interface DashboardResponse {
+  job_counts?: JobCountsResponse;
+  top_skills?: SkillsResponse;
+  remote_v_onsite?: RemoteVsOnsiteData[];
+  geographic_distribution?: GeographicData[];
+  salaries?: SalaryData[];
+  recent_listings?: RecentListing[];
+}
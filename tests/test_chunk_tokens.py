@@ -0,0 +1,49 @@
+import re
+import pytest
+from backend.extract_skills import chunk_tokens, kept_entities
+
+MAX_TOKENS = 16
+
+
+# WordPiece-style tokenizer without a vocabulary: a word's first piece is 2 chars, continuation pieces up to 4, so the
+# tail of a word takes more tokens on its own ("ghij" is one continuation piece but "gh", "ij" as a word)
+class SubwordTokenizer:
+    model_max_length = 512
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        offsets = []
+        for word in re.finditer(r"\w+|[^\w\s]", text):
+            start, end = word.span()
+            offsets.append((start, min(start + 2, end)))
+            for piece in range(start + 2, end, 4):
+                offsets.append((piece, min(piece + 4, end)))
+        return {"offset_mapping": offsets}
+
+
+TEXT = " ".join(["abcdefghij klmnopqrst uvwxyzabcd"] * 20)
+
+
+@pytest.mark.parametrize("max_tokens", range(12, 24))
+def test_chunks_fit_the_budget_when_retokenized(max_tokens):
+    tokenizer = SubwordTokenizer()
+    chunks = chunk_tokens(TEXT, tokenizer, max_tokens=max_tokens, stride=4)
+    assert len(chunks) > 1
+    for chunk, _, _ in chunks:
+        assert len(tokenizer(chunk)["offset_mapping"]) <= max_tokens
+
+
+def test_chunks_start_and_end_on_word_boundaries():
+    words = set(TEXT.split())
+    for chunk, _, _ in chunk_tokens(TEXT, SubwordTokenizer(), max_tokens=MAX_TOKENS, stride=4):
+        assert set(chunk.split()) <= words
+
+
+def test_each_word_is_kept_by_exactly_one_chunk():
+    kept = []
+    for chunk, keep_start, keep_end in chunk_tokens(TEXT, SubwordTokenizer(), max_tokens=MAX_TOKENS, stride=4):
+        entities = [{"word": m.group(), "start": m.start()} for m in re.finditer(r"\w+", chunk)]
+        kept += [ent["word"] for ent in kept_entities(entities, keep_start, keep_end)]
+    assert kept == TEXT.split()
@@ -0,0 +1,66 @@
+import math
+import multiprocessing
+import threading
+import pytest
+from backend.extract_skills import imap_unordered_bounded
+
+TIMEOUT = 60   # seconds; the bug this guards against is a hang on pool exit
+
+
+# Runs fn in a thread and returns the exception it raised, failing the test if it doesn't finish in time
+def raised_within_timeout(fn):
+    outcome = {}
+
+    def run():
+        try:
+            fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "pool did not shut down"
+    return outcome.get("error")
+
+
+def test_results_cover_every_item():
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = list(imap_unordered_bounded(pool, math.sqrt, (float(i * i) for i in range(50)), window=4))
+    assert sorted(results) == [float(i) for i in range(50)]
+
+
+def test_worker_exception_propagates():
+    def run():
+        items = [4.0, 9.0, -1.0] + [16.0] * 20   # math.sqrt(-1.0) raises ValueError in the worker
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            for _ in imap_unordered_bounded(pool, math.sqrt, items, window=4):
+                pass
+
+    error = raised_within_timeout(run)
+    assert isinstance(error, ValueError)
+
+
+def test_consumer_exception_propagates():
+    def run():
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            for _ in imap_unordered_bounded(pool, math.sqrt, (float(i) for i in range(1000)), window=4):
+                raise RuntimeError("store failed")
+
+    error = raised_within_timeout(run)
+    assert isinstance(error, RuntimeError)
+
+
+def test_read_ahead_is_bounded():
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield float(i)
+
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = imap_unordered_bounded(pool, math.sqrt, items(), window=4)
+        next(results)
+        assert len(consumed) <= 5
+        results.close()
@@ -0,0 +1,43 @@
+import pytest
+from backend.skill_matcher import SkillMatcher
+
+COMMON_WORDS = {"Make", "Lean", "Unity", "Notion", "Chef", "Swift", "Rust", "Windows", "Hive", "Presto"}
+
+PROSE = """Make sure you can work in a lean team. We value swift delivery and rust-free processes.
+Our web servers run on windows machines, and you will make decisions quickly.
+- Lean startup experience is a plus. Notion of ownership matters, as does the unity of the team and a chef-like
+attention to detail. The office is a hive of activity; presto, it works.
+Unity is our strength. Swift, clear communication. Windows of opportunity open often."""
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return SkillMatcher()
+
+
+def test_common_words_in_prose_are_not_skills(matcher):
+    found = {skill for skill, _, _ in matcher.find(PROSE)}
+    assert not found & COMMON_WORDS
+
+
+def test_common_word_skills_still_match_as_names(matcher):
+    text = "Experience with Rust and Swift, deployments on Windows with Chef, data in Hive and Presto."
+    found = {skill for skill, _ in matcher.extract(text)}
+    assert {"Rust", "Swift", "Windows", "Chef", "Hive", "Presto"} <= found
+
+
+def test_short_names_are_case_sensitive(matcher):
+    assert matcher.find("we go where the data goes") == []
+    assert [skill for skill, _, _ in matcher.find("Backend in Go and C++")] == ["Go", "C++"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("- React, TypeScript", {"React", "TypeScript"}),
+    ("- Spark or Pandas", {"Spark", "Pandas"}),
+    ("Skills: Spark, Pandas", {"Spark", "Pandas"}),
+    ("React developer needed.", {"React"}),
+    ("Requirements:\n* Flask and Django\n- Ruby on Rails\n• Dart", {"Flask", "Django", "Ruby", "Dart"}),
+])
+def test_skills_at_the_start_of_bullets_and_lists(matcher, text, expected):
+    found = {skill for skill, _, _ in matcher.find(text)}
+    assert expected <= found